@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+BENCHMARK AGRUPAR POR PEDIDO
+============================
+Mide agrupar_por_pedido (modules/comprobantes_page.py) sobre una tabla de
+ventas sintetica y comprueba que da lo mismo que la version anterior (una
+mascara booleana por pedido, copiada sin cambios), ejecutada solo sobre las
+primeras filas porque es O(pedidos x filas). Los pedidos escritos de varias
+formas (123 / 123.0 / " 123 ") se informan aparte: la version nueva los
+agrupa a proposito.
+
+Ejecutar desde la raiz del repo:
+    python -m benchmarks.bench_agrupar_pedidos
+    python -m benchmarks.bench_agrupar_pedidos --filas 500000 --filas-por-pedido 3
+    python -m benchmarks.bench_agrupar_pedidos --filas-referencia 0   (sin comparar)
+
+Termina con codigo 1 si los resultados no coinciden.
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from modules.comprobantes_page import agrupar_por_pedido
+
+EQUIPOS = ['Spain', 'Mexico', 'Argentina', 'Brazil', 'France', 'Germany', 'Japan', 'USA']
+
+
+def generar_tabla(filas: int, filas_por_pedido: float, semilla: int = 0) -> pd.DataFrame:
+    """Tabla como las hojas de ventas: pedidos repetidos, IDs mezclados (int, float, texto) y nulos"""
+    rng = np.random.default_rng(semilla)
+    n_pedidos = max(1, int(filas / filas_por_pedido))
+    ids = 1_000_000 + rng.integers(0, n_pedidos, filas)
+
+    pedidos = ids.astype(object)
+    formato = rng.integers(0, 10, filas)
+    pedidos[formato == 0] = ids[formato == 0].astype(float)
+    pedidos[formato == 1] = [f" {i} " for i in ids[formato == 1]]
+    pedidos[rng.random(filas) < 0.001] = np.nan
+
+    match = rng.integers(1, 105, filas).astype(float)
+    match[rng.random(filas) < 0.01] = np.nan
+    emails = np.array([f"Cliente{i}@Example.com " for i in range(n_pedidos)], dtype=object)[ids - 1_000_000]
+
+    return pd.DataFrame({
+        'PEDIDO VENTA': pedidos,
+        'match': match,
+        'Team A': rng.choice(EQUIPOS, filas),
+        'Team B': rng.choice(EQUIPOS, filas),
+        'Category': rng.choice(['Category 1', 'Category 2', 'Category 3', None], filas),
+        'email_envio': emails,
+        'precio': rng.random(filas) * 500,
+    })
+
+
+def agrupar_por_pedido_referencia(tabla: pd.DataFrame) -> dict:
+    """
+    Version anterior de agrupar_por_pedido (mascara por pedido), tal cual.
+    Con pedidos nulos fallaba (IndexError): se le pasa la tabla sin ellos.
+    """
+    agrupados = {}
+
+    for pedido in tabla['PEDIDO VENTA'].unique():
+        filas = tabla[tabla['PEDIDO VENTA'] == pedido]
+        primera = filas.iloc[0]
+
+        if pd.notna(pedido):
+            try:
+                pedido_str = str(int(float(pedido)))
+            except (ValueError, TypeError):
+                pedido_str = str(pedido).strip()
+        else:
+            continue
+
+        # Obtener campos con valores por defecto si no existen
+        match_val = primera.get('match', 0)
+        team_a = primera.get('Team A', 'N/A')
+        team_b = primera.get('Team B', 'N/A')
+        categoria = primera.get('Category', 'N/A')
+        email = primera.get('email_envio', 'N/A')
+
+        agrupados[pedido_str] = {
+            'match': int(match_val) if pd.notna(match_val) else 0,
+            'partido': f"{team_a} vs {team_b}",
+            'categoria': categoria,
+            'cantidad': len(filas),
+            'email': str(email).strip().lower() if pd.notna(email) else ''
+        }
+
+    return agrupados
+
+
+def pedidos_con_variantes(tabla: pd.DataFrame) -> set:
+    """
+    Pedidos escritos de varias formas (123 / 123.0 / " 123 "). La version
+    anterior se quedaba con la ultima forma y solo contaba sus filas; ahora
+    se agrupan en un solo pedido: diferencia esperada.
+    """
+    variantes = {}
+    for pedido in tabla['PEDIDO VENTA'].dropna().unique():
+        try:
+            pedido_str = str(int(float(pedido)))
+        except (ValueError, TypeError):
+            pedido_str = str(pedido).strip()
+        variantes.setdefault(pedido_str, set()).add(pedido if isinstance(pedido, str) else float(pedido))
+    # 123 y 123.0 son el mismo valor para unique(): cuentan como una forma
+    return {p for p, formas in variantes.items() if len(formas) > 1}
+
+
+def comparar(a: dict, b: dict) -> list:
+    diferencias = []
+    for pedido in sorted(set(a) | set(b)):
+        ea, eb = a.get(pedido), b.get(pedido)
+        if ea is None or eb is None:
+            diferencias.append((pedido, ea, eb))
+            continue
+        for campo in ('match', 'partido', 'cantidad', 'email'):
+            if ea[campo] != eb[campo]:
+                diferencias.append((pedido, campo, ea[campo], eb[campo]))
+        if not (pd.isna(ea['categoria']) and pd.isna(eb['categoria'])) and ea['categoria'] != eb['categoria']:
+            diferencias.append((pedido, 'categoria', ea['categoria'], eb['categoria']))
+    return diferencias
+
+
+def medir(funcion, tabla: pd.DataFrame) -> tuple:
+    t0 = time.perf_counter()
+    resultado = funcion(tabla)
+    return resultado, time.perf_counter() - t0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark de agrupar_por_pedido")
+    parser.add_argument('--filas', type=int, default=500_000)
+    parser.add_argument('--filas-por-pedido', type=float, default=2.5)
+    parser.add_argument('--filas-referencia', type=int, default=20_000,
+                        help="Filas sobre las que se ejecuta y compara la version anterior (0 = no comparar)")
+    args = parser.parse_args()
+
+    tabla = generar_tabla(args.filas, args.filas_por_pedido)
+    print(f"Tabla: {len(tabla):,} filas, {tabla['PEDIDO VENTA'].nunique():,} valores de pedido")
+
+    agrupados, segundos = medir(agrupar_por_pedido, tabla)
+    print(f"agrupar_por_pedido: {len(agrupados):,} pedidos en {segundos:.2f} s "
+          f"({len(tabla) / segundos:,.0f} filas/s)")
+
+    if args.filas_referencia <= 0:
+        return 0
+
+    muestra = tabla.head(args.filas_referencia)
+    nuevo, t_nuevo = medir(agrupar_por_pedido, muestra)
+    referencia, t_ref = medir(agrupar_por_pedido_referencia, muestra.dropna(subset=['PEDIDO VENTA']))
+    print(f"Muestra de {len(muestra):,} filas: vectorizado {t_nuevo:.3f} s, "
+          f"anterior {t_ref:.2f} s (x{t_ref / max(t_nuevo, 1e-9):,.0f})")
+
+    esperadas = pedidos_con_variantes(muestra)
+    diferencias = comparar(nuevo, referencia)
+    agrupadas = [d for d in diferencias if d[0] in esperadas]
+    diferencias = [d for d in diferencias if d[0] not in esperadas]
+    if agrupadas:
+        print(f"Diferencias esperadas: {len(esperadas):,} pedidos escritos de varias formas "
+              f"(123 / 123.0 / ' 123 ') ahora se agrupan en uno ({len(agrupadas):,} campos distintos)")
+    if diferencias:
+        print(f"DIFERENCIAS ({len(diferencias)}):")
+        for d in diferencias[:10]:
+            print(f"  {d}")
+        return 1
+    print("Resto de resultados identicos a la version anterior")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
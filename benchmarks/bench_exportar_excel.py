@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+BENCHMARK EXPORTAR EXCEL
+========================
+Mide exportar_excel (modules/comprobantes_excel.py) sobre un reporte de
+verificacion sintetico: primera generacion, segunda llamada con el mismo
+contenido (sale del cache por hash) y calculo de la huella.
+
+Ejecutar desde la raiz del repo:
+    python -m benchmarks.bench_exportar_excel
+    python -m benchmarks.bench_exportar_excel --filas 100000
+
+Con lxml instalado openpyxl serializa bastante mas rapido.
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from modules.comprobantes_excel import excel_de_resultados, huella_dataframe
+
+ESTADOS = ['OK', 'OK (EMAIL SIMILAR)', 'PARCIAL', 'NO COINCIDE', 'NO ENCONTRADO EN TABLA']
+METODOS = ['OCR', 'Claude Vision', 'Claude Vision (fallback)', 'OCR + Claude (parcial)']
+
+
+def generar_reporte(filas: int, semilla: int = 0) -> pd.DataFrame:
+    """Columnas como COLUMNAS_REPORTE de la pagina"""
+    rng = np.random.default_rng(semilla)
+    pedidos = (1_000_000 + np.arange(filas)).astype(str)
+    return pd.DataFrame({
+        'archivo': [f"{p}.jpg" for p in pedidos],
+        'estado': rng.choice(ESTADOS, filas),
+        'pedido': pedidos,
+        'metodo_usado': rng.choice(METODOS, filas),
+        'email_imagen': [f"cliente{p}@gmail.com" for p in pedidos],
+        'email_tabla': [f"cliente{p}@gmail.com" for p in pedidos],
+        'email_ok': rng.random(filas) > 0.1,
+        'similitud_email': rng.random(filas).round(3),
+        'match_imagen': rng.choice(['Spain vs Mexico', 'Brazil vs France'], filas),
+        'match_tabla': rng.choice(['Spain vs Mexico', 'Brazil vs France'], filas),
+        'match_ok': rng.random(filas) > 0.1,
+        'cantidad_imagen': rng.integers(1, 5, filas),
+        'cantidad_tabla': rng.integers(1, 5, filas),
+        'cantidad_ok': rng.random(filas) > 0.1,
+        'pedido_sugerido': None,
+        'desde_cache': rng.random(filas) > 0.5,
+    })
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark de la exportacion a Excel")
+    parser.add_argument('--filas', type=int, default=20_000)
+    args = parser.parse_args()
+
+    df = generar_reporte(args.filas)
+
+    t0 = time.perf_counter()
+    huella_dataframe(df)
+    print(f"Huella de {len(df):,} filas: {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+    t0 = time.perf_counter()
+    datos = excel_de_resultados(df)
+    print(f"Generacion: {time.perf_counter() - t0:.2f} s ({len(datos) / 1024 / 1024:.1f} MB)")
+
+    t0 = time.perf_counter()
+    excel_de_resultados(df.copy())
+    print(f"Mismo reporte (cache): {(time.perf_counter() - t0) * 1000:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
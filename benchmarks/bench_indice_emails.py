@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+BENCHMARK INDICE DE EMAILS
+==========================
+Mide IndiceEmails (modules/comprobantes_emails.py) sobre una tabla
+sintetica: tiempo de construccion, latencia por busqueda y aciertos con
+emails "leidos por OCR" (1-2 errores de caracter).
+
+Ejecutar desde la raiz del repo:
+    python -m benchmarks.bench_indice_emails
+    python -m benchmarks.bench_indice_emails --pedidos 200000 --consultas 5000 --similitud 0.85
+"""
+
+import argparse
+import random
+import sys
+import time
+
+from modules.comprobantes_emails import IndiceEmails
+
+DOMINIOS = ['gmail.com', 'icloud.com', 'hotmail.com', 'yahoo.es', 'outlook.com']
+# Confusiones tipicas del OCR
+CONFUSIONES = {'o': '0', '0': 'o', 'l': '1', '1': 'l', 'i': 'l', 'm': 'rn', 'rn': 'm', '.': ',', '_': ' '}
+
+
+def _palabra(rng: random.Random) -> str:
+    return ''.join(rng.choice('aeioubcdfglmnprstv') for _ in range(rng.randint(3, 8)))
+
+
+def generar_datos(pedidos: int, semilla: int = 0) -> dict:
+    rng = random.Random(semilla)
+    nombres = [_palabra(rng) for _ in range(500)]
+    apellidos = [_palabra(rng) for _ in range(800)]
+    datos = {}
+    for i in range(pedidos):
+        sufijo = str(rng.randint(0, 999)) if rng.random() < 0.5 else ''
+        email = f"{rng.choice(nombres)}{rng.choice(['', '.', '_'])}{rng.choice(apellidos)}{sufijo}@{rng.choice(DOMINIOS)}"
+        datos[str(1_000_000 + i)] = {'email': email}
+    return datos
+
+
+def leer_con_errores(email: str, rng: random.Random) -> str:
+    """1-2 errores: confusion OCR, borrado o insercion"""
+    texto = email
+    for _ in range(rng.randint(1, 2)):
+        p = rng.randrange(len(texto))
+        operacion = rng.random()
+        if operacion < 0.5:
+            texto = texto[:p] + CONFUSIONES.get(texto[p], 'x') + texto[p + 1:]
+        elif operacion < 0.75:
+            texto = texto[:p] + texto[p + 1:]
+        else:
+            texto = texto[:p] + rng.choice('rn.') + texto[p:]
+    return texto
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark del indice de emails")
+    parser.add_argument('--pedidos', type=int, default=200_000)
+    parser.add_argument('--consultas', type=int, default=3000)
+    parser.add_argument('--similitud', type=float, default=0.85)
+    args = parser.parse_args()
+
+    datos = generar_datos(args.pedidos)
+    t0 = time.perf_counter()
+    indice = IndiceEmails(datos)
+    print(f"Indice: {len(indice):,} emails de {len(datos):,} pedidos en {time.perf_counter() - t0:.2f} s")
+
+    rng = random.Random(1)
+    consultas = []
+    for pedido in rng.sample(list(datos), args.consultas):
+        email = datos[pedido]['email']
+        consultas.append((email, leer_con_errores(email, rng)))
+
+    for nombre, lista in (("exactas", [(e, e) for e, _ in consultas]), ("con errores OCR", consultas)):
+        aciertos = 0
+        t0 = time.perf_counter()
+        for original, leido in lista:
+            resultados = indice.buscar(leido, args.similitud, max_resultados=1)
+            aciertos += bool(resultados) and resultados[0][0] == original
+        ms = (time.perf_counter() - t0) / len(lista) * 1000
+        print(f"Busquedas {nombre}: {ms:.3f} ms/consulta, aciertos {aciertos / len(lista):.1%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+BENCHMARK LECTURA CORREOS
+=========================
+Mide connect/search de ImapManager contra el servidor IMAP local
+(benchmarks/imap_stub.py), sin tocar iCloud.
+
+Ejecutar desde la raiz del repo:
+    python -m benchmarks.bench_lectura_correos
+    python -m benchmarks.bench_lectura_correos --workers 1,5,10 --latencia 0.03
+    python -m benchmarks.bench_lectura_correos --guardar base.json
+    python -m benchmarks.bench_lectura_correos --comparar base.json --tolerancia 0.2
+
+Con --comparar termina con codigo 1 si msgs/s cae mas de la tolerancia
+respecto a la linea base (para detectar regresiones offline).
+"""
+
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from benchmarks.imap_stub import StubImapServer, generar_corpus
+from modules.lectura_correos_page import ImapManager, to_imap_date
+
+
+def run_once(server: StubImapServer, cuentas: int, workers: int, criteria: dict) -> dict:
+    """Conecta `cuentas` cuentas y busca en todas con `workers` hilos"""
+    manager = ImapManager(conn_factory=server.conn_factory)
+    emails = [f"bench{i:03d}@icloud.com" for i in range(cuentas)]
+
+    server.reset_bytes()
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        ok = sum(1 for r, _ in executor.map(lambda e: manager.connect(e, "x"), emails) if r)
+    connect_s = time.perf_counter() - t0
+    connect_bytes = server.reset_bytes()
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        resultados = list(executor.map(lambda e: manager.search(e, criteria), emails))
+    search_s = time.perf_counter() - t0
+    search_bytes = server.reset_bytes()
+
+    manager.disconnect_all()
+    mensajes = sum(len(r) for r in resultados)
+    return {
+        "workers": workers,
+        "cuentas": cuentas,
+        "conectadas": ok,
+        "connect_s": round(connect_s, 4),
+        "search_s": round(search_s, 4),
+        "bytes_connect": connect_bytes,
+        "bytes_search": search_bytes,
+        "mensajes": mensajes,
+        "msgs_por_s": round(mensajes / search_s, 2) if search_s > 0 else 0.0,
+    }
+
+
+def comparar(actual: list, base: list, tolerancia: float) -> list:
+    """Devuelve lista de regresiones (workers, msgs/s base, msgs/s actual)"""
+    base_por_workers = {r["workers"]: r for r in base}
+    regresiones = []
+    for r in actual:
+        b = base_por_workers.get(r["workers"])
+        if b and b["msgs_por_s"] > 0 and r["msgs_por_s"] < b["msgs_por_s"] * (1 - tolerancia):
+            regresiones.append((r["workers"], b["msgs_por_s"], r["msgs_por_s"]))
+    return regresiones
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Benchmark ImapManager contra IMAP local")
+    p.add_argument("--mensajes", type=int, default=500, help="Mensajes en el buzon simulado")
+    p.add_argument("--cuentas", type=int, default=10, help="Cuentas a conectar")
+    p.add_argument("--workers", default="1,5,10", help="Lista de workers separada por comas")
+    p.add_argument("--latencia", type=float, default=0.02, help="Latencia por respuesta (s)")
+    p.add_argument("--limite", type=int, default=25, help="Limite por cuenta")
+    p.add_argument("--asunto", default="FIFA World Cup", help="Filtro de asunto")
+    p.add_argument("--padding", type=int, default=20000, help="Bytes de relleno por mensaje")
+    p.add_argument("--guardar", help="Guardar resultados en JSON")
+    p.add_argument("--comparar", help="JSON de linea base para detectar regresiones")
+    p.add_argument("--tolerancia", type=float, default=0.2, help="Caida maxima permitida (0.2 = 20%%)")
+    args = p.parse_args(argv)
+
+    criteria = {
+        "subject": args.asunto,
+        "date_since": to_imap_date(date.today() - timedelta(days=60)),
+        "limit": args.limite,
+    }
+
+    corpus = generar_corpus(args.mensajes, padding=args.padding)
+    resultados = []
+    with StubImapServer(corpus, latency=args.latencia) as server:
+        for w in [int(x) for x in args.workers.split(",") if x.strip()]:
+            r = run_once(server, args.cuentas, w, criteria)
+            resultados.append(r)
+
+    cab = f"{'workers':>7} {'connect_s':>10} {'search_s':>9} {'KB search':>10} {'mensajes':>9} {'msgs/s':>9}"
+    print(cab)
+    print("-" * len(cab))
+    for r in resultados:
+        print(f"{r['workers']:>7} {r['connect_s']:>10.3f} {r['search_s']:>9.3f} "
+              f"{r['bytes_search'] / 1024:>10.1f} {r['mensajes']:>9} {r['msgs_por_s']:>9.1f}")
+
+    if args.guardar:
+        with open(args.guardar, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2)
+        print(f"\nResultados guardados en {args.guardar}")
+
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            base = json.load(f)
+        regresiones = comparar(resultados, base, args.tolerancia)
+        if regresiones:
+            print("\nREGRESIONES:")
+            for w, b, a in regresiones:
+                print(f"  workers={w}: {b:.1f} -> {a:.1f} msgs/s")
+            return 1
+        print("\nSin regresiones respecto a la linea base")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+BENCHMARK PARSER DE CAMPOS OCR
+==============================
+Corpus dorado (benchmarks/corpus_ocr.jsonl): salidas de readtext de
+capturas de transferencia (textos, confianzas, cajas y alto de la imagen)
+con los valores correctos de cada campo. Incluye los casos dificiles que
+se ven en produccion: "Match" y el numero en detecciones distintas, email
+de la cuenta en la cabecera, emails de soporte, avisos tipo "Max 6 tickets
+per transfer" en el formulario...
+
+Mide aciertos por campo y microsegundos por captura de parsear_texto_ocr
+(modules/comprobantes_ocr.py) con y sin cajas, frente a la version
+anterior (parsear_texto_ocr_referencia, copiada aqui).
+
+Ejecutar desde la raiz del repo:
+    python -m benchmarks.bench_parser_ocr
+    python -m benchmarks.bench_parser_ocr --repeticiones 50 --max-us 100
+
+Termina con codigo 1 si algun campo acierta menos que con la version
+anterior o, con --max-us, si el parser tarda mas de ese tiempo por captura.
+"""
+
+import argparse
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+from modules.comprobantes_ocr import parsear_texto_ocr
+
+CORPUS = Path(__file__).with_name('corpus_ocr.jsonl')
+CAMPOS = ('email', 'match', 'cantidad', 'categoria')
+
+
+# ============== VERSION ANTERIOR (REFERENCIA) ==============
+
+def _confianza_fragmento_referencia(fragmento: str, textos_lower: list, confianzas: list):
+    """Confianza del OCR para el texto de un campo (None si no se localiza)"""
+    # Deteccion que contiene el fragmento entero
+    conf = [c for t, c in zip(textos_lower, confianzas) if fragmento in t]
+    if conf:
+        return max(conf)
+    # Fragmento repartido entre detecciones (p.ej. "Match" | "25"): cuenta la peor pieza
+    piezas = []
+    for token in fragmento.split():
+        conf = [c for t, c in zip(textos_lower, confianzas) if token in t]
+        if conf:
+            piezas.append(max(conf))
+    return min(piezas) if piezas else None
+
+
+def parsear_texto_ocr_referencia(textos: list, confianzas: list = None) -> dict:
+    """
+    Version anterior de parsear_texto_ocr (una lista de patrones sin compilar por campo).
+    Con `confianzas` (una por texto, la que da readtext) anade
+    resultado['confianza'] = {campo: 0..1}.
+    """
+    texto_completo = ' '.join(textos).lower()
+    fragmentos = {}
+
+    # Buscar email (patron comun)
+    email = None
+    email_pattern = r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}'
+    emails_encontrados = re.findall(email_pattern, ' '.join(textos))
+    if emails_encontrados:
+        # Filtrar emails que no sean del sistema (ej: noreply, support, etc)
+        for e in emails_encontrados:
+            e_lower = e.lower()
+            if not any(x in e_lower for x in ['noreply', 'support', 'fifa', 'ticket']):
+                email = e_lower
+                break
+        if not email and emails_encontrados:
+            email = emails_encontrados[0].lower()
+        fragmentos['email'] = email
+
+    # Buscar Match number
+    match_num = None
+    match_patterns = [
+        r'match\s*(\d{1,3})',
+        r'match\s*#\s*(\d{1,3})',
+        r'partido\s*(\d{1,3})'
+    ]
+    for pattern in match_patterns:
+        match_found = re.search(pattern, texto_completo)
+        if match_found:
+            match_num = int(match_found.group(1))
+            fragmentos['match'] = match_found.group(0)
+            break
+
+    # Buscar cantidad de tickets
+    cantidad = None
+    cantidad_patterns = [
+        r'(\d+)\s*tickets?\s*selected',
+        r'(\d+)\s*tickets?',
+        r'transfer\s*(\d+)',
+        r'(\d+)\s*entradas?'
+    ]
+    for pattern in cantidad_patterns:
+        match_found = re.search(pattern, texto_completo)
+        if match_found:
+            num = int(match_found.group(1))
+            if 1 <= num <= 20:  # Rango razonable de tickets
+                cantidad = num
+                fragmentos['cantidad'] = match_found.group(0)
+                break
+
+    # Buscar categoria
+    categoria = None
+    cat_patterns = [
+        r'category\s*(\d+)',
+        r'cat\.?\s*(\d+)',
+        r'categoria\s*(\d+)'
+    ]
+    for pattern in cat_patterns:
+        match_found = re.search(pattern, texto_completo)
+        if match_found:
+            categoria = f"Category {match_found.group(1)}"
+            fragmentos['categoria'] = match_found.group(0)
+            break
+
+    resultado = {
+        'email': email,
+        'match': match_num,
+        'cantidad': cantidad,
+        'categoria': categoria,
+        'metodo': 'OCR',
+        'texto_raw': texto_completo[:500],  # Para debug
+        'cache': False
+    }
+    if confianzas is not None:
+        textos_lower = [t.lower() for t in textos]
+        resultado['confianza'] = {}
+        for campo, fragmento in fragmentos.items():
+            conf = _confianza_fragmento_referencia(fragmento, textos_lower, confianzas)
+            if conf is not None:
+                resultado['confianza'][campo] = round(float(conf), 3)
+    return resultado
+
+
+# ============== BENCHMARK ==============
+
+def cargar_corpus(ruta: Path = CORPUS) -> list:
+    with open(ruta, 'r', encoding='utf-8') as f:
+        casos = [json.loads(linea) for linea in f if linea.strip()]
+    for caso in casos:
+        # Cajas guardadas como [x0, y0, x1, y1]; readtext da las 4 esquinas
+        caso['cajas'] = [[[x0, y0], [x1, y0], [x1, y1], [x0, y1]] for x0, y0, x1, y1 in caso['cajas']]
+    return casos
+
+
+def medir(nombre: str, parsear, casos: list, repeticiones: int) -> dict:
+    aciertos = dict.fromkeys(CAMPOS, 0)
+    fallos = []
+    for caso in casos:
+        resultado = parsear(caso)
+        for campo in CAMPOS:
+            if resultado.get(campo) == caso['esperado'][campo]:
+                aciertos[campo] += 1
+            else:
+                fallos.append((caso['id'], campo, resultado.get(campo), caso['esperado'][campo]))
+
+    # Mejor de 3 tandas (menos ruido de la maquina)
+    tandas = []
+    for _ in range(3):
+        t0 = time.perf_counter()
+        for _ in range(repeticiones):
+            for caso in casos:
+                parsear(caso)
+        tandas.append(time.perf_counter() - t0)
+    us = min(tandas) / (repeticiones * len(casos)) * 1e6
+
+    detalle = ', '.join(f"{campo} {aciertos[campo] / len(casos):.1%}" for campo in CAMPOS)
+    print(f"{nombre:<22} {us:7.1f} us/captura | {detalle}")
+    return {'aciertos': aciertos, 'us': us, 'fallos': fallos}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark del parser de campos OCR")
+    parser.add_argument('--corpus', type=Path, default=CORPUS)
+    parser.add_argument('--repeticiones', type=int, default=20)
+    parser.add_argument('--max-us', type=float, default=None, help="Tiempo maximo por captura (con cajas)")
+    parser.add_argument('--fallos', action='store_true', help="Listar los campos que no acierta el parser")
+    args = parser.parse_args()
+
+    casos = cargar_corpus(args.corpus)
+    print(f"Corpus: {len(casos)} capturas ({args.corpus.name})")
+
+    referencia = medir("Anterior", lambda c: parsear_texto_ocr_referencia(c['textos'], c['confianzas']),
+                       casos, args.repeticiones)
+    sin_cajas = medir("Compilado sin cajas", lambda c: parsear_texto_ocr(c['textos'], c['confianzas']),
+                      casos, args.repeticiones)
+    actual = medir("Compilado con cajas",
+                   lambda c: parsear_texto_ocr(c['textos'], c['confianzas'], c['cajas'], c['alto']),
+                   casos, args.repeticiones)
+    print(f"Velocidad frente a la version anterior: x{referencia['us'] / sin_cajas['us']:.2f} sin cajas, "
+          f"x{referencia['us'] / actual['us']:.2f} con cajas")
+
+    if args.fallos:
+        for fallo in actual['fallos']:
+            print("  {} {}: {!r} (esperado {!r})".format(*fallo))
+
+    codigo = 0
+    for campo in CAMPOS:
+        if actual['aciertos'][campo] < referencia['aciertos'][campo]:
+            print(f"REGRESION: {campo} acierta {actual['aciertos'][campo]} frente a {referencia['aciertos'][campo]}")
+            codigo = 1
+    if args.max_us is not None and actual['us'] > args.max_us:
+        print(f"REGRESION: {actual['us']:.1f} us/captura (maximo {args.max_us})")
+        codigo = 1
+    return codigo
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+STUB MESSAGE BATCHES
+====================
+Imitacion local de `client.messages.batches` (create / retrieve / results /
+cancel) para probar el modo lote de Claude Vision sin API ni coste.
+
+    from benchmarks.claude_batches_stub import StubBatchesClient
+    gestor = GestorLotes(ruta_lotes, ruta_cache, cliente=StubBatchesClient())
+
+Cada lote pasa a 'ended' tras `duracion` segundos. La respuesta de cada
+peticion la genera `responder(custom_id, params)` (por defecto un JSON fijo);
+los custom_id en `fallar` devuelven 'errored'.
+
+Prueba de extremo a extremo (envio, persistencia, sondeo y fusion):
+    python -m benchmarks.claude_batches_stub
+"""
+
+import itertools
+import json
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+
+def _respuesta_por_defecto(custom_id: str, params: dict) -> str:
+    return json.dumps({"email": f"{custom_id[:8]}@example.com", "match": 25, "cantidad": 2, "categoria": 3})
+
+
+class _Batches:
+    def __init__(self, duracion: float, responder, fallar):
+        self.duracion = duracion
+        self.responder = responder
+        self.fallar = set(fallar)
+        self.lotes = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _estado(self, lote: dict) -> str:
+        if lote['cancelado']:
+            return 'ended'
+        return 'ended' if time.monotonic() - lote['inicio'] >= self.duracion else 'in_progress'
+
+    def _objeto(self, batch_id: str):
+        lote = self.lotes[batch_id]
+        estado = self._estado(lote)
+        n = len(lote['requests'])
+        errores = sum(1 for r in lote['requests'] if r['custom_id'] in self.fallar)
+        fin = estado == 'ended'
+        return SimpleNamespace(
+            id=batch_id,
+            type='message_batch',
+            processing_status=estado,
+            request_counts=SimpleNamespace(
+                processing=0 if fin else n,
+                succeeded=(n - errores) if fin and not lote['cancelado'] else 0,
+                errored=errores if fin and not lote['cancelado'] else 0,
+                canceled=n if lote['cancelado'] else 0,
+                expired=0,
+            ),
+        )
+
+    def create(self, requests: list):
+        with self._lock:
+            batch_id = f"msgbatch_stub_{next(self._ids):04d}"
+            self.lotes[batch_id] = {'requests': list(requests), 'inicio': time.monotonic(), 'cancelado': False}
+        return self._objeto(batch_id)
+
+    def retrieve(self, batch_id: str):
+        return self._objeto(batch_id)
+
+    def cancel(self, batch_id: str):
+        self.lotes[batch_id]['cancelado'] = True
+        return self._objeto(batch_id)
+
+    def results(self, batch_id: str):
+        lote = self.lotes[batch_id]
+        if self._estado(lote) != 'ended':
+            raise RuntimeError(f"Lote {batch_id} aun en proceso")
+        for r in lote['requests']:
+            cid = r['custom_id']
+            if lote['cancelado']:
+                resultado = SimpleNamespace(type='canceled')
+            elif cid in self.fallar:
+                resultado = SimpleNamespace(type='errored', error=SimpleNamespace(type='invalid_request_error'))
+            else:
+                texto = self.responder(cid, r['params'])
+                resultado = SimpleNamespace(
+                    type='succeeded',
+                    message=SimpleNamespace(content=[SimpleNamespace(type='text', text=texto)]),
+                )
+            yield SimpleNamespace(custom_id=cid, result=resultado)
+
+
+class StubBatchesClient:
+    """Sustituto de anthropic.Anthropic para GestorLotes (solo messages.batches)"""
+
+    def __init__(self, duracion: float = 0.5, responder=None, fallar=()):
+        self.messages = SimpleNamespace(
+            batches=_Batches(duracion, responder or _respuesta_por_defecto, fallar)
+        )
+
+
+def main() -> int:
+    from PIL import Image
+
+    from modules.claude_batches import GestorLotes, iniciar_sondeo
+    from modules.comprobantes_cache import abrir_cache
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        ruta_cache = tmp / 'cache_resultados.db'
+        cache = abrir_cache(ruta_cache)
+
+        imagenes = []
+        for i in range(6):
+            ruta = tmp / f"{1000 + i}.png"
+            Image.new('RGB', (400, 800), (i * 40, 255, 255)).save(ruta)
+            imagenes.append((cache.hash_archivo(ruta)[0], ruta))
+
+        cliente = StubBatchesClient(duracion=0.3, fallar={imagenes[0][0]})
+        gestor = GestorLotes(tmp / 'lotes_claude.json', ruta_cache, cliente)
+        ids = gestor.enviar(imagenes)
+        print(f"Lotes enviados: {ids}")
+
+        iniciar_sondeo(gestor, intervalo=0.1)
+        limite = time.monotonic() + 10
+        while gestor.pendientes() and time.monotonic() < limite:
+            time.sleep(0.1)
+
+        lotes = gestor.lotes()
+        for bid, info in lotes.items():
+            print(f"{bid}: estado={info['estado']} guardados={info.get('guardados')} fallidos={info.get('fallidos')}")
+        en_cache = sum(1 for h, _ in imagenes if cache.contiene(h, ('claude',)))
+        print(f"En cache (claude): {en_cache}/{len(imagenes)}")
+        cache.cerrar()
+        return 0 if en_cache == len(imagenes) - 1 and not gestor.pendientes() else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,387 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+SERVIDOR IMAP LOCAL (STAND-IN)
+==============================
+Servidor IMAP4rev1 minimo, en proceso, para medir el camino IMAP de
+lectura_correos_page sin tocar iCloud.
+
+- Corpus generado de correos estilo FIFA (ver generar_corpus)
+- Latencia configurable por respuesta (simula el RTT del servidor)
+- Contador de bytes enviados al cliente
+- Soporta: CAPABILITY, LOGIN, ENABLE, SELECT/EXAMINE, SEARCH, FETCH,
+  STORE, NOOP, LOGOUT
+- CONDSTORE: HIGHESTMODSEQ en SELECT, MODSEQ por mensaje y
+  FETCH ... (CHANGEDSINCE n)
+"""
+
+import email.utils
+import random
+import re
+import socketserver
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+_TOKEN_RE = re.compile(r'"((?:[^"\\]|\\.)*)"|(\(|\)|[^\s()]+)')
+
+_MONTHS = {m: i for i, m in enumerate(
+    ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"], 1)}
+
+_TEAMS = ["Spain", "France", "Argentina", "Brazil", "Mexico", "Germany", "Japan",
+          "Morocco", "England", "Portugal", "USA", "Canada"]
+
+_SUBJECTS_FIFA = [
+    "FIFA World Cup 2026 - Ticket Application Result",
+    "Your FIFA World Cup 2026 ticket allocation",
+    "Congratulations! Random Selection Draw results",
+    "FIFA World Cup 2026 - Conditional Tickets confirmation",
+]
+
+_SUBJECTS_OTROS = [
+    "Weekly newsletter",
+    "Your verification code",
+    "Order shipped",
+    "Invitation: team meeting",
+]
+
+
+# ==================== CORPUS ====================
+
+class StubMessage:
+    """Mensaje del buzon simulado"""
+
+    def __init__(self, raw: bytes, date_: datetime, flags=None, modseq: int = 1):
+        self.raw = raw
+        self.flags = set(flags or ())
+        self.modseq = modseq
+        parsed = email.message_from_bytes(raw)
+        self.from_ = (parsed.get("From") or "").lower()
+        self.to = (parsed.get("To") or "").lower()
+        self.subject = (parsed.get("Subject") or "").lower()
+        self.body = raw.split(b"\r\n\r\n", 1)[-1].decode("utf-8", errors="replace").lower()
+        self.date = date_.date()
+
+
+def _fifa_html(rng: random.Random, nombre: str, team: str, padding: int) -> str:
+    """Cuerpo HTML con el formato que entiende extract_fifa_tickets"""
+    team_b = rng.choice([x for x in _TEAMS if x != team])
+    qty = rng.randint(1, 4)
+    price = rng.choice([60, 140, 250, 450, 700]) * qty
+    ronda = rng.choice(["Group Stage", f"Match {rng.randint(1, 104)}", "Round of 16", "Semi-final 1"])
+    tier = rng.choice(["Supporter Entry Tier", "Supporter Standard Tier", f"Category {rng.randint(1, 4)}"])
+    relleno = "<p>" + ("Lorem ipsum dolor sit amet. " * (padding // 28 + 1))[:padding] + "</p>"
+    return (
+        f"<html><body><p>Dear {nombre},</p>"
+        f"<p>Your ticket application number is <b>{rng.randint(100000, 999999)}</b></p>"
+        f"<p>My Team - {team}</p>"
+        f"<table><tr><td>{ronda} {team} vs {team_b}</td></tr>"
+        f"<tr><td>Conditional Tickets</td></tr><tr><td>{qty} tickets</td></tr>"
+        f"<tr><td>{tier}</td></tr><tr><td>{nombre}</td></tr>"
+        f"<tr><td>{price:,.2f} USD</td></tr></table>{relleno}</body></html>"
+    )
+
+
+def generar_corpus(n: int = 500, seed: int = 2026, fifa_ratio: float = 0.6,
+                   padding: int = 20000, dias: int = 30) -> List[StubMessage]:
+    """
+    Genera n mensajes (fifa_ratio de ellos estilo FIFA) ordenados por fecha.
+    padding: bytes aproximados de relleno HTML por mensaje (tamano realista).
+    """
+    rng = random.Random(seed)
+    ahora = datetime.now()
+    mensajes = []
+    for i in range(n):
+        fecha = ahora - timedelta(days=dias * (n - i) / max(n, 1), minutes=rng.randint(0, 59))
+        nombre = f"{rng.choice(['Juan', 'Maria', 'Luis', 'Ana', 'Pedro'])} {rng.choice(['Garcia', 'Lopez', 'Perez'])}"
+        to_addr = f"fan{i:05d}@icloud.com"
+        if rng.random() < fifa_ratio:
+            from_addr = "FIFA World Cup 2026 <noreply@tickets.fifa.com>"
+            subject = rng.choice(_SUBJECTS_FIFA)
+            body = _fifa_html(rng, nombre, rng.choice(_TEAMS), padding)
+            ctype = "text/html"
+        else:
+            from_addr = rng.choice(["News <news@example.com>", "Shop <orders@shop.example>"])
+            subject = rng.choice(_SUBJECTS_OTROS)
+            body = ("Hello,\r\n" + "Some plain text content. " * (padding // 25 + 1))[:padding]
+            ctype = "text/plain"
+        raw = (
+            f"From: {from_addr}\r\n"
+            f"To: {nombre} <{to_addr}>\r\n"
+            f"Subject: {subject}\r\n"
+            f"Date: {email.utils.format_datetime(fecha.astimezone())}\r\n"
+            f"Message-ID: <{i}.{seed}@stub.local>\r\n"
+            f"MIME-Version: 1.0\r\n"
+            f"Content-Type: {ctype}; charset=utf-8\r\n"
+            f"\r\n{body}"
+        ).encode("utf-8")
+        flags = {"\\Seen"} if rng.random() < 0.5 else set()
+        mensajes.append(StubMessage(raw, fecha, flags, modseq=i + 1))
+    return mensajes
+
+
+# ==================== PROTOCOLO ====================
+
+def _tokenize(text: str) -> List[str]:
+    """Tokeniza argumentos IMAP (strings entre comillas, parentesis, atomos)"""
+    out = []
+    for m in _TOKEN_RE.finditer(text):
+        if m.group(1) is not None:
+            out.append(m.group(1).replace('\\"', '"').replace('\\\\', '\\'))
+        else:
+            out.append(m.group(2))
+    return out
+
+
+def _parse_imap_date(s: str):
+    d, mon, y = s.split("-")
+    return datetime(int(y), _MONTHS[mon.title()], int(d)).date()
+
+
+def _parse_seq_set(spec: str, total: int) -> List[int]:
+    """Convierte '1,3:5,7:*' en lista de numeros de secuencia validos"""
+    seqs = []
+    for part in spec.split(","):
+        if ":" in part:
+            a, b = part.split(":", 1)
+            a = total if a == "*" else int(a)
+            b = total if b == "*" else int(b)
+            lo, hi = min(a, b), max(a, b)
+            seqs.extend(range(lo, hi + 1))
+        else:
+            seqs.append(total if part == "*" else int(part))
+    return [s for s in seqs if 1 <= s <= total]
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """Una sesion IMAP por conexion TCP"""
+
+    def _send(self, data: bytes):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        self.wfile.write(data)
+        self.wfile.flush()
+        self.server.add_bytes(len(data))
+
+    def handle(self):
+        self.selected = False
+        self.condstore = False
+        self._send(f"* OK [CAPABILITY {self.server.capability_line}] stub ready\r\n".encode())
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            line = line.decode("utf-8", errors="replace").rstrip("\r\n")
+            if not line:
+                continue
+            parts = line.split(" ", 2)
+            tag = parts[0]
+            cmd = parts[1].upper() if len(parts) > 1 else ""
+            args = parts[2] if len(parts) > 2 else ""
+            handler = getattr(self, f"cmd_{cmd}", None)
+            if handler is None:
+                self._send(f"{tag} BAD unknown command\r\n".encode())
+                continue
+            try:
+                if handler(tag, args) is False:
+                    return
+            except Exception as e:
+                self._send(f"{tag} BAD {e}\r\n".encode())
+
+    # --- comandos ---
+
+    def cmd_CAPABILITY(self, tag, args):
+        self._send(f"* CAPABILITY {self.server.capability_line}\r\n{tag} OK CAPABILITY completed\r\n".encode())
+
+    def cmd_NOOP(self, tag, args):
+        self._send(f"{tag} OK NOOP completed\r\n".encode())
+
+    def cmd_LOGIN(self, tag, args):
+        self._send(f"{tag} OK LOGIN completed\r\n".encode())
+
+    def cmd_ENABLE(self, tag, args):
+        enabled = [c for c in _tokenize(args) if c.upper() in self.server.capabilities]
+        if any(c.upper() in ("CONDSTORE", "QRESYNC") for c in enabled):
+            self.condstore = True
+        self._send(f"* ENABLED {' '.join(enabled)}\r\n{tag} OK ENABLE completed\r\n".encode())
+
+    def cmd_SELECT(self, tag, args):
+        self.selected = True
+        total = len(self.server.mailbox)
+        self._send((
+            f"* FLAGS (\\Answered \\Flagged \\Deleted \\Seen \\Draft)\r\n"
+            f"* {total} EXISTS\r\n* 0 RECENT\r\n"
+            f"* OK [UIDVALIDITY 1] UIDs valid\r\n"
+            + (f"* OK [HIGHESTMODSEQ {self.server.highest_modseq()}] Highest\r\n" if self.condstore else "")
+            + f"{tag} OK [READ-WRITE] SELECT completed\r\n"
+        ).encode())
+
+    cmd_EXAMINE = cmd_SELECT
+
+    def cmd_LOGOUT(self, tag, args):
+        self._send(f"* BYE stub closing\r\n{tag} OK LOGOUT completed\r\n".encode())
+        return False
+
+    def cmd_SEARCH(self, tag, args):
+        tokens = _tokenize(args)
+        if tokens and tokens[0].upper() == "CHARSET":
+            if not self.server.charset_ok:
+                self._send(f"{tag} NO [BADCHARSET] CHARSET not supported\r\n".encode())
+                return
+            tokens = tokens[2:]
+        preds = []
+        i = 0
+        while i < len(tokens):
+            key = tokens[i].upper()
+            if key in ("ALL", "(", ")"):
+                i += 1
+                continue
+            if key == "SEEN":
+                preds.append(lambda m: "\\Seen" in m.flags)
+                i += 1
+            elif key == "UNSEEN":
+                preds.append(lambda m: "\\Seen" not in m.flags)
+                i += 1
+            elif key in ("FROM", "TO", "SUBJECT", "BODY", "TEXT") and i + 1 < len(tokens):
+                val = tokens[i + 1].lower()
+                attr = {"FROM": "from_", "TO": "to", "SUBJECT": "subject",
+                        "BODY": "body", "TEXT": "body"}[key]
+                preds.append(lambda m, a=attr, v=val: v in getattr(m, a))
+                i += 2
+            elif key in ("SINCE", "BEFORE", "ON") and i + 1 < len(tokens):
+                d = _parse_imap_date(tokens[i + 1])
+                if key == "SINCE":
+                    preds.append(lambda m, d=d: m.date >= d)
+                elif key == "BEFORE":
+                    preds.append(lambda m, d=d: m.date < d)
+                else:
+                    preds.append(lambda m, d=d: m.date == d)
+                i += 2
+            else:
+                self._send(f"{tag} BAD unsupported search key {key}\r\n".encode())
+                return
+        ids = [str(n) for n, m in enumerate(self.server.mailbox, 1) if all(p(m) for p in preds)]
+        self._send(f"* SEARCH {' '.join(ids)}\r\n{tag} OK SEARCH completed\r\n".encode())
+
+    def cmd_FETCH(self, tag, args):
+        spec, items = args.split(" ", 1)
+        items_up = items.upper()
+        changed = re.search(r"CHANGEDSINCE\s+(\d+)", items_up)
+        changedsince = int(changed.group(1)) if changed else None
+        total = len(self.server.mailbox)
+        out = []
+        for seq in _parse_seq_set(spec, total):
+            m = self.server.mailbox[seq - 1]
+            if changedsince is not None and m.modseq <= changedsince:
+                continue
+            fields = []
+            if "FLAGS" in items_up:
+                fields.append(f"FLAGS ({' '.join(sorted(m.flags))})".encode())
+            if "BODY" in items_up or "RFC822" in items_up:
+                if "PEEK" not in items_up:
+                    m.flags.add("\\Seen")
+                    m.modseq = self.server.next_modseq()
+                fields.append(b"BODY[] {%d}\r\n" % len(m.raw) + m.raw)
+            if self.condstore and ("MODSEQ" in items_up or changedsince is not None):
+                fields.append(b"MODSEQ (%d)" % m.modseq)
+            out.append(b"* %d FETCH (" % seq + b" ".join(fields) + b")\r\n")
+        out.append(f"{tag} OK FETCH completed\r\n".encode())
+        self._send(b"".join(out))
+
+    def cmd_STORE(self, tag, args):
+        spec, op, flags = args.split(" ", 2)
+        flags = {f for f in _tokenize(flags) if f not in ("(", ")")}
+        out = []
+        for seq in _parse_seq_set(spec, len(self.server.mailbox)):
+            m = self.server.mailbox[seq - 1]
+            if op.upper().startswith("+"):
+                m.flags |= flags
+            elif op.upper().startswith("-"):
+                m.flags -= flags
+            else:
+                m.flags = set(flags)
+            m.modseq = self.server.next_modseq()
+            if ".SILENT" not in op.upper():
+                modseq = f" MODSEQ ({m.modseq})" if self.condstore else ""
+                out.append(f"* {seq} FETCH (FLAGS ({' '.join(sorted(m.flags))}){modseq})\r\n".encode())
+        out.append(f"{tag} OK STORE completed\r\n".encode())
+        self._send(b"".join(out))
+
+
+class StubImapServer(socketserver.ThreadingTCPServer):
+    """
+    Servidor IMAP local en un hilo de fondo.
+
+    Uso:
+        with StubImapServer(generar_corpus(500), latency=0.02) as srv:
+            manager = ImapManager(conn_factory=srv.conn_factory)
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, mailbox: Optional[List[StubMessage]] = None, latency: float = 0.0,
+                 capabilities=("IMAP4rev1", "ENABLE", "UTF8=ACCEPT", "CONDSTORE"),
+                 charset_ok: bool = True,
+                 host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), _Handler)
+        self.mailbox = mailbox if mailbox is not None else generar_corpus()
+        self.latency = latency
+        self.capabilities = {c.upper() for c in capabilities}
+        self.capability_line = " ".join(capabilities)
+        self.charset_ok = charset_ok
+        self._bytes_lock = threading.Lock()
+        self.bytes_sent = 0
+        self._modseq_lock = threading.Lock()
+        self._modseq = max((m.modseq for m in self.mailbox), default=0)
+        self._thread = None
+
+    def highest_modseq(self) -> int:
+        with self._modseq_lock:
+            return self._modseq
+
+    def next_modseq(self) -> int:
+        with self._modseq_lock:
+            self._modseq += 1
+            return self._modseq
+
+    def set_flags(self, seq: int, flags):
+        """Cambia flags desde fuera de IMAP (simula otro cliente) y sube MODSEQ"""
+        m = self.mailbox[seq - 1]
+        m.flags = set(flags)
+        m.modseq = self.next_modseq()
+
+    def add_bytes(self, n: int):
+        with self._bytes_lock:
+            self.bytes_sent += n
+
+    def reset_bytes(self) -> int:
+        """Devuelve los bytes enviados desde el ultimo reset y pone el contador a 0"""
+        with self._bytes_lock:
+            n, self.bytes_sent = self.bytes_sent, 0
+            return n
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def conn_factory(self, host: str = None):
+        """Factory compatible con ImapManager(conn_factory=...) (IMAP sin TLS)"""
+        import imaplib
+        return imaplib.IMAP4(self.server_address[0], self.port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
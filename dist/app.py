@@ -33,6 +33,11 @@ st.set_page_config(
     layout="wide"
 )
 
+# === PRECARGA MODELO OCR ===
+# En segundo plano; solo la primera ejecucion del proceso la lanza (las demas no hacen nada)
+from modules.comprobantes_modelo import modelo_ocr, precargar_modelo_ocr
+precargar_modelo_ocr()
+
 # === CONEXION BD PERMISOS ===
 def _get_permisos_conn():
     """Obtiene conexion a Supabase para permisos."""
@@ -387,6 +392,37 @@ if st.session_state.show_config:
 
         st.markdown("---")
 
+        # === MODELO OCR ===
+        st.subheader("🧠 Modelo OCR (EasyOCR)")
+        estado_ocr = modelo_ocr().estado()
+        fases_ocr = {"sin_cargar": "⚪ Sin cargar", "cargando": "⏳ Cargando", "listo": "✅ Listo", "error": "❌ Error"}
+
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Estado", fases_ocr.get(estado_ocr['fase'], estado_ocr['fase']))
+        col2.metric("Tiempo de carga", f"{estado_ocr['segundos']} s" if estado_ocr['segundos'] is not None else "-")
+        col3.metric("Memoria del modelo", f"{estado_ocr['memoria_modelo_mb']} MB" if estado_ocr['memoria_modelo_mb'] is not None else "-")
+        col4.metric("Memoria del proceso", f"{estado_ocr['memoria_proceso_mb']} MB" if estado_ocr['memoria_proceso_mb'] is not None else "-")
+
+        if estado_ocr['origen']:
+            st.caption(f"Última carga: {estado_ocr['origen']} · cargas en este proceso: {estado_ocr['cargas']}")
+        if estado_ocr['error']:
+            st.error(f"Error cargando EasyOCR: {estado_ocr['error']}")
+
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            if st.button("🔄 Cargar ahora", use_container_width=True, disabled=estado_ocr['fase'] in ("listo", "cargando")):
+                modelo_ocr().precargar(reintentar=True)
+                st.rerun()
+        with col2:
+            if st.button("♻️ Liberar modelo", use_container_width=True, disabled=estado_ocr['fase'] != "listo"):
+                modelo_ocr().liberar()
+                st.rerun()
+        with col3:
+            if st.button("🔃 Actualizar", use_container_width=True):
+                st.rerun()
+
+        st.markdown("---")
+
         # === INFORMACIÓN ===
         with st.expander("ℹ️ Información"):
             st.markdown("""
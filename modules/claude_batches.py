@@ -0,0 +1,271 @@
+"""
+Modo lote de Claude Vision (Message Batches API).
+
+Para ejecuciones grandes (miles de comprobantes): las imagenes que el OCR no
+resuelve se envian como uno o varios lotes, los IDs quedan guardados en
+lotes_claude.json (carpeta del usuario) y un hilo en segundo plano consulta
+su estado y fusiona los resultados en el cache cuando terminan. La sesion de
+Streamlit puede cerrarse; al volver a verificar, esas imagenes salen del cache.
+
+El cliente se inyecta (`cliente=`): anthropic.Anthropic en produccion o el
+stub local benchmarks/claude_batches_stub.py para pruebas sin API.
+"""
+
+import base64
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+from modules.claude_vision import MAX_TOKENS, MODELO, construir_contenido, parsear_respuesta
+from modules.comprobantes_cache import abrir_cache
+from modules.comprobantes_imagen import preparar_para_claude
+
+# Limites de la API por lote (con margen): 100.000 peticiones / 256 MB
+MAX_PETICIONES_LOTE = 10_000
+MAX_BYTES_LOTE = 200 * 1024 * 1024
+
+ESTADOS_FINALES = ('ended',)
+INTERVALO_SONDEO = 60
+# Consultas fallidas seguidas antes de dar un lote por fallido (sin sondeo automatico)
+MAX_FALLOS_CONSULTA = int(os.getenv('CLAUDE_LOTES_MAX_FALLOS', '10'))
+# Tope de la espera entre rondas con errores (backoff exponencial)
+ESPERA_MAX_SONDEO = 30 * 60
+
+
+class GestorLotes:
+    """
+    Envia, persiste, consulta y fusiona lotes de un usuario.
+    ruta_lotes: JSON con los lotes; ruta_cache: cache_resultados.db del usuario.
+    """
+
+    def __init__(self, ruta_lotes, ruta_cache, cliente):
+        self.ruta_lotes = Path(ruta_lotes)
+        self.ruta_cache = Path(ruta_cache)
+        self.cliente = cliente
+        self._lock = threading.RLock()
+
+    # ---- persistencia ----
+
+    def _leer(self) -> dict:
+        if not self.ruta_lotes.exists():
+            return {}
+        try:
+            with open(self.ruta_lotes, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"[Lotes] Error leyendo {self.ruta_lotes}: {e}")
+            return {}
+
+    def _escribir(self, lotes: dict):
+        tmp = self.ruta_lotes.with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(lotes, f, indent=2, ensure_ascii=False)
+        tmp.replace(self.ruta_lotes)
+
+    def lotes(self) -> dict:
+        with self._lock:
+            return self._leer()
+
+    def pendientes(self, incluir_fallidos: bool = False) -> list:
+        """Lotes sin fusionar; los fallidos (demasiadas consultas con error) solo con incluir_fallidos"""
+        return [
+            bid for bid, lote in self.lotes().items()
+            if not lote.get('fusionado') and (incluir_fallidos or not lote.get('fallido'))
+        ]
+
+    # ---- envio ----
+
+    @staticmethod
+    def _peticion(imagen_hash: str, ruta_imagen: str) -> tuple:
+        with open(ruta_imagen, 'rb') as f:
+            imagen_bytes = f.read()
+        imagen_bytes, media_type = preparar_para_claude(imagen_bytes)
+        imagen_base64 = base64.standard_b64encode(imagen_bytes).decode('utf-8')
+        peticion = {
+            'custom_id': imagen_hash,
+            'params': {
+                'model': MODELO,
+                'max_tokens': MAX_TOKENS,
+                'messages': [{'role': 'user', 'content': construir_contenido(imagen_base64, media_type)}],
+            },
+        }
+        return peticion, len(imagen_base64)
+
+    def enviar(self, imagenes: list) -> list:
+        """
+        imagenes: lista de (hash, ruta). custom_id = hash de la imagen.
+        Divide en varios lotes si se superan los limites. Retorna los batch IDs.
+        """
+        ids = []
+        bloque, archivos, bytes_bloque = [], {}, 0
+        vistos = set()
+        for imagen_hash, ruta in imagenes:
+            if imagen_hash in vistos:
+                continue
+            vistos.add(imagen_hash)
+            peticion, tamano = self._peticion(imagen_hash, str(ruta))
+            if bloque and (len(bloque) >= MAX_PETICIONES_LOTE or bytes_bloque + tamano > MAX_BYTES_LOTE):
+                ids.append(self._crear_lote(bloque, archivos))
+                bloque, archivos, bytes_bloque = [], {}, 0
+            bloque.append(peticion)
+            archivos[imagen_hash] = Path(ruta).name
+            bytes_bloque += tamano
+        if bloque:
+            ids.append(self._crear_lote(bloque, archivos))
+        return ids
+
+    def _crear_lote(self, peticiones: list, archivos: dict) -> str:
+        lote = self.cliente.messages.batches.create(requests=peticiones)
+        with self._lock:
+            lotes = self._leer()
+            lotes[lote.id] = {
+                'creado': datetime.now().isoformat(),
+                'estado': lote.processing_status,
+                'peticiones': len(peticiones),
+                'archivos': archivos,
+                'ruta_cache': str(self.ruta_cache),
+                'fusionado': False,
+            }
+            self._escribir(lotes)
+        print(f"[Lotes] Lote {lote.id} enviado con {len(peticiones)} imagenes")
+        return lote.id
+
+    # ---- consulta / fusion ----
+
+    def consultar(self, batch_id: str) -> dict:
+        """Actualiza el estado del lote; si ha terminado, fusiona los resultados"""
+        lote = self.cliente.messages.batches.retrieve(batch_id)
+        with self._lock:
+            lotes = self._leer()
+            info = lotes.get(batch_id, {})
+            info['estado'] = lote.processing_status
+            for clave in ('fallos_consulta', 'ultimo_error', 'fallido'):
+                info.pop(clave, None)
+            conteos = getattr(lote, 'request_counts', None)
+            if conteos is not None:
+                info['conteos'] = {
+                    k: getattr(conteos, k, 0)
+                    for k in ('processing', 'succeeded', 'errored', 'canceled', 'expired')
+                }
+            lotes[batch_id] = info
+            self._escribir(lotes)
+        if lote.processing_status in ESTADOS_FINALES and not info.get('fusionado'):
+            self.fusionar(batch_id)
+        return self.lotes().get(batch_id, {})
+
+    def fusionar(self, batch_id: str) -> int:
+        """Guarda en el cache los resultados correctos del lote. Retorna cuantos"""
+        cache = abrir_cache(self.lotes().get(batch_id, {}).get('ruta_cache') or self.ruta_cache)
+        guardados, fallidos = 0, []
+        for entrada in self.cliente.messages.batches.results(batch_id):
+            resultado = entrada.result
+            if resultado.type != 'succeeded':
+                fallidos.append(entrada.custom_id)
+                continue
+            try:
+                datos = parsear_respuesta(resultado.message.content[0].text)
+            except Exception:
+                fallidos.append(entrada.custom_id)
+                continue
+            cache.guardar(entrada.custom_id, {
+                'email': datos.get('email'),
+                'match': datos.get('match'),
+                'cantidad': datos.get('cantidad'),
+                'categoria': datos.get('categoria'),
+                'metodo': 'Claude Vision (lote)',
+                'fecha_cache': datetime.now().isoformat()
+            }, namespace='claude')
+            guardados += 1
+        cache.sincronizar()
+
+        with self._lock:
+            lotes = self._leer()
+            info = lotes.get(batch_id, {})
+            info.update({
+                'fusionado': True,
+                'guardados': guardados,
+                # Los fallidos no van al cache: la siguiente verificacion normal los reintenta
+                'fallidos': [info.get('archivos', {}).get(h, h) for h in fallidos],
+                'fusionado_en': datetime.now().isoformat(),
+            })
+            lotes[batch_id] = info
+            self._escribir(lotes)
+        print(f"[Lotes] Lote {batch_id}: {guardados} resultados en cache, {len(fallidos)} fallidos")
+        return guardados
+
+    def _registrar_fallo(self, batch_id: str, error: Exception):
+        """Cuenta una consulta fallida; al llegar a MAX_FALLOS_CONSULTA el lote queda fallido"""
+        with self._lock:
+            lotes = self._leer()
+            if batch_id not in lotes:
+                return
+            info = lotes[batch_id]
+            info['fallos_consulta'] = info.get('fallos_consulta', 0) + 1
+            info['ultimo_error'] = str(error)[:300]
+            if info['fallos_consulta'] >= MAX_FALLOS_CONSULTA and not info.get('fallido'):
+                info['fallido'] = True
+                print(f"[Lotes] Lote {batch_id} marcado como fallido tras {info['fallos_consulta']} consultas con error")
+            self._escribir(lotes)
+
+    def sondear_pendientes(self, incluir_fallidos: bool = False) -> int:
+        """
+        Consulta los lotes pendientes. incluir_fallidos reintenta tambien los
+        fallidos (boton de la pagina). Retorna cuantas consultas fallaron.
+        """
+        errores = 0
+        for batch_id in self.pendientes(incluir_fallidos):
+            try:
+                self.consultar(batch_id)
+            except Exception as e:
+                errores += 1
+                print(f"[Lotes] Error consultando {batch_id}: {e}")
+                self._registrar_fallo(batch_id, e)
+        return errores
+
+    def olvidar(self, batch_id: str):
+        with self._lock:
+            lotes = self._leer()
+            lotes.pop(batch_id, None)
+            self._escribir(lotes)
+
+
+# ============== SONDEO EN SEGUNDO PLANO ==============
+
+# Un hilo por fichero de lotes; termina cuando no quedan pendientes (los
+# lotes fallidos ya no cuentan)
+_sondeos = {}
+_sondeos_lock = threading.Lock()
+
+
+def _bucle_sondeo(gestor: GestorLotes, intervalo: float):
+    clave = str(gestor.ruta_lotes)
+    rondas_con_error = 0
+    try:
+        while gestor.pendientes():
+            if gestor.sondear_pendientes():
+                rondas_con_error += 1
+            else:
+                rondas_con_error = 0
+            if gestor.pendientes():
+                # Con errores seguidos la espera se duplica, hasta ESPERA_MAX_SONDEO
+                time.sleep(min(intervalo * 2 ** min(rondas_con_error, 16), max(intervalo, ESPERA_MAX_SONDEO)))
+    finally:
+        with _sondeos_lock:
+            _sondeos.pop(clave, None)
+
+
+def iniciar_sondeo(gestor: GestorLotes, intervalo: float = INTERVALO_SONDEO) -> bool:
+    """Arranca (si no lo esta ya) el hilo que consulta y fusiona los lotes pendientes"""
+    clave = str(gestor.ruta_lotes)
+    with _sondeos_lock:
+        hilo = _sondeos.get(clave)
+        if hilo is not None and hilo.is_alive():
+            return False
+        hilo = threading.Thread(target=_bucle_sondeo, args=(gestor, intervalo),
+                                name=f"lotes-{gestor.ruta_lotes.parent.name}", daemon=True)
+        _sondeos[clave] = hilo
+        hilo.start()
+        return True
@@ -0,0 +1,512 @@
+"""
+Extraccion de comprobantes con Claude Vision.
+
+Motor asincrono con:
+- un semaforo global de concurrencia (peticiones en vuelo),
+- limitador tipo token bucket alimentado por las cabeceras
+  anthropic-ratelimit-* de cada respuesta,
+- reintentos con backoff exponencial con jitter que respetan `retry-after`
+  en los 429 / 529.
+
+El event loop corre en un hilo propio; `MotorVision.extraer` es el puente
+sincrono que usan los workers del ThreadPoolExecutor de la pagina.
+
+Variables de entorno:
+    CLAUDE_VISION_CONCURRENCIA  (peticiones simultaneas, por defecto 8)
+"""
+
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+import anthropic
+
+MODELO = "claude-sonnet-4-20250514"
+MAX_TOKENS = 200
+CONCURRENCIA = int(os.getenv('CLAUDE_VISION_CONCURRENCIA', '8'))
+BACKOFF_MAX = 60.0
+# Tokens de entrada aproximados por peticion (imagen ~1.15 MP + prompt)
+TOKENS_POR_PETICION = 1800
+
+# Instruccion de cada campo (tambien se usan sueltas al pedir solo algunos campos)
+INSTRUCCIONES_CAMPO = {
+    'email': """**email**: El email que aparece en el campo "Transfer Recipient's email address" (dentro del modal/formulario)""",
+    'match': """**match**: El numero de partido que aparece en la parte SUPERIOR de la imagen (formato "Match X" o "Match XX")""",
+    'cantidad': """**cantidad**: La cantidad de tickets que se estan TRANSFIRIENDO. IMPORTANTE: Busca "X tickets" en la parte INFERIOR de la imagen (en la barra de abajo, cerca del boton "TRANSFER TICKET(S)"). NO uses el numero de arriba que muestra el total de tickets disponibles.""",
+    'categoria': """**categoria**: La categoria que aparece junto a los tickets (formato "Category X")""",
+}
+_EJEMPLO_CAMPO = {'email': '"email@ejemplo.com"', 'match': '25', 'cantidad': '4', 'categoria': '3'}
+
+_INSTRUCCIONES_CAMPOS = "Extrae los siguientes datos que estan visibles en la imagen:\n" + "\n".join(
+    f"{i}. {texto}" for i, texto in enumerate(INSTRUCCIONES_CAMPO.values(), 1)
+) + """
+
+IMPORTANTE:
+- El match SIEMPRE esta en la parte superior de la imagen, no uses el que pueda aparecer detras del modal
+- El email esta dentro del campo de texto del formulario
+- La cantidad de tickets a transferir esta en la parte INFERIOR de la pantalla (barra de abajo), NO en la parte superior. La parte superior muestra el total, pero la inferior muestra los seleccionados con checkbox."""
+
+PROMPT_COMPROBANTE = """Analiza esta imagen de un comprobante de tickets del Mundial FIFA 2026.
+
+""" + _INSTRUCCIONES_CAMPOS + """
+
+Responde SOLO con un JSON valido en este formato exacto:
+{"email": "email@ejemplo.com", "match": 25, "cantidad": 4, "categoria": 3}
+
+Si no puedes leer algun campo, usa null para ese campo."""
+
+# Varias imagenes por peticion: el prompt largo se paga una vez por grupo
+PROMPT_MULTI = """Arriba hay {n} imagenes de comprobantes de tickets del Mundial FIFA 2026, etiquetadas "Imagen 1" a "Imagen {n}". Analiza CADA imagen por separado.
+
+""" + _INSTRUCCIONES_CAMPOS + """
+
+Responde SOLO con un array JSON valido con un objeto por imagen, en orden, con este formato exacto:
+[{{"imagen": 1, "email": "email@ejemplo.com", "match": 25, "cantidad": 4, "categoria": 3}}, ...]
+
+Si no puedes leer algun campo de una imagen, usa null para ese campo."""
+MAX_TOKENS_POR_IMAGEN = 90
+MAX_TOKENS_CAMPOS = 120
+
+
+# ============== PROMPT / RESPUESTA ==============
+
+def construir_contenido(imagen_base64: str, media_type: str) -> list:
+    """Bloques de contenido del mensaje (imagen + prompt)"""
+    return [
+        {
+            "type": "image",
+            "source": {
+                "type": "base64",
+                "media_type": media_type,
+                "data": imagen_base64
+            }
+        },
+        {
+            "type": "text",
+            "text": PROMPT_COMPROBANTE
+        }
+    ]
+
+
+def construir_contenido_multi(imagenes: list) -> list:
+    """imagenes: lista de (imagen_base64, media_type). Cada imagen va precedida de su etiqueta"""
+    contenido = []
+    for i, (imagen_base64, media_type) in enumerate(imagenes, 1):
+        contenido.append({"type": "text", "text": f"Imagen {i}:"})
+        contenido.append({
+            "type": "image",
+            "source": {"type": "base64", "media_type": media_type, "data": imagen_base64}
+        })
+    contenido.append({"type": "text", "text": PROMPT_MULTI.format(n=len(imagenes))})
+    return contenido
+
+
+def construir_contenido_campos(imagen_base64: str, media_type: str, campos: list, zona: str = None) -> list:
+    """
+    Prompt reducido: solo los campos que el OCR no pudo leer con confianza.
+    zona: si la imagen es un recorte (p.ej. "barra inferior"), se indica en el prompt.
+    """
+    origen = f"este recorte ({zona}) de" if zona else "esta imagen de"
+    lineas = "\n".join(f"{i}. {INSTRUCCIONES_CAMPO[c]}" for i, c in enumerate(campos, 1))
+    ejemplo = ", ".join(f'"{c}": {_EJEMPLO_CAMPO[c]}' for c in campos)
+    prompt = (
+        f"Analiza {origen} un comprobante de tickets del Mundial FIFA 2026.\n\n"
+        f"Extrae SOLO estos datos:\n{lineas}\n\n"
+        f"Responde SOLO con un JSON valido en este formato exacto:\n{{{ejemplo}}}\n\n"
+        "Si no puedes leer algun campo, usa null para ese campo."
+    )
+    return [
+        {"type": "image", "source": {"type": "base64", "media_type": media_type, "data": imagen_base64}},
+        {"type": "text", "text": prompt}
+    ]
+
+
+def limpiar_json_respuesta(respuesta_texto: str) -> str:
+    """Quita los ``` (y el 'json') que a veces envuelven la respuesta"""
+    respuesta_texto = respuesta_texto.strip()
+    if respuesta_texto.startswith('```'):
+        respuesta_texto = respuesta_texto.split('```')[1]
+        if respuesta_texto.startswith('json'):
+            respuesta_texto = respuesta_texto[4:]
+        respuesta_texto = respuesta_texto.strip()
+    return respuesta_texto
+
+
+def normalizar_datos(datos: dict) -> dict:
+    """Convierte el JSON de Claude al formato de resultado de la pagina"""
+    return {
+        'email': datos.get('email', '').lower() if datos.get('email') else None,
+        'match': datos.get('match'),
+        'cantidad': datos.get('cantidad'),
+        'categoria': f"Category {datos.get('categoria')}" if datos.get('categoria') else None,
+        'metodo': 'Claude Vision',
+        'cache': False
+    }
+
+
+def parsear_respuesta(respuesta_texto: str) -> dict:
+    return normalizar_datos(json.loads(limpiar_json_respuesta(respuesta_texto)))
+
+
+def _item_valido(item) -> bool:
+    """Valida un objeto de la respuesta multi-imagen (tipos y rangos razonables)"""
+    if not isinstance(item, dict):
+        return False
+    email, match, cantidad, categoria = (item.get(k) for k in ('email', 'match', 'cantidad', 'categoria'))
+    if email is not None and (not isinstance(email, str) or '@' not in email):
+        return False
+    if match is not None and (not isinstance(match, int) or not 1 <= match <= 200):
+        return False
+    if cantidad is not None and (not isinstance(cantidad, int) or not 1 <= cantidad <= 20):
+        return False
+    if categoria is not None and not str(categoria).strip().isdigit():
+        return False
+    return True
+
+
+def parsear_respuesta_multi(respuesta_texto: str, n: int) -> list:
+    """
+    Retorna una lista de n resultados (None en los items ausentes o invalidos,
+    que se reintentan de uno en uno). Lanza excepcion si no es un array JSON.
+    """
+    datos = json.loads(limpiar_json_respuesta(respuesta_texto))
+    if not isinstance(datos, list):
+        raise ValueError("La respuesta no es un array JSON")
+    resultados = [None] * n
+    for pos, item in enumerate(datos):
+        idx = item.get('imagen') if isinstance(item, dict) else None
+        idx = idx - 1 if isinstance(idx, int) and 1 <= idx <= n else (pos if len(datos) == n else None)
+        if idx is None or resultados[idx] is not None or not _item_valido(item):
+            continue
+        resultados[idx] = normalizar_datos(item)
+    return resultados
+
+
+def resultado_error(error: str, reintentos: int) -> dict:
+    return {
+        'email': None,
+        'match': None,
+        'cantidad': None,
+        'categoria': None,
+        'metodo': 'Claude Vision',
+        'error': error,
+        'reintentos': reintentos,
+        'cache': False
+    }
+
+
+# ============== LIMITE DE TASA ==============
+
+def _segundos_hasta(reset: Optional[str]) -> Optional[float]:
+    """Segundos hasta una fecha RFC 3339 de las cabeceras anthropic-ratelimit-*-reset"""
+    if not reset:
+        return None
+    try:
+        fecha = datetime.fromisoformat(reset.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return max(0.0, (fecha - datetime.now(timezone.utc)).total_seconds())
+
+
+def _retry_after(headers) -> Optional[float]:
+    valor = headers.get('retry-after') if headers is not None else None
+    try:
+        return float(valor) if valor is not None else None
+    except ValueError:
+        return None
+
+
+class LimitadorTasa:
+    """
+    Token bucket de peticiones. Empieza sin limite y se ajusta con las
+    cabeceras de la API: capacidad = requests-limit, recarga = limit/60 s.
+    Si quedan 0 peticiones (o no quedan tokens de entrada para otra imagen)
+    se pausa hasta el reset que indica la API.
+    Solo se usa desde el event loop del motor (no necesita lock).
+    """
+
+    def __init__(self):
+        self.capacidad = None
+        self.disponibles = None
+        self.recarga_por_s = None
+        self.pausa_hasta = 0.0
+        self._ultimo = time.monotonic()
+
+    def _recargar(self):
+        ahora = time.monotonic()
+        if self.capacidad is not None:
+            self.disponibles = min(self.capacidad, self.disponibles + (ahora - self._ultimo) * self.recarga_por_s)
+        self._ultimo = ahora
+
+    def pausar(self, segundos: float):
+        self.pausa_hasta = max(self.pausa_hasta, time.monotonic() + segundos)
+
+    def actualizar(self, headers):
+        if headers is None:
+            return
+        self._recargar()
+        limite = headers.get('anthropic-ratelimit-requests-limit')
+        restantes = headers.get('anthropic-ratelimit-requests-remaining')
+        if limite:
+            self.capacidad = float(limite)
+            self.recarga_por_s = self.capacidad / 60.0
+            if self.disponibles is None:
+                self.disponibles = self.capacidad
+        if restantes is not None and self.disponibles is not None:
+            self.disponibles = min(self.disponibles, float(restantes))
+            if float(restantes) <= 0:
+                self.pausar(_segundos_hasta(headers.get('anthropic-ratelimit-requests-reset')) or 1.0)
+
+        tokens_restantes = headers.get('anthropic-ratelimit-input-tokens-remaining')
+        if tokens_restantes is not None and float(tokens_restantes) < TOKENS_POR_PETICION:
+            espera = _segundos_hasta(headers.get('anthropic-ratelimit-input-tokens-reset'))
+            if espera:
+                self.pausar(espera)
+
+    async def adquirir(self):
+        while True:
+            ahora = time.monotonic()
+            if ahora < self.pausa_hasta:
+                await asyncio.sleep(self.pausa_hasta - ahora)
+                continue
+            self._recargar()
+            if self.capacidad is None or self.disponibles >= 1:
+                if self.capacidad is not None:
+                    self.disponibles -= 1
+                return
+            await asyncio.sleep((1 - self.disponibles) / self.recarga_por_s)
+
+
+# ============== MOTOR ==============
+
+class MotorVision:
+    """Cliente asincrono de Claude Vision con puente sincrono"""
+
+    def __init__(self, api_key: str, concurrencia: int = CONCURRENCIA, modelo: str = MODELO):
+        self.api_key = api_key
+        self.concurrencia = concurrencia
+        self.modelo = modelo
+        self.limitador = LimitadorTasa()
+        self.stats = {'peticiones': 0, 'reintentos': 0, 'rate_limit': 0, 'errores': 0,
+                      'grupos': 0, 'imagenes_agrupadas': 0, 'individuales': 0, 'parciales': 0}
+        # Los reintentos los gestiona el motor (respetando retry-after)
+        self._cliente = anthropic.AsyncAnthropic(api_key=api_key, max_retries=0)
+        self._loop = asyncio.new_event_loop()
+        self._semaforo = None
+        self._hilo = threading.Thread(target=self._loop.run_forever, name="claude-vision", daemon=True)
+        self._hilo.start()
+        asyncio.run_coroutine_threadsafe(self._crear_semaforo(), self._loop).result()
+
+    async def _crear_semaforo(self):
+        self._semaforo = asyncio.Semaphore(self.concurrencia)
+
+    @staticmethod
+    def _backoff(intento: int, base: float) -> float:
+        """Exponencial con jitter: entre la mitad y el total de base*2^intento"""
+        tope = min(BACKOFF_MAX, base * (2 ** intento))
+        return tope / 2 + random.uniform(0, tope / 2)
+
+    async def _llamar(self, contenido: list, max_tokens: int, procesar,
+                      max_reintentos: int, backoff_base: float) -> tuple:
+        """
+        Una peticion con limite de tasa, semaforo y reintentos. `procesar`
+        convierte el texto de la respuesta (si lanza excepcion se reintenta).
+        Retorna (resultado o None, intento, ultimo_error).
+        """
+        ultimo_error = None
+        for intento in range(max_reintentos):
+            espera = None
+            await self.limitador.adquirir()
+            async with self._semaforo:
+                try:
+                    self.stats['peticiones'] += 1
+                    raw = await self._cliente.messages.with_raw_response.create(
+                        model=self.modelo,
+                        max_tokens=max_tokens,
+                        messages=[{"role": "user", "content": contenido}]
+                    )
+                    self.limitador.actualizar(raw.headers)
+                    response = await raw.parse()
+                    return procesar(response.content[0].text), intento, None
+
+                except anthropic.APIStatusError as e:
+                    ultimo_error = str(e)
+                    headers = e.response.headers if e.response is not None else None
+                    self.limitador.actualizar(headers)
+                    if e.status_code == 429:
+                        self.stats['rate_limit'] += 1
+                        espera = _retry_after(headers) or self._backoff(intento, backoff_base)
+                        self.limitador.pausar(espera)
+                    elif e.status_code >= 500 or e.status_code in (408, 409):
+                        espera = _retry_after(headers) or self._backoff(intento, backoff_base)
+                    else:
+                        # 400/401/403/404...: reintentar no sirve
+                        break
+
+                except Exception as e:
+                    # Conexion, timeout o JSON invalido en la respuesta
+                    ultimo_error = str(e)
+                    espera = self._backoff(intento, backoff_base)
+
+            if intento < max_reintentos - 1:
+                self.stats['reintentos'] += 1
+                await asyncio.sleep(espera + random.uniform(0, 0.25))
+
+        return None, max_reintentos, ultimo_error
+
+    async def extraer_async(self, imagen_base64: str, media_type: str,
+                            max_reintentos: int = 3, backoff_base: float = 2.0) -> dict:
+        resultado, intento, ultimo_error = await self._llamar(
+            construir_contenido(imagen_base64, media_type), MAX_TOKENS, parsear_respuesta,
+            max_reintentos, backoff_base
+        )
+        if resultado is None:
+            self.stats['errores'] += 1
+            return resultado_error(f"Fallo despues de {max_reintentos} intentos: {ultimo_error}", max_reintentos)
+        resultado['reintentos'] = intento
+        return resultado
+
+    async def extraer_campos_async(self, imagen_base64: str, media_type: str, campos: list,
+                                   zona: str = None, max_reintentos: int = 3,
+                                   backoff_base: float = 2.0) -> dict:
+        """Solo `campos` (prompt reducido). Retorna {campo: valor} o un resultado con 'error'"""
+        def procesar(texto):
+            datos = parsear_respuesta(texto)
+            return {c: datos.get(c) for c in campos}
+
+        resultado, intento, ultimo_error = await self._llamar(
+            construir_contenido_campos(imagen_base64, media_type, campos, zona), MAX_TOKENS_CAMPOS,
+            procesar, max_reintentos, backoff_base
+        )
+        if resultado is None:
+            self.stats['errores'] += 1
+            return resultado_error(f"Fallo despues de {max_reintentos} intentos: {ultimo_error}", max_reintentos)
+        self.stats['parciales'] += 1
+        resultado['reintentos'] = intento
+        return resultado
+
+    def extraer_campos(self, imagen_base64: str, media_type: str, campos: list, zona: str = None,
+                       max_reintentos: int = 3, backoff_base: float = 2.0) -> dict:
+        return asyncio.run_coroutine_threadsafe(
+            self.extraer_campos_async(imagen_base64, media_type, campos, zona, max_reintentos, backoff_base),
+            self._loop
+        ).result()
+
+    async def extraer_multi_async(self, imagenes: list, max_reintentos: int = 3,
+                                  backoff_base: float = 2.0) -> list:
+        """
+        imagenes: lista de (imagen_base64, media_type). Una sola peticion para
+        todas; los items que faltan o no validan se piden de uno en uno.
+        """
+        if len(imagenes) == 1:
+            return [await self.extraer_async(*imagenes[0], max_reintentos, backoff_base)]
+
+        n = len(imagenes)
+        resultados, intento, _ = await self._llamar(
+            construir_contenido_multi(imagenes), MAX_TOKENS_POR_IMAGEN * n + 50,
+            lambda texto: parsear_respuesta_multi(texto, n),
+            # Pocos reintentos del grupo: si falla, cada imagen se reintenta sola
+            min(2, max_reintentos), backoff_base
+        )
+        self.stats['grupos'] += 1
+        resultados = resultados or [None] * n
+        pendientes = [i for i, r in enumerate(resultados) if r is None]
+        self.stats['imagenes_agrupadas'] += n - len(pendientes)
+        self.stats['individuales'] += len(pendientes)
+        individuales = await asyncio.gather(*(
+            self.extraer_async(*imagenes[i], max_reintentos, backoff_base) for i in pendientes
+        ))
+        for i, r in zip(pendientes, individuales):
+            resultados[i] = r
+        for r in resultados:
+            r.setdefault('reintentos', intento)
+        return resultados
+
+    def extraer(self, imagen_base64: str, media_type: str,
+                max_reintentos: int = 3, backoff_base: float = 2.0) -> dict:
+        """Puente sincrono: encola en el loop del motor y espera el resultado"""
+        futuro = asyncio.run_coroutine_threadsafe(
+            self.extraer_async(imagen_base64, media_type, max_reintentos, backoff_base), self._loop
+        )
+        return futuro.result()
+
+    def cerrar(self):
+        asyncio.run_coroutine_threadsafe(self._cliente.close(), self._loop).result(timeout=10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+class MotorAgrupado:
+    """
+    Micro-batcher sobre un MotorVision: junta las llamadas sincronas de los
+    hilos en grupos de `tamano` imagenes (o las que haya tras `espera_max`
+    segundos) y las envia en una sola peticion multi-imagen.
+    Misma interfaz que MotorVision.extraer; el estado del grupo solo se toca
+    desde el event loop del motor.
+    """
+
+    def __init__(self, motor: MotorVision, tamano: int = 6, espera_max: float = 1.0):
+        self.motor = motor
+        self.tamano = tamano
+        self.espera_max = espera_max
+        self._grupo = []
+        self._temporizador = None
+
+    @property
+    def stats(self) -> dict:
+        return self.motor.stats
+
+    async def _encolar(self, imagen_base64: str, media_type: str, max_reintentos: int, backoff_base: float):
+        loop = asyncio.get_running_loop()
+        futuro = loop.create_future()
+        self._grupo.append(((imagen_base64, media_type), futuro))
+        if len(self._grupo) >= self.tamano:
+            self._vaciar(max_reintentos, backoff_base)
+        elif self._temporizador is None:
+            self._temporizador = loop.call_later(self.espera_max, self._vaciar, max_reintentos, backoff_base)
+        return await futuro
+
+    def _vaciar(self, max_reintentos: int, backoff_base: float):
+        if self._temporizador is not None:
+            self._temporizador.cancel()
+            self._temporizador = None
+        grupo, self._grupo = self._grupo, []
+        if grupo:
+            asyncio.ensure_future(self._procesar(grupo, max_reintentos, backoff_base))
+
+    async def _procesar(self, grupo: list, max_reintentos: int, backoff_base: float):
+        try:
+            resultados = await self.motor.extraer_multi_async([img for img, _ in grupo], max_reintentos, backoff_base)
+        except Exception as e:
+            resultados = [resultado_error(str(e), 0)] * len(grupo)
+        for (_, futuro), resultado in zip(grupo, resultados):
+            if not futuro.done():
+                futuro.set_result(dict(resultado))
+
+    def extraer_campos(self, *args, **kwargs) -> dict:
+        """Las peticiones de campos sueltos no se agrupan"""
+        return self.motor.extraer_campos(*args, **kwargs)
+
+    def extraer(self, imagen_base64: str, media_type: str,
+                max_reintentos: int = 3, backoff_base: float = 2.0) -> dict:
+        return asyncio.run_coroutine_threadsafe(
+            self._encolar(imagen_base64, media_type, max_reintentos, backoff_base), self.motor._loop
+        ).result()
+
+
+# Un motor por API key, compartido entre reruns y sesiones (comparten cuota)
+_motores = {}
+_motores_lock = threading.Lock()
+
+
+def obtener_motor_vision(api_key: str) -> MotorVision:
+    with _motores_lock:
+        motor = _motores.get(api_key)
+        if motor is None:
+            motor = MotorVision(api_key)
+            _motores[api_key] = motor
+        return motor
@@ -0,0 +1,478 @@
+"""
+Cache persistente de extracciones de comprobantes.
+
+SQLite en modo WAL con una escritura (transaccion) por entrada: cada
+resultado de OCR / Claude Vision queda en disco en cuanto termina, aunque
+el proceso caiga a mitad de una ejecucion. Seguro para usar desde los
+hilos del ThreadPoolExecutor (una conexion compartida protegida por lock).
+
+Las entradas se direccionan por contenido (hash de la imagen) y se separan
+por namespace segun el metodo que las produjo ('ocr' / 'claude' / 'mixto',
+el fallback parcial OCR + Claude, que no sirve a ningun metodo "solo"). El cache
+tiene limite de entradas y de bytes (expulsion LRU) y caducidad por TTL.
+El hash de cada imagen (BLAKE2b, leido por bloques) se recuerda en una
+tabla indice (ruta, tamano, mtime_ns): si el fichero no ha cambiado no se
+vuelve a leer del disco. El indice se poda junto con las entradas expulsadas.
+
+Los limites se pueden ajustar con variables de entorno:
+    COMPROBANTES_CACHE_MAX_ENTRADAS, COMPROBANTES_CACHE_MAX_MB,
+    COMPROBANTES_CACHE_TTL_DIAS
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+NAMESPACES = ('ocr', 'claude', 'mixto')
+
+MAX_ENTRADAS = int(os.getenv('COMPROBANTES_CACHE_MAX_ENTRADAS', '20000'))
+MAX_BYTES = int(float(os.getenv('COMPROBANTES_CACHE_MAX_MB', '50')) * 1024 * 1024)
+TTL_DIAS = int(os.getenv('COMPROBANTES_CACHE_TTL_DIAS', '180'))
+
+# Lectura por bloques para el hash (no carga la imagen entera de golpe)
+HASH_CHUNK = 1024 * 1024
+# 32 bytes -> 64 caracteres hex; las claves antiguas (MD5) tienen 32
+HASH_DIGEST_SIZE = 32
+_LONGITUD_MD5 = 32
+
+# Cada cuantas escrituras se revisan los limites (la expulsion es un DELETE barato)
+_EXPULSAR_CADA = 50
+
+
+def namespace_de_metodo(metodo: Optional[str]) -> str:
+    """Namespace donde se guarda un resultado segun su campo 'metodo'"""
+    if not metodo or 'Claude' not in metodo:
+        return 'ocr'
+    # 'OCR + Claude (parcial)': campos leidos por OCR, no vale para solo_claude
+    return 'mixto' if 'OCR' in metodo else 'claude'
+
+
+def namespaces_para(metodo_extraccion: str) -> tuple:
+    """Namespaces validos (en orden de preferencia) para un metodo de extraccion"""
+    if metodo_extraccion == 'solo_claude':
+        return ('claude',)
+    if metodo_extraccion == 'solo_ocr':
+        return ('ocr',)
+    return ('claude', 'mixto', 'ocr')
+
+
+class CacheResultados:
+    """
+    Cache hash_imagen -> datos extraidos, con interfaz tipo dict
+    (`in`, `[]`, `len`, `items`) para no cambiar a los llamadores.
+    """
+
+    def __init__(self, ruta_db, ruta_json_legado=None, max_entradas: int = MAX_ENTRADAS,
+                 max_bytes: int = MAX_BYTES, ttl_dias: int = TTL_DIAS):
+        self.ruta_db = Path(ruta_db)
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self.ttl_dias = ttl_dias
+        self._lock = threading.RLock()
+        self._stats = {ns: {'hits': 0, 'misses': 0, 'expulsiones': 0} for ns in NAMESPACES}
+        self._escrituras = 0
+        self._conn = self._conectar()
+        if ruta_json_legado:
+            self._migrar_json(Path(ruta_json_legado))
+        self.expulsar()
+
+    def _conectar(self) -> sqlite3.Connection:
+        self.ruta_db.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.ruta_db), timeout=30, check_same_thread=False,
+                               isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        columnas = [fila[1] for fila in conn.execute("PRAGMA table_info(resultados)")]
+        if columnas and 'namespace' not in columnas:
+            self._migrar_esquema_v1(conn)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS resultados ("
+            " namespace TEXT NOT NULL,"
+            " hash TEXT NOT NULL,"
+            " datos TEXT NOT NULL,"
+            " fecha TEXT NOT NULL,"
+            " ultimo_acceso TEXT NOT NULL,"
+            " hits INTEGER NOT NULL DEFAULT 0,"
+            " tamano INTEGER NOT NULL,"
+            " PRIMARY KEY (namespace, hash))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_resultados_acceso ON resultados (ultimo_acceso)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_resultados_hash ON resultados (hash)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS indice_hash ("
+            " ruta TEXT PRIMARY KEY,"
+            " tamano INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " hash TEXT NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_indice_hash_hash ON indice_hash (hash)")
+        if conn.execute("PRAGMA user_version").fetchone()[0] < 1:
+            # Los resultados parciales OCR + Claude se guardaban en 'claude'
+            conn.execute(
+                "UPDATE OR REPLACE resultados SET namespace = 'mixto'"
+                " WHERE namespace = 'claude' AND datos LIKE '%\"metodo\": \"OCR + Claude%'"
+            )
+            conn.execute("PRAGMA user_version = 1")
+        self._claves_md5 = conn.execute(
+            "SELECT COUNT(*) FROM resultados WHERE length(hash) = ?", (_LONGITUD_MD5,)
+        ).fetchone()[0]
+        return conn
+
+    @staticmethod
+    def _migrar_esquema_v1(conn: sqlite3.Connection):
+        """Convierte la tabla sin namespaces (hash, datos, fecha) al esquema actual"""
+        filas = conn.execute("SELECT hash, datos, fecha FROM resultados").fetchall()
+        conn.execute("BEGIN")
+        conn.execute("DROP TABLE resultados")
+        conn.execute(
+            "CREATE TABLE resultados ("
+            " namespace TEXT NOT NULL, hash TEXT NOT NULL, datos TEXT NOT NULL,"
+            " fecha TEXT NOT NULL, ultimo_acceso TEXT NOT NULL,"
+            " hits INTEGER NOT NULL DEFAULT 0, tamano INTEGER NOT NULL,"
+            " PRIMARY KEY (namespace, hash))"
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO resultados VALUES (?, ?, ?, ?, ?, 0, ?)",
+            [(namespace_de_metodo(json.loads(d).get('metodo')), h, d, f, f, len(d))
+             for h, d, f in filas]
+        )
+        conn.execute("COMMIT")
+
+    def _migrar_json(self, ruta_json: Path):
+        """Importa una vez el antiguo cache_resultados.json y lo renombra"""
+        if not ruta_json.exists():
+            return
+        try:
+            with open(ruta_json, 'r', encoding='utf-8') as f:
+                datos = json.load(f)
+        except Exception as e:
+            print(f"[Cache] No se pudo migrar {ruta_json}: {e}")
+            return
+        filas = []
+        for k, v in datos.items():
+            if not isinstance(v, dict):
+                continue
+            texto = json.dumps(v, ensure_ascii=False)
+            fecha = v.get('fecha_cache') or datetime.now().isoformat()
+            filas.append((namespace_de_metodo(v.get('metodo')), k, texto, fecha, fecha, len(texto)))
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO resultados VALUES (?, ?, ?, ?, ?, 0, ?)", filas
+            )
+            self._conn.execute("COMMIT")
+            self._contar_claves_md5()
+        ruta_json.rename(ruta_json.with_suffix('.json.migrado'))
+        print(f"[Cache] Migradas {len(filas)} entradas de {ruta_json.name} a SQLite")
+
+    # ---- hash de imagenes ----
+
+    def hash_archivo(self, ruta_imagen, devolver_bytes: bool = False) -> tuple:
+        """
+        Retorna (hash, bytes). Si (ruta, tamano, mtime) coincide con el indice
+        no se lee el fichero y bytes es None. Si hay que leerlo, se hace una
+        sola vez por bloques y, con devolver_bytes=True, se devuelve el
+        contenido para reutilizarlo (p.ej. para el base64 de Claude Vision).
+        """
+        ruta = str(Path(ruta_imagen).resolve())
+        st = os.stat(ruta)
+        with self._lock:
+            fila = self._conn.execute(
+                "SELECT hash FROM indice_hash WHERE ruta = ? AND tamano = ? AND mtime_ns = ?",
+                (ruta, st.st_size, st.st_mtime_ns)
+            ).fetchone()
+        if fila:
+            return fila[0], None
+
+        h = hashlib.blake2b(digest_size=HASH_DIGEST_SIZE)
+        md5 = hashlib.md5() if self._claves_md5 else None
+        bloques = [] if devolver_bytes else None
+        with open(ruta, 'rb') as f:
+            while True:
+                bloque = f.read(HASH_CHUNK)
+                if not bloque:
+                    break
+                h.update(bloque)
+                if md5 is not None:
+                    md5.update(bloque)
+                if bloques is not None:
+                    bloques.append(bloque)
+        imagen_hash = h.hexdigest()
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO indice_hash VALUES (?, ?, ?, ?)",
+                (ruta, st.st_size, st.st_mtime_ns, imagen_hash)
+            )
+            if md5 is not None:
+                self._migrar_clave_md5(md5.hexdigest(), imagen_hash)
+        return imagen_hash, (b''.join(bloques) if bloques is not None else None)
+
+    def hash_indexado(self, ruta_imagen) -> Optional[str]:
+        """Hash del indice si el fichero no ha cambiado; None si habria que leerlo"""
+        ruta = str(Path(ruta_imagen).resolve())
+        try:
+            st = os.stat(ruta)
+        except OSError:
+            return None
+        with self._lock:
+            fila = self._conn.execute(
+                "SELECT hash FROM indice_hash WHERE ruta = ? AND tamano = ? AND mtime_ns = ?",
+                (ruta, st.st_size, st.st_mtime_ns)
+            ).fetchone()
+        return fila[0] if fila else None
+
+    def indexar_hash(self, ruta_imagen, imagen_hash: str):
+        """
+        Registra el hash de un fichero recien escrito (calculado al escribirlo,
+        p.ej. en una subida): hash_archivo ya no necesita leerlo.
+        """
+        if self._claves_md5:
+            # Quedan claves MD5 por migrar: que hash_archivo lea el fichero
+            return
+        ruta = str(Path(ruta_imagen).resolve())
+        st = os.stat(ruta)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO indice_hash VALUES (?, ?, ?, ?)",
+                (ruta, st.st_size, st.st_mtime_ns, imagen_hash)
+            )
+
+    def _contar_claves_md5(self):
+        self._claves_md5 = self._conn.execute(
+            "SELECT COUNT(*) FROM resultados WHERE length(hash) = ?", (_LONGITUD_MD5,)
+        ).fetchone()[0]
+
+    def _migrar_clave_md5(self, clave_md5: str, imagen_hash: str):
+        """Renombra (una vez) la entrada guardada con el hash MD5 antiguo"""
+        cur = self._conn.execute(
+            "UPDATE OR IGNORE resultados SET hash = ? WHERE hash = ?", (imagen_hash, clave_md5)
+        )
+        self._claves_md5 = max(0, self._claves_md5 - cur.rowcount)
+
+    # ---- lectura / escritura ----
+
+    def get(self, imagen_hash: str, default=None, namespaces=NAMESPACES) -> Optional[dict]:
+        """
+        Busca la entrada en los namespaces dados (en orden). Cuenta hit/miss
+        y marca el acceso para el LRU.
+        """
+        ahora = datetime.now().isoformat()
+        with self._lock:
+            for ns in namespaces:
+                fila = self._conn.execute(
+                    "SELECT datos, fecha FROM resultados WHERE namespace = ? AND hash = ?",
+                    (ns, imagen_hash)
+                ).fetchone()
+                if fila and not self._caducada(fila[1]):
+                    self._conn.execute(
+                        "UPDATE resultados SET ultimo_acceso = ?, hits = hits + 1"
+                        " WHERE namespace = ? AND hash = ?",
+                        (ahora, ns, imagen_hash)
+                    )
+                    self._stats[ns]['hits'] += 1
+                    return json.loads(fila[0])
+            for ns in namespaces:
+                self._stats[ns]['misses'] += 1
+        return default
+
+    def guardar(self, imagen_hash: str, datos: dict, namespace: Optional[str] = None):
+        """Escribe la entrada inmediatamente (una transaccion por entrada)"""
+        ns = namespace or namespace_de_metodo(datos.get('metodo'))
+        texto = json.dumps(datos, ensure_ascii=False)
+        fecha = datos.get('fecha_cache') or datetime.now().isoformat()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO resultados VALUES (?, ?, ?, ?, ?, 0, ?)",
+                (ns, imagen_hash, texto, fecha, datetime.now().isoformat(), len(texto))
+            )
+            self._escrituras += 1
+            if self._escrituras % _EXPULSAR_CADA == 0:
+                self.expulsar()
+
+    def contiene(self, imagen_hash: str, namespaces=NAMESPACES) -> bool:
+        """Como `in` pero limitado a unos namespaces (no cuenta en estadisticas)"""
+        marcas = ','.join('?' * len(namespaces))
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT 1 FROM resultados WHERE hash = ? AND namespace IN ({marcas})"
+                " AND fecha >= ?",
+                (imagen_hash, *namespaces, self._fecha_limite_ttl())
+            ).fetchone() is not None
+
+    def __getitem__(self, imagen_hash: str) -> dict:
+        datos = self.get(imagen_hash)
+        if datos is None:
+            raise KeyError(imagen_hash)
+        return datos
+
+    def __setitem__(self, imagen_hash: str, datos: dict):
+        self.guardar(imagen_hash, datos)
+
+    def __contains__(self, imagen_hash) -> bool:
+        return self.contiene(imagen_hash)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM resultados").fetchone()[0]
+
+    def items(self, limite: Optional[int] = None) -> list:
+        """Entradas usadas mas recientemente primero (incluye namespace y hits)"""
+        sql = "SELECT hash, namespace, hits, datos FROM resultados ORDER BY ultimo_acceso DESC"
+        params = ()
+        if limite:
+            sql += " LIMIT ?"
+            params = (limite,)
+        with self._lock:
+            filas = self._conn.execute(sql, params).fetchall()
+        return [(h, {'namespace': ns, 'hits': hits, **json.loads(d)}) for h, ns, hits, d in filas]
+
+    # ---- limites y expulsion ----
+
+    def _fecha_limite_ttl(self) -> str:
+        if not self.ttl_dias:
+            return ''
+        return (datetime.now() - timedelta(days=self.ttl_dias)).isoformat()
+
+    def _caducada(self, fecha: str) -> bool:
+        return bool(self.ttl_dias) and fecha < self._fecha_limite_ttl()
+
+    def expulsar(self) -> int:
+        """
+        Aplica TTL y limites de capacidad (entradas y bytes), expulsando
+        primero las entradas usadas hace mas tiempo. Retorna cuantas se borraron.
+        """
+        borradas = {ns: 0 for ns in NAMESPACES}
+        hashes_borrados = set()
+        with self._lock:
+            if self.ttl_dias:
+                for ns, h in self._conn.execute(
+                    "SELECT namespace, hash FROM resultados WHERE fecha < ?", (self._fecha_limite_ttl(),)
+                ).fetchall():
+                    borradas[ns] = borradas.get(ns, 0) + 1
+                    hashes_borrados.add(h)
+                self._conn.execute("DELETE FROM resultados WHERE fecha < ?", (self._fecha_limite_ttl(),))
+
+            total, bytes_total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(tamano), 0) FROM resultados"
+            ).fetchone()
+            if total > self.max_entradas or bytes_total > self.max_bytes:
+                sobran_entradas = max(0, total - self.max_entradas)
+                sobran_bytes = max(0, bytes_total - self.max_bytes)
+                victimas = []
+                liberados = 0
+                for ns, h, tamano in self._conn.execute(
+                    "SELECT namespace, hash, tamano FROM resultados ORDER BY ultimo_acceso ASC"
+                ):
+                    if len(victimas) >= sobran_entradas and liberados >= sobran_bytes:
+                        break
+                    victimas.append((ns, h))
+                    liberados += tamano
+                self._conn.execute("BEGIN")
+                self._conn.executemany(
+                    "DELETE FROM resultados WHERE namespace = ? AND hash = ?", victimas
+                )
+                self._conn.execute("COMMIT")
+                for ns, h in victimas:
+                    borradas[ns] = borradas.get(ns, 0) + 1
+                    hashes_borrados.add(h)
+
+            self._podar_indice(hashes_borrados)
+
+            if self._claves_md5:
+                self._contar_claves_md5()
+            for ns, n in borradas.items():
+                self._stats.setdefault(ns, {'hits': 0, 'misses': 0, 'expulsiones': 0})
+                self._stats[ns]['expulsiones'] += n
+        return sum(borradas.values())
+
+    def _podar_indice(self, hashes_borrados: set):
+        """
+        Con el lock tomado. Quita del indice de hashes las imagenes cuyas
+        entradas se acaban de expulsar (si no quedan en otro namespace) y, si
+        el indice pasa del doble de max_entradas (ficheros borrados o
+        movidos), las filas que ya no tienen ninguna entrada en el cache.
+        """
+        if hashes_borrados:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "DELETE FROM indice_hash WHERE hash = ? AND NOT EXISTS "
+                "(SELECT 1 FROM resultados WHERE resultados.hash = indice_hash.hash)",
+                [(h,) for h in hashes_borrados]
+            )
+            self._conn.execute("COMMIT")
+        filas = self._conn.execute("SELECT COUNT(*) FROM indice_hash").fetchone()[0]
+        if filas > 2 * self.max_entradas:
+            self._conn.execute(
+                "DELETE FROM indice_hash WHERE NOT EXISTS "
+                "(SELECT 1 FROM resultados WHERE resultados.hash = indice_hash.hash)"
+            )
+
+    def estadisticas(self) -> dict:
+        """Entradas, bytes, hits, misses y expulsiones por namespace"""
+        with self._lock:
+            filas = self._conn.execute(
+                "SELECT namespace, COUNT(*), COALESCE(SUM(tamano), 0) FROM resultados GROUP BY namespace"
+            ).fetchall()
+            por_ns = {ns: {'entradas': 0, 'bytes': 0, **self._stats[ns]} for ns in NAMESPACES}
+            for ns, n, b in filas:
+                por_ns.setdefault(ns, {'entradas': 0, 'bytes': 0, 'hits': 0, 'misses': 0, 'expulsiones': 0})
+                por_ns[ns].update({'entradas': n, 'bytes': b})
+        for s in por_ns.values():
+            consultas = s['hits'] + s['misses']
+            s['hit_rate'] = s['hits'] / consultas if consultas else 0.0
+        return por_ns
+
+    # ---- mantenimiento ----
+
+    def sincronizar(self):
+        """Vuelca el WAL al fichero principal (no bloquea a lectores)"""
+        with self._lock:
+            self._conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def limpiar(self, namespace: Optional[str] = None):
+        """Vacia el cache completo o solo un namespace"""
+        with self._lock:
+            if namespace:
+                self._conn.execute("DELETE FROM resultados WHERE namespace = ?", (namespace,))
+            else:
+                self._conn.execute("DELETE FROM resultados")
+                self._conn.execute("DELETE FROM indice_hash")
+                self._claves_md5 = 0
+                for s in self._stats.values():
+                    s.update({'hits': 0, 'misses': 0, 'expulsiones': 0})
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._conn.execute("VACUUM")
+
+    def tamano_bytes(self) -> int:
+        total = 0
+        for sufijo in ('', '-wal', '-shm'):
+            p = Path(str(self.ruta_db) + sufijo)
+            if p.exists():
+                total += p.stat().st_size
+        return total
+
+    def cerrar(self):
+        with self._lock:
+            self._conn.close()
+
+
+# Una instancia por fichero, compartida entre reruns de Streamlit e hilos
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def abrir_cache(ruta_db, ruta_json_legado=None) -> CacheResultados:
+    """Obtiene (o crea) la cache SQLite de la ruta dada"""
+    clave = str(Path(ruta_db).resolve())
+    with _caches_lock:
+        cache = _caches.get(clave)
+        if cache is None:
+            cache = CacheResultados(ruta_db, ruta_json_legado)
+            _caches[clave] = cache
+        return cache
@@ -0,0 +1,180 @@
+"""
+Extraccion de campos (email, match, cantidad, categoria) del texto del OCR.
+
+- Un solo patron compilado con grupos con nombre para todas las variantes
+  de todos los campos, dentro de una lookahead: un unico recorrido del
+  texto encuentra todas las apariciones.
+- Dentro de cada campo se mantiene el orden de preferencia de los patrones
+  de siempre (p.ej. 'N tickets selected' antes que 'N tickets').
+- Pistas de posicion: con las cajas de readtext, entre varias apariciones
+  de un campo se prefiere la que esta en su banda de la captura (bandas de
+  REGIONES_ROI); si ninguna lo esta se elige como sin cajas.
+- La confianza de cada campo es la de las detecciones que cubre el texto
+  encontrado (desplazamientos en el texto unido).
+
+Sin dependencia de streamlit ni de EasyOCR.
+"""
+
+import re
+from bisect import bisect_right
+from itertools import accumulate
+
+CAMPOS = ('email', 'match', 'cantidad', 'categoria')
+
+# Emails de la propia plataforma que aparecen en la captura
+EMAILS_SISTEMA = ('noreply', 'support', 'fifa', 'ticket')
+
+# Todas las variantes de todos los campos en una sola lookahead (no consume
+# texto: una aparicion no tapa a otra que empieza dentro). Las alternativas
+# estan factorizadas por prefijo (match / cat...) para que cada posicion
+# pruebe pocas ramas, y solo se prueban al principio de una palabra (lo que
+# sigue a una letra o digito se descarta con una comparacion). El grupo que
+# cierra la aparicion identifica la variante.
+PATRON_CAMPOS = re.compile(r"""(?<![a-z0-9])(?=
+    (?<![a-z0-9._%+-])(?P<email>[a-z0-9._%+-]+@[a-z0-9.-]+\.[a-z]{2,})
+  | match\s*(?: (?P<match_1>\d{1,3}) | \#\s*(?P<match_2>\d{1,3}) )
+  | partido\s*(?P<match_3>\d{1,3})
+  | (?<!\d)(?P<cantidad>\d+)\s*(?: tickets?(?:\s*selected(?P<cantidad_1>))? | entradas?(?P<cantidad_4>) )
+  | transfer\s*(?P<cantidad_3>\d+)
+  | cat(?: egor(?: y\s*(?P<categoria_1>\d+) | ia\s*(?P<categoria_3>\d+) ) | \.?\s*(?P<categoria_2>\d+) )
+)""", re.VERBOSE)
+
+# Grupo final -> (campo, preferencia dentro del campo, grupo con el valor).
+# Preferencias de los patrones de siempre: 'match N' > 'match #N' > 'partido N',
+# 'N tickets selected' > 'N tickets' > 'transfer N' > 'N entradas',
+# 'category N' > 'cat. N' > 'categoria N'
+VARIANTES = {
+    'email': ('email', 1, 'email'),
+    'match_1': ('match', 1, 'match_1'),
+    'match_2': ('match', 2, 'match_2'),
+    'match_3': ('match', 3, 'match_3'),
+    'cantidad_1': ('cantidad', 1, 'cantidad'),
+    'cantidad': ('cantidad', 2, 'cantidad'),
+    'cantidad_3': ('cantidad', 3, 'cantidad_3'),
+    'cantidad_4': ('cantidad', 4, 'cantidad'),
+    'categoria_1': ('categoria', 1, 'categoria_1'),
+    'categoria_2': ('categoria', 2, 'categoria_2'),
+    'categoria_3': ('categoria', 3, 'categoria_3'),
+}
+
+EMAIL_VALIDO = re.compile(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}')
+
+CANTIDAD_MIN, CANTIDAD_MAX = 1, 20
+
+
+def email_valido(email: str) -> bool:
+    return bool(email) and EMAIL_VALIDO.fullmatch(email) is not None
+
+
+def bandas_de_regiones(regiones: dict) -> dict:
+    """{campo: [(y0, y1), ...]} a partir de REGIONES_ROI ({region: ((x0, y0, x1, y1), campos)})"""
+    bandas = {}
+    for (_, y0, _, y1), campos in regiones.values():
+        for campo in campos:
+            bandas.setdefault(campo, []).append((y0, y1))
+    return bandas
+
+
+def buscar_apariciones(texto: str) -> dict:
+    """
+    {campo: [(preferencia, inicio, fin, valor)]} en orden de texto, de un
+    solo recorrido. Solo aparecen los campos encontrados.
+    """
+    apariciones = {}
+    for m in PATRON_CAMPOS.finditer(texto):
+        final = m.lastgroup
+        campo, preferencia, grupo = VARIANTES[final]
+        fin = m.end(final) if final != grupo else m.end(grupo)
+        apariciones.setdefault(campo, []).append((preferencia, m.start(), fin, m.group(grupo)))
+    return apariciones
+
+
+def _valida(campo: str, valor: str) -> bool:
+    if campo == 'email':
+        return not any(x in valor for x in EMAILS_SISTEMA)
+    if campo == 'cantidad':
+        return CANTIDAD_MIN <= int(valor) <= CANTIDAD_MAX
+    return True
+
+
+def _elegir(campo: str, apariciones: list, en_banda=None):
+    """
+    Aparicion elegida para el campo (None si no hay ninguna valida).
+    en_banda(aparicion) -> bool: pista de posicion, se prueba primero.
+    """
+    if len(apariciones) == 1:
+        # Caso habitual: la pista de posicion no cambia nada
+        a = apariciones[0]
+        return a if campo == 'email' or _valida(campo, a[3]) else None
+
+    if en_banda is not None:
+        # Entre las que estan en la banda: la de mejor variante (email: la primera)
+        candidatas = apariciones if campo == 'email' else sorted(apariciones)
+        for a in candidatas:
+            if en_banda(a) and _valida(campo, a[3]):
+                return a
+
+    if campo == 'email':
+        # El primero que no sea de la plataforma; si todos lo son, el primero
+        return next((a for a in apariciones if _valida(campo, a[3])), apariciones[0])
+    # Como siempre: la primera aparicion de cada variante, en orden de preferencia
+    primeras = {}
+    for a in apariciones:
+        primeras.setdefault(a[0], a)
+    return next((primeras[p] for p in sorted(primeras) if _valida(campo, primeras[p][3])), None)
+
+
+def extraer_campos(textos: list, confianzas: list = None, cajas: list = None,
+                   alto: float = None, bandas: dict = None) -> dict:
+    """
+    Campos de un comprobante a partir de las detecciones del OCR.
+    Retorna {'email', 'match', 'cantidad', 'categoria', 'texto_raw'} y, con
+    confianzas, 'confianza': {campo: 0..1}. cajas/alto/bandas activan las
+    pistas de posicion (alto por defecto: la caja mas baja).
+    """
+    texto = ' '.join(textos).lower()
+    resultado = {'email': None, 'match': None, 'cantidad': None, 'categoria': None}
+    apariciones = buscar_apariciones(texto)
+
+    usar_cajas = bool(cajas) and bool(bandas)
+    if confianzas is not None or usar_cajas:
+        # Desplazamiento de cada deteccion en el texto unido (para confianza y posicion)
+        inicios = list(accumulate((len(t) + 1 for t in textos[:-1]), initial=0))
+
+        def detecciones(a) -> slice:
+            """Detecciones que cubre la aparicion"""
+            return slice(bisect_right(inicios, a[1]) - 1, bisect_right(inicios, a[2] - 1))
+
+    if usar_cajas and not alto:
+        alto = max(p[1] for caja in cajas for p in caja)
+    usar_cajas = usar_cajas and bool(alto)
+
+    def en_banda_de(rangos):
+        def en_banda(a) -> bool:
+            # Centro vertical (0..1) de la deteccion donde empieza la aparicion
+            caja = cajas[bisect_right(inicios, a[1]) - 1]
+            y = (caja[0][1] + caja[2][1]) / 2 / alto
+            return any(y0 <= y <= y1 for y0, y1 in rangos)
+        return en_banda
+
+    confianza = {}
+    for campo, lista in apariciones.items():
+        en_banda = en_banda_de(bandas[campo]) if usar_cajas and campo in bandas else None
+        elegida = _elegir(campo, lista, en_banda)
+        if elegida is None:
+            continue
+        valor = elegida[3]
+        if campo == 'email':
+            resultado['email'] = valor
+        elif campo == 'categoria':
+            resultado['categoria'] = f"Category {valor}"
+        else:
+            resultado[campo] = int(valor)
+        if confianzas is not None:
+            # Texto repartido entre detecciones (p.ej. "Match" | "25"): cuenta la peor pieza
+            confianza[campo] = round(float(min(confianzas[detecciones(elegida)])), 3)
+
+    resultado['texto_raw'] = texto[:500]  # Para debug
+    if confianzas is not None:
+        resultado['confianza'] = confianza
+    return resultado
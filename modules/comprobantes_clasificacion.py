@@ -0,0 +1,181 @@
+"""
+Clasificacion de comprobantes en las carpetas buenos / regular / malos.
+
+- Cada imagen se enlaza en su carpeta: hardlink si origen y destino estan
+  en el mismo sistema de ficheros, si no reflink (FICLONE, copia sin
+  duplicar bloques en btrfs/XFS) y como ultimo recurso shutil.copy2.
+- Un manifiesto (.clasificacion.json en la carpeta de reporte) recuerda
+  donde quedo cada archivo: en la siguiente ejecucion solo se tocan los
+  que cambian de carpeta, los que faltan o cuyo origen cambio. Lo que ya
+  no corresponde a ningun resultado se elimina (las carpetas reflejan la
+  ultima verificacion, como antes con rmtree).
+- Las operaciones de disco van en un ThreadPoolExecutor (en volumenes de
+  red la latencia por fichero domina).
+
+Sin dependencia de streamlit.
+"""
+
+import json
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+CARPETAS = ('buenos', 'regular', 'malos')
+MANIFIESTO = '.clasificacion.json'
+MAX_WORKERS = 8
+
+# ioctl FICLONE de Linux (_IOW(0x94, 9, int))
+FICLONE = 0x40049409
+
+
+def carpeta_de_estado(estado: str) -> str:
+    if estado in ['OK', 'OK (EMAIL SIMILAR)']:
+        return 'buenos'
+    elif estado == 'PARCIAL':
+        return 'regular'
+    return 'malos'
+
+
+def _reflink(origen: Path, destino: Path):
+    import fcntl
+
+    with open(origen, 'rb') as f_origen, open(destino, 'wb') as f_destino:
+        try:
+            fcntl.ioctl(f_destino.fileno(), FICLONE, f_origen.fileno())
+        except OSError:
+            f_destino.close()
+            destino.unlink(missing_ok=True)
+            raise
+    shutil.copystat(origen, destino)
+
+
+class Enlazador:
+    """
+    Coloca ficheros probando hardlink -> reflink -> copia. Si un metodo falla
+    (otro volumen, sistema sin reflink) no se vuelve a intentar en esta ejecucion.
+    """
+
+    def __init__(self):
+        self._descartados = set()
+        self._lock = threading.Lock()
+
+    def _descartar(self, modo: str):
+        with self._lock:
+            self._descartados.add(modo)
+
+    def colocar(self, origen: Path, destino: Path) -> str:
+        """Retorna el modo usado: 'hardlink', 'reflink' o 'copia'"""
+        destino.unlink(missing_ok=True)
+        if 'hardlink' not in self._descartados:
+            try:
+                os.link(origen, destino)
+                return 'hardlink'
+            except OSError:
+                self._descartar('hardlink')
+        if 'reflink' not in self._descartados:
+            try:
+                _reflink(origen, destino)
+                return 'reflink'
+            except (OSError, ImportError):
+                self._descartar('reflink')
+        shutil.copy2(origen, destino)
+        return 'copia'
+
+
+def _leer_manifiesto(ruta: Path) -> dict:
+    try:
+        with open(ruta, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _escribir_manifiesto(ruta: Path, manifiesto: dict):
+    tmp = ruta.with_suffix('.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifiesto, f, ensure_ascii=False)
+    tmp.replace(ruta)
+
+
+def clasificar_archivos(resultados, carpeta_imagenes, carpeta_reporte, max_workers: int = MAX_WORKERS) -> tuple:
+    """
+    Deja cada imagen en buenos/regular/malos segun su estado.
+    Retorna (carpeta_buenos, carpeta_regular, carpeta_malos, resumen) con
+    resumen = {'sin_cambios', 'hardlink', 'reflink', 'copia', 'eliminados', 'errores'}.
+    """
+    carpeta_imagenes = Path(carpeta_imagenes)
+    carpeta_reporte = Path(carpeta_reporte)
+    carpetas = {nombre: carpeta_reporte / nombre for nombre in CARPETAS}
+    for carpeta in carpetas.values():
+        carpeta.mkdir(parents=True, exist_ok=True)
+
+    ruta_manifiesto = carpeta_reporte / MANIFIESTO
+    anterior = _leer_manifiesto(ruta_manifiesto)
+    # Lo que hay realmente en disco (alguien pudo vaciar las carpetas a mano)
+    presentes = {
+        nombre: {e.name for e in os.scandir(carpeta) if e.is_file()}
+        for nombre, carpeta in carpetas.items()
+    }
+
+    resumen = {'sin_cambios': 0, 'hardlink': 0, 'reflink': 0, 'copia': 0, 'eliminados': 0, 'errores': 0}
+    manifiesto = {}
+    colocar = []
+    for r in resultados:
+        archivo = r['archivo']
+        origen = carpeta_imagenes / archivo
+        try:
+            stat = origen.stat()
+        except OSError:
+            resumen['errores'] += 1
+            continue
+        entrada = {'carpeta': carpeta_de_estado(r['estado']), 'tamano': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+        previa = anterior.get(archivo, {})
+        if (previa.get('carpeta') == entrada['carpeta'] and archivo in presentes[entrada['carpeta']]
+                and previa.get('tamano') == entrada['tamano'] and previa.get('mtime_ns') == entrada['mtime_ns']):
+            manifiesto[archivo] = previa
+            resumen['sin_cambios'] += 1
+        else:
+            manifiesto[archivo] = entrada
+            colocar.append((origen, carpetas[entrada['carpeta']] / archivo, archivo))
+
+    # Sobrantes: archivos de otra carpeta o de ejecuciones anteriores
+    eliminar = [
+        carpetas[nombre] / archivo
+        for nombre, archivos in presentes.items()
+        for archivo in archivos
+        if manifiesto.get(archivo, {}).get('carpeta') != nombre
+    ]
+
+    enlazador = Enlazador()
+
+    def _eliminar(ruta: Path):
+        ruta.unlink(missing_ok=True)
+        return 'eliminados'
+
+    def _colocar(origen: Path, destino: Path, archivo: str):
+        modo = enlazador.colocar(origen, destino)
+        manifiesto[archivo]['modo'] = modo
+        return modo
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Primero eliminar: un archivo que cambia de carpeta no queda en dos
+        futuros = [executor.submit(_eliminar, ruta) for ruta in eliminar]
+        for futuro in futuros:
+            try:
+                resumen[futuro.result()] += 1
+            except OSError as e:
+                print(f"[Clasificacion] Error eliminando: {e}")
+                resumen['errores'] += 1
+        futuros = {executor.submit(_colocar, *args): args[2] for args in colocar}
+        for futuro, archivo in futuros.items():
+            try:
+                resumen[futuro.result()] += 1
+            except OSError as e:
+                print(f"[Clasificacion] Error con {archivo}: {e}")
+                manifiesto.pop(archivo, None)
+                resumen['errores'] += 1
+
+    _escribir_manifiesto(ruta_manifiesto, manifiesto)
+    return carpetas['buenos'], carpetas['regular'], carpetas['malos'], resumen
@@ -0,0 +1,218 @@
+"""
+Diario de ejecuciones de verificacion (reanudables).
+
+Cada ejecucion tiene un ID y un fichero JSONL en la carpeta del usuario
+(ejecuciones/<run_id>.jsonl). La primera linea describe la ejecucion
+(version de la tabla, parametros, carpeta de imagenes); despues se anade
+una linea por imagen verificada en cuanto termina, y una linea final
+(con los contadores de la ejecucion) cuando se completa.
+
+Si la sesion se corta, la ejecucion queda sin linea final y se puede
+reanudar: se saltan las imagenes ya verificadas contra la misma version
+de la tabla cuyo fichero (tamano + mtime) no ha cambiado.
+
+Sin dependencia de streamlit.
+"""
+
+import json
+import os
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+# Ejecuciones completadas que se conservan (las incompletas no se borran)
+CONSERVAR_COMPLETADAS = 20
+# Lectura del resumen de un diario (sin parsear cada linea)
+BLOQUE_LECTURA = 1024 * 1024
+COLA_LECTURA = 64 * 1024
+
+
+def nuevo_run_id() -> str:
+    return f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}"
+
+
+def firma_imagen(ruta) -> dict:
+    stat = os.stat(ruta)
+    return {'tamano': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+class DiarioEjecucion:
+    """Fichero JSONL de una ejecucion: cabecera, un resultado por linea y fin"""
+
+    def __init__(self, ruta):
+        self.ruta = Path(ruta)
+        self.run_id = self.ruta.stem
+        self._lock = threading.Lock()
+        self._f = None
+
+    # ---- escritura ----
+
+    @classmethod
+    def crear(cls, carpeta, version_tabla: str, parametros: dict) -> 'DiarioEjecucion':
+        carpeta = Path(carpeta)
+        carpeta.mkdir(parents=True, exist_ok=True)
+        diario = cls(carpeta / f"{nuevo_run_id()}.jsonl")
+        diario._escribir({
+            'tipo': 'inicio',
+            'run_id': diario.run_id,
+            'fecha': datetime.now().isoformat(),
+            'version_tabla': version_tabla,
+            'parametros': parametros,
+        })
+        return diario
+
+    def _escribir(self, registro: dict):
+        linea = json.dumps(registro, ensure_ascii=False, default=str) + '\n'
+        with self._lock:
+            if self._f is None:
+                self._f = open(self.ruta, 'a', encoding='utf-8')
+                if self._f.tell() and not self._termina_en_salto():
+                    # Ultima linea cortada por una caida: no pegar el siguiente registro
+                    self._f.write('\n')
+            self._f.write(linea)
+            # Sin fsync por linea: basta con que llegue al SO (el proceso
+            # de Streamlit sobrevive a la desconexion del navegador)
+            self._f.flush()
+
+    def _termina_en_salto(self) -> bool:
+        with open(self.ruta, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b'\n'
+
+    def registrar(self, resultado: dict, firma: dict = None):
+        """Anade el resultado de una imagen (firma = tamano/mtime del fichero)"""
+        self._escribir({'tipo': 'resultado', 'firma': firma, 'resultado': resultado})
+
+    def cerrar(self, completada: bool = True, contadores: dict = None):
+        if completada:
+            fin = {'tipo': 'fin', 'fecha': datetime.now().isoformat()}
+            if contadores is not None:
+                fin['contadores'] = dict(contadores)
+            self._escribir(fin)
+        with self._lock:
+            if self._f is not None:
+                os.fsync(self._f.fileno())
+                self._f.close()
+                self._f = None
+
+    # ---- lectura ----
+
+    def leer(self) -> tuple:
+        """(cabecera, {archivo: (resultado, firma)}, completada). Ignora una ultima linea cortada"""
+        cabecera, resultados, completada = {}, {}, False
+        try:
+            with open(self.ruta, 'r', encoding='utf-8') as f:
+                for linea in f:
+                    try:
+                        registro = json.loads(linea)
+                    except ValueError:
+                        continue
+                    tipo = registro.get('tipo')
+                    if tipo == 'inicio':
+                        cabecera = registro
+                    elif tipo == 'resultado':
+                        resultado = registro.get('resultado') or {}
+                        if resultado.get('archivo'):
+                            resultados[resultado['archivo']] = (resultado, registro.get('firma'))
+                    elif tipo == 'fin':
+                        completada = True
+        except OSError as e:
+            print(f"[Ejecuciones] Error leyendo {self.ruta}: {e}")
+        return cabecera, resultados, completada
+
+    def resumen(self) -> tuple:
+        """
+        (cabecera, lineas de resultado, completada) sin parsear el diario
+        entero: primera linea, ultima linea completa y conteo de saltos.
+        """
+        cabecera, lineas, completada = {}, 0, False
+        try:
+            with open(self.ruta, 'rb') as f:
+                try:
+                    cabecera = json.loads(f.readline())
+                except ValueError:
+                    return {}, 0, False
+                if cabecera.get('tipo') != 'inicio':
+                    return {}, 0, False
+                for bloque in iter(lambda: f.read(BLOQUE_LECTURA), b''):
+                    lineas += bloque.count(b'\n')
+                tamano = f.tell()
+                f.seek(max(0, tamano - COLA_LECTURA))
+                cola = [linea for linea in f.read().split(b'\n') if linea.strip()]
+            if cola:
+                try:
+                    completada = json.loads(cola[-1]).get('tipo') == 'fin'
+                except ValueError:
+                    pass  # Ultima linea cortada: no hay fin
+        except OSError as e:
+            print(f"[Ejecuciones] Error leyendo {self.ruta}: {e}")
+            return {}, 0, False
+        return cabecera, lineas - (1 if completada else 0), completada
+
+    def verificadas(self, carpeta_imagenes, imagenes) -> dict:
+        """{archivo: resultado} de las imagenes ya verificadas que no han cambiado"""
+        _, resultados, _ = self.leer()
+        previas = {}
+        for imagen in imagenes:
+            guardado = resultados.get(Path(imagen).name)
+            if guardado is None:
+                continue
+            resultado, firma = guardado
+            try:
+                if firma == firma_imagen(Path(carpeta_imagenes) / Path(imagen).name):
+                    previas[resultado['archivo']] = resultado
+            except OSError:
+                continue
+        return previas
+
+
+def listar_ejecuciones(carpeta, version_tabla: str = None, solo_incompletas: bool = True) -> list:
+    """
+    Resumen de las ejecuciones guardadas, mas recientes primero:
+    [{'run_id', 'fecha', 'version_tabla', 'parametros', 'verificadas', 'completada', 'ruta'}]
+    Solo lee cabecera y final de cada diario ('verificadas' cuenta lineas de resultado).
+    """
+    carpeta = Path(carpeta)
+    if not carpeta.exists():
+        return []
+    ejecuciones = []
+    for ruta in sorted(carpeta.glob('*.jsonl'), reverse=True):
+        cabecera, verificadas, completada = DiarioEjecucion(ruta).resumen()
+        if not cabecera or (solo_incompletas and completada):
+            continue
+        if version_tabla is not None and cabecera.get('version_tabla') != version_tabla:
+            continue
+        ejecuciones.append({
+            'run_id': cabecera.get('run_id', ruta.stem),
+            'fecha': cabecera.get('fecha'),
+            'version_tabla': cabecera.get('version_tabla'),
+            'parametros': cabecera.get('parametros', {}),
+            'verificadas': verificadas,
+            'completada': completada,
+            'ruta': str(ruta),
+        })
+    return ejecuciones
+
+
+def separar_por_parametros(ejecuciones: list, parametros: dict) -> tuple:
+    """
+    (reanudables, con_otros_parametros): solo se reanuda una ejecucion con
+    los mismos valores para cada clave de `parametros` (no mezcla metodos).
+    """
+    reanudables, otras = [], []
+    for ejecucion in ejecuciones:
+        guardados = ejecucion.get('parametros', {})
+        iguales = all(guardados.get(k) == v for k, v in parametros.items())
+        (reanudables if iguales else otras).append(ejecucion)
+    return reanudables, otras
+
+
+def limpiar_ejecuciones(carpeta, conservar: int = CONSERVAR_COMPLETADAS) -> int:
+    """Borra las ejecuciones completadas mas antiguas. Retorna cuantas"""
+    completadas = [e for e in listar_ejecuciones(carpeta, solo_incompletas=False) if e['completada']]
+    borradas = 0
+    for ejecucion in completadas[conservar:]:
+        Path(ejecucion['ruta']).unlink(missing_ok=True)
+        borradas += 1
+    return borradas
@@ -0,0 +1,151 @@
+"""
+Indice de emails de la tabla de referencia para busqueda aproximada.
+
+Encuentra, para el email leido de un comprobante, el pedido (o pedidos) de
+la tabla cuyo email_envio se le parece mas, aunque el nombre del fichero
+no corresponda a ese pedido. Sirve para sugerir el pedido correcto en los
+comprobantes NO ENCONTRADO / NO COINCIDE.
+
+- Coincidencia exacta: diccionario email -> pedidos.
+- Aproximada: indice invertido de trigramas de la parte local (antes de
+  la @). Se recorren las listas de los trigramas mas raros (hasta
+  MAX_POSTINGS entradas). Los candidatos que no comparten suficientes
+  trigramas para estar a la distancia pedida se descartan sin calcularla
+  (cada edicion rompe como mucho 3 trigramas). Al resto se les calcula
+  la distancia de edicion en banda, cortando en cuanto supera el maximo.
+
+Sin dependencia de streamlit.
+"""
+
+from collections import Counter, defaultdict
+
+# Candidatos (por trigramas en comun) que se verifican con distancia de edicion
+MAX_CANDIDATOS = 40
+# Entradas de listas de trigramas recorridas por busqueda (las mas raras primero)
+MAX_POSTINGS = 5000
+
+
+def distancia_acotada(a: str, b: str, maximo: int) -> int:
+    """
+    Levenshtein entre a y b; si supera `maximo` devuelve maximo + 1.
+    Solo se calculan las celdas a distancia <= maximo de la diagonal.
+    """
+    fuera = maximo + 1
+    if abs(len(a) - len(b)) > maximo:
+        return fuera
+    if a == b:
+        return 0
+    n = len(a)
+    anterior = [j if j <= maximo else fuera for j in range(n + 1)]
+    for i, cb in enumerate(b, 1):
+        desde, hasta = max(1, i - maximo), min(n, i + maximo)
+        actual = [fuera] * (n + 1)
+        actual[0] = i if i <= maximo else fuera
+        minimo = actual[0]
+        for j in range(desde, hasta + 1):
+            valor = anterior[j - 1] + (a[j - 1] != cb)
+            if anterior[j] + 1 < valor:
+                valor = anterior[j] + 1
+            if actual[j - 1] + 1 < valor:
+                valor = actual[j - 1] + 1
+            actual[j] = valor
+            if valor < minimo:
+                minimo = valor
+        if minimo > maximo:
+            return fuera
+        anterior = actual
+    return anterior[n] if anterior[n] <= maximo else fuera
+
+
+def _trigramas(texto: str) -> set:
+    texto = f"^{texto}$"
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+def _partes(email: str) -> tuple:
+    local, _, dominio = email.partition('@')
+    return local, dominio
+
+
+class IndiceEmails:
+    """
+    Indice sobre los emails de agrupar_por_pedido: {pedido: {'email': ...}}.
+    buscar(email) -> [(email_tabla, [pedidos], similitud)] de mayor a menor.
+    """
+
+    def __init__(self, datos_tabla: dict):
+        self.pedidos_por_email = defaultdict(list)
+        for pedido, info in datos_tabla.items():
+            email = (info.get('email') or '').strip().lower()
+            if email:
+                self.pedidos_por_email[email].append(pedido)
+
+        self.emails = list(self.pedidos_por_email)
+        self._trigramas = defaultdict(list)
+        for i, email in enumerate(self.emails):
+            for trigrama in _trigramas(_partes(email)[0]):
+                self._trigramas[trigrama].append(i)
+
+    def __len__(self) -> int:
+        return len(self.emails)
+
+    def _candidatos(self, local: str, maximo: int) -> tuple:
+        """
+        ([(indice, trigramas_en_comun)] de mayor a menor, trigramas usados).
+        Solo los que tienen suficientes en comun para estar a <= maximo ediciones.
+        """
+        listas = sorted((self._trigramas.get(t, []) for t in _trigramas(local)), key=len)
+        usadas, recorridas = 0, 0
+        comunes = Counter()
+        for lista in listas:
+            if usadas and recorridas + len(lista) > MAX_POSTINGS:
+                break
+            comunes.update(lista)
+            usadas += 1
+            recorridas += len(lista)
+        # De los `usadas` trigramas de la consulta, cada edicion rompe como mucho 3
+        minimo = max(1, usadas - 3 * maximo)
+        return [(i, n) for i, n in comunes.most_common(MAX_CANDIDATOS) if n >= minimo], usadas
+
+    def buscar(self, email: str, similitud_min: float = 0.8, max_resultados: int = 3) -> list:
+        """
+        Emails de la tabla con similitud (1 - distancia / longitud mayor)
+        >= similitud_min. El dominio cuenta como parte del email.
+        """
+        if not email:
+            return []
+        email = email.strip().lower()
+        if email in self.pedidos_por_email:
+            return [(email, self.pedidos_por_email[email], 1.0)]
+
+        # Maximo de ediciones con la longitud mas favorable (la del candidato puede ser mayor)
+        limite = int(len(email) * (1 - similitud_min) / similitud_min)
+        candidatos, usadas = self._candidatos(_partes(email)[0], limite)
+
+        resultados, distancias = [], []
+        for i, en_comun in candidatos:
+            if en_comun < usadas - 3 * limite:
+                # Ordenados por trigramas en comun: los siguientes tampoco llegan
+                break
+            candidato = self.emails[i]
+            longitud = max(len(email), len(candidato))
+            maximo = min(limite, int(longitud * (1 - similitud_min)))
+            distancia = distancia_acotada(email, candidato, maximo)
+            if distancia <= maximo:
+                resultados.append((candidato, self.pedidos_por_email[candidato], 1 - distancia / longitud))
+                distancias.append(distancia)
+                if len(distancias) >= max_resultados:
+                    # Ya hay max_resultados: solo interesan los que no esten mas lejos
+                    limite = sorted(distancias)[max_resultados - 1]
+        resultados.sort(key=lambda r: -r[2])
+        return resultados[:max_resultados]
+
+    def sugerir_pedido(self, email: str, pedido_actual: str = None, similitud_min: float = 0.8) -> tuple:
+        """(pedidos, similitud) del email mas parecido si no incluye pedido_actual; si no (None, 0.0)"""
+        resultados = self.buscar(email, similitud_min, max_resultados=1)
+        if not resultados:
+            return None, 0.0
+        _, pedidos, similitud = resultados[0]
+        if pedido_actual in pedidos:
+            return None, 0.0
+        return pedidos, similitud
@@ -0,0 +1,158 @@
+"""
+Exportacion del reporte de verificacion a Excel.
+
+- Libro de openpyxl en modo write-only: las filas se escriben en streaming,
+  sin crear un objeto celda con estilo por cada valor.
+- El color por estado es formato condicional sobre la columna 'estado'
+  (tres reglas para todo el rango) en lugar de un relleno por celda; solo
+  la cabecera lleva estilo propio.
+- Anchos de columna calculados sobre el DataFrame (vectorizado).
+- excel_de_resultados: cache en memoria por hash del contenido del reporte,
+  el mismo reporte no se regenera en cada rerun de la pagina.
+
+Sin dependencia de streamlit.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from io import BytesIO
+
+import pandas as pd
+
+# Reportes distintos que se guardan ya generados (los ultimos usados)
+MAX_EN_CACHE = 4
+ANCHO_MAX = 50
+
+ESTADOS_OK = ('OK', 'OK (EMAIL SIMILAR)')
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def huella_dataframe(df: pd.DataFrame) -> str:
+    """Hash (BLAKE2b) de columnas y contenido del DataFrame"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update('\x1f'.join(map(str, df.columns)).encode('utf-8'))
+    try:
+        filas = pd.util.hash_pandas_object(df, index=False)
+    except TypeError:
+        # Valores no hashables (listas, dicts): se comparan como texto
+        filas = pd.util.hash_pandas_object(df.astype(str), index=False)
+    h.update(filas.to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def _anchos(df: pd.DataFrame) -> list:
+    """Ancho de cada columna: texto mas largo (cabecera incluida) + 2, con tope"""
+    anchos = []
+    for columna in df.columns:
+        valores = df[columna].dropna().astype(str).str.len()
+        largo = max(len(str(columna)), int(valores.max()) if len(valores) else 0)
+        anchos.append(min(largo + 2, ANCHO_MAX))
+    return anchos
+
+
+def _reglas_estado(ws, columna: str, ultima_fila: int):
+    """Verde OK, amarillo PARCIAL, rojo el resto (formato condicional)"""
+    from openpyxl.formatting.rule import FormulaRule
+    from openpyxl.styles import PatternFill
+
+    def relleno(color):
+        return PatternFill(start_color=color, end_color=color, fill_type='solid')
+
+    rango = f"{columna}2:{columna}{ultima_fila}"
+    celda = f"{columna}2"
+    condicion_ok = 'OR(' + ','.join(f'{celda}="{estado}"' for estado in ESTADOS_OK) + ')'
+    ws.conditional_formatting.add(rango, FormulaRule(formula=[condicion_ok], fill=relleno("C6EFCE"), stopIfTrue=True))
+    ws.conditional_formatting.add(rango, FormulaRule(formula=[f'{celda}="PARCIAL"'], fill=relleno("FFEB9C"), stopIfTrue=True))
+    ws.conditional_formatting.add(rango, FormulaRule(formula=[f'LEN({celda})>0'], fill=relleno("FFC7CE")))
+
+
+def exportar_excel(df: pd.DataFrame) -> bytes:
+    """Exporta el reporte a Excel (hoja Verificacion + hoja Resumen)"""
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Font, PatternFill
+    from openpyxl.utils import get_column_letter
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title="Verificacion")
+
+    header_font = Font(bold=True, color="FFFFFF")
+    header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
+    centrado = Alignment(horizontal='center', vertical='center')
+
+    def cabecera(hoja, valor):
+        celda = WriteOnlyCell(hoja, value=valor)
+        celda.font = header_font
+        celda.fill = header_fill
+        celda.alignment = centrado
+        return celda
+
+    # En write-only, anchos, paneles y formato condicional van antes de las filas
+    for i, ancho in enumerate(_anchos(df), 1):
+        ws.column_dimensions[get_column_letter(i)].width = ancho
+    ws.freeze_panes = 'A2'
+    if len(df.columns):
+        ws.auto_filter.ref = f"A1:{get_column_letter(len(df.columns))}{len(df) + 1}"
+    if 'estado' in df.columns and len(df):
+        _reglas_estado(ws, get_column_letter(df.columns.get_loc('estado') + 1), len(df) + 1)
+
+    ws.append([cabecera(ws, str(c)) for c in df.columns])
+    valores = df.astype(object).where(df.notna(), None)
+    for fila in valores.itertuples(index=False, name=None):
+        ws.append(fila)
+
+    # Hoja de resumen
+    ws_resumen = wb.create_sheet(title="Resumen")
+    ws_resumen.column_dimensions['A'].width = 32
+    ws_resumen.column_dimensions['B'].width = 12
+    titulo = WriteOnlyCell(ws_resumen, value="RESUMEN DE VERIFICACION")
+    titulo.font = Font(bold=True, size=14)
+    ws_resumen.append([titulo])
+    ws_resumen.append([])
+    ws_resumen.append([cabecera(ws_resumen, "Estado"), cabecera(ws_resumen, "Cantidad")])
+
+    if 'estado' in df.columns:
+        for estado, cantidad in df['estado'].value_counts().items():
+            ws_resumen.append([estado, int(cantidad)])
+
+    total = [WriteOnlyCell(ws_resumen, value="TOTAL"), WriteOnlyCell(ws_resumen, value=len(df))]
+    for celda in total:
+        celda.font = Font(bold=True)
+    ws_resumen.append(total)
+
+    # Estadisticas de metodo
+    if 'metodo_usado' in df.columns:
+        ws_resumen.append([])
+        ws_resumen.append([])
+        subtitulo = WriteOnlyCell(ws_resumen, value="METODO DE EXTRACCION")
+        subtitulo.font = Font(bold=True, size=12)
+        ws_resumen.append([subtitulo])
+        for metodo, cantidad in df['metodo_usado'].value_counts().items():
+            ws_resumen.append([metodo, int(cantidad)])
+
+    ws_resumen.append([])
+    ws_resumen.append([f"Generado: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"])
+
+    output = BytesIO()
+    wb.save(output)
+    return output.getvalue()
+
+
+def excel_de_resultados(df: pd.DataFrame) -> bytes:
+    """exportar_excel con cache por contenido: solo se genera si el reporte cambio"""
+    huella = huella_dataframe(df)
+    with _cache_lock:
+        if huella in _cache:
+            _cache.move_to_end(huella)
+            return _cache[huella]
+
+    datos = exportar_excel(df)
+    with _cache_lock:
+        _cache[huella] = datos
+        while len(_cache) > MAX_EN_CACHE:
+            _cache.popitem(last=False)
+    return datos
@@ -0,0 +1,103 @@
+"""
+Pre-procesado de imagenes de comprobantes (Pillow).
+
+- OCR: resolucion normalizada (ancho entre ANCHO_MIN_OCR y ANCHO_MAX_OCR)
+  y escala de grises; EasyOCR acepta el array 2D directamente.
+- Claude Vision: reduccion a un presupuesto de pixeles y re-codificacion
+  compacta (JPEG o WebP). Menos bytes subidos y menos tokens de imagen.
+
+Configurable por variables de entorno:
+    COMPROBANTES_CLAUDE_MAX_PX   (pixeles totales, por defecto 1150000)
+    COMPROBANTES_CLAUDE_FORMATO  (JPEG | WEBP | ORIGINAL)
+    COMPROBANTES_CLAUDE_CALIDAD  (1-100, por defecto 85)
+
+Sin dependencia de streamlit: lo usan tambien los procesos del pool OCR.
+"""
+
+import os
+from io import BytesIO
+
+ANCHO_MIN_OCR = 720
+ANCHO_MAX_OCR = 1080
+
+# ~1.15 MP: por encima la API reescala la imagen igualmente y solo cuesta mas subida
+CLAUDE_MAX_PX = int(os.getenv('COMPROBANTES_CLAUDE_MAX_PX', '1150000'))
+CLAUDE_FORMATO = os.getenv('COMPROBANTES_CLAUDE_FORMATO', 'JPEG').upper()
+CLAUDE_CALIDAD = int(os.getenv('COMPROBANTES_CLAUDE_CALIDAD', '85'))
+
+_MEDIA_TYPES = {'JPEG': 'image/jpeg', 'WEBP': 'image/webp', 'PNG': 'image/png', 'GIF': 'image/gif'}
+
+
+def normalizar_ancho(img, ancho_min: int = ANCHO_MIN_OCR, ancho_max: int = ANCHO_MAX_OCR):
+    """Escala la imagen (manteniendo proporcion) para que su ancho quede en [ancho_min, ancho_max]"""
+    from PIL import Image
+
+    if img.width > ancho_max:
+        objetivo = ancho_max
+    elif img.width < ancho_min:
+        objetivo = ancho_min
+    else:
+        return img
+    alto = max(1, round(img.height * objetivo / img.width))
+    return img.resize((objetivo, alto), Image.LANCZOS)
+
+
+def preparar_para_ocr(ruta_imagen: str):
+    """Imagen lista para readtext: ancho normalizado y escala de grises (array 2D)"""
+    import numpy as np
+    from PIL import Image
+
+    with Image.open(ruta_imagen) as img:
+        gris = normalizar_ancho(img.convert('L'))
+        return np.asarray(gris)
+
+
+def recortar_vertical(imagen_bytes: bytes, y0: float, y1: float) -> bytes:
+    """Banda horizontal entre las fracciones de alto y0..y1 (PNG, se comprime despues)"""
+    from PIL import Image
+
+    with Image.open(BytesIO(imagen_bytes)) as img:
+        banda = img.crop((0, int(y0 * img.height), img.width, int(y1 * img.height)))
+        salida = BytesIO()
+        banda.save(salida, format='PNG')
+        return salida.getvalue()
+
+
+def preparar_para_claude(imagen_bytes: bytes, max_px: int = CLAUDE_MAX_PX,
+                         formato: str = CLAUDE_FORMATO, calidad: int = CLAUDE_CALIDAD) -> tuple:
+    """
+    Reduce la imagen a max_px pixeles y la re-codifica en `formato`.
+    Retorna (bytes, media_type). Si la version re-codificada no es mas
+    pequena (o formato=ORIGINAL) se devuelven los bytes originales.
+    """
+    from PIL import Image
+
+    with Image.open(BytesIO(imagen_bytes)) as img:
+        formato_original = (img.format or 'PNG').upper()
+        if formato == 'ORIGINAL' or formato not in _MEDIA_TYPES:
+            return imagen_bytes, _MEDIA_TYPES.get(formato_original, 'image/png')
+
+        trabajo = img.convert('RGB')
+        px = trabajo.width * trabajo.height
+        if px > max_px:
+            escala = (max_px / px) ** 0.5
+            trabajo = trabajo.resize(
+                (max(1, int(trabajo.width * escala)), max(1, int(trabajo.height * escala))),
+                Image.LANCZOS
+            )
+            reducida = True
+        else:
+            reducida = False
+
+        salida = BytesIO()
+        opciones = {'quality': calidad}
+        if formato == 'JPEG':
+            opciones['optimize'] = True
+        elif formato == 'WEBP':
+            opciones['method'] = 4
+        trabajo.save(salida, format=formato, **opciones)
+        comprimida = salida.getvalue()
+
+    if not reducida and len(comprimida) >= len(imagen_bytes):
+        return imagen_bytes, _MEDIA_TYPES.get(formato_original, 'image/png')
+    return comprimida, _MEDIA_TYPES[formato]
@@ -0,0 +1,210 @@
+"""
+Ciclo de vida del modelo de EasyOCR en el proceso de Streamlit.
+
+- Un solo reader por proceso, compartido por todas las sesiones: la carga
+  va bajo un lock, si dos usuarios lo piden a la vez el segundo espera a la
+  misma carga en vez de construir otro reader (y volver a comprobar los
+  ficheros del modelo).
+- precargar() lo carga en un hilo en segundo plano; precargar_modelo_ocr()
+  lo lanza una vez por proceso al arrancar la app (COMPROBANTES_OCR_PRECARGA),
+  asi la primera verificacion no espera.
+- estado() da fase, segundos de carga y memoria (RSS del proceso antes y
+  despues de cargar) para el panel de administracion.
+- liberar() suelta el reader; la siguiente peticion lo vuelve a cargar.
+
+Sin dependencia de streamlit: los procesos del pool OCR tambien lo usan.
+"""
+
+import gc
+import os
+import ssl
+import threading
+import time
+
+# Cargar el modelo en segundo plano al arrancar la app
+PRECARGA = os.getenv('COMPROBANTES_OCR_PRECARGA', 'true').lower() == 'true'
+IDIOMAS = ('en',)
+# Ficheros que descarga EasyOCR para IDIOMAS (detector CRAFT + reconocedor ingles)
+MODELOS_EASYOCR = ('craft_mlt_25k.pth', 'english_g2.pth')
+
+_ssl_lock = threading.Lock()
+
+
+def memoria_mb():
+    """RSS actual del proceso en MB (None si no se puede leer)"""
+    try:
+        with open('/proc/self/status') as f:
+            for linea in f:
+                if linea.startswith('VmRSS:'):
+                    return int(linea.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        # Sin /proc: pico de memoria (KB en Linux, bytes en macOS)
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return pico / 1024 / 1024 if os.uname().sysname == 'Darwin' else pico / 1024
+    except (ImportError, AttributeError):
+        return None
+
+
+def _modelos_descargados() -> bool:
+    """Los ficheros del detector y del reconocedor ya estan en la carpeta de EasyOCR"""
+    carpeta = os.environ.get('EASYOCR_MODULE_PATH') or os.environ.get('MODULE_PATH') \
+        or os.path.expanduser('~/.EasyOCR/')
+    return all(os.path.exists(os.path.join(carpeta, 'model', f)) for f in MODELOS_EASYOCR)
+
+
+def _crear_reader():
+    import easyocr
+    if _modelos_descargados():
+        return easyocr.Reader(list(IDIOMAS), gpu=False, verbose=False)
+    # Sin verificacion SSL solo mientras se descargan los modelos (tambien en los
+    # procesos del pool). El lock evita que dos cargas a la vez guarden el contexto
+    # ya cambiado como "original" y dejen la verificacion desactivada
+    with _ssl_lock:
+        contexto_https = ssl._create_default_https_context
+        ssl._create_default_https_context = ssl._create_unverified_context
+        try:
+            return easyocr.Reader(list(IDIOMAS), gpu=False, verbose=False)
+        finally:
+            ssl._create_default_https_context = contexto_https
+
+
+class ModeloOCR:
+    """Reader de EasyOCR compartido: fases sin_cargar -> cargando -> listo | error"""
+
+    def __init__(self, crear=_crear_reader):
+        self._crear = crear
+        self._reader = None
+        self._lock = threading.Lock()
+        self._hilo = None
+        self.fase = 'sin_cargar'
+        self.error = None
+        self.origen = None
+        self.inicio = None
+        self.segundos = None
+        self.memoria_antes = None
+        self.memoria_despues = None
+        self.cargas = 0
+
+    def obtener(self, origen: str = 'peticion'):
+        """Reader cargado; si no lo esta, lo carga (o espera a la carga en curso)"""
+        reader = self._reader
+        if reader is not None:
+            return reader
+        with self._lock:
+            if self._reader is None:
+                self._cargar(origen)
+            return self._reader
+
+    def _cargar(self, origen: str):
+        """Con el lock tomado"""
+        self.fase = 'cargando'
+        self.origen = origen
+        self.error = None
+        self.inicio = time.time()
+        self.memoria_antes = memoria_mb()
+        try:
+            reader = self._crear()
+        except BaseException as e:
+            self.fase = 'error'
+            self.error = str(e)
+            self.segundos = round(time.time() - self.inicio, 2)
+            print(f"[ModeloOCR] Error cargando EasyOCR ({origen}): {e}")
+            raise
+        self.memoria_despues = memoria_mb()
+        self.segundos = round(time.time() - self.inicio, 2)
+        self.cargas += 1
+        self._reader = reader
+        self.fase = 'listo'
+        print(f"[ModeloOCR] EasyOCR cargado ({origen}) en {self.segundos}s")
+
+    def precargar(self, reintentar: bool = False) -> bool:
+        """
+        Lanza la carga en un hilo de fondo. False si ya esta cargado o
+        cargando, o si la ultima carga fallo (salvo reintentar).
+        """
+        with self._lock:
+            if self._reader is not None or (self._hilo is not None and self._hilo.is_alive()):
+                return False
+            if self.fase == 'error' and not reintentar:
+                return False
+
+            def cargar():
+                try:
+                    self.obtener('precarga')
+                except Exception:
+                    pass  # Queda en fase 'error'; la siguiente peticion lo reintenta
+
+            self.fase = 'cargando'
+            self.origen = 'precarga'
+            self._hilo = threading.Thread(target=cargar, name='precarga-easyocr', daemon=True)
+            self._hilo.start()
+            return True
+
+    def esperar(self, timeout: float = None) -> bool:
+        """Espera a la precarga en curso. True si el reader esta listo"""
+        hilo = self._hilo
+        if hilo is not None:
+            hilo.join(timeout)
+        return self.listo()
+
+    def listo(self) -> bool:
+        return self._reader is not None
+
+    def liberar(self) -> bool:
+        """Suelta el reader (no espera a las lecturas en curso, que lo mantienen vivo)"""
+        with self._lock:
+            if self._reader is None:
+                return False
+            self._reader = None
+            self.fase = 'sin_cargar'
+            self.memoria_antes = self.memoria_despues = None
+        gc.collect()
+        return True
+
+    def estado(self) -> dict:
+        """Instantanea para la interfaz"""
+        memoria_modelo = None
+        if self.memoria_antes is not None and self.memoria_despues is not None:
+            memoria_modelo = round(self.memoria_despues - self.memoria_antes, 1)
+        segundos = self.segundos
+        if self.fase == 'cargando' and self.inicio:
+            segundos = round(time.time() - self.inicio, 1)
+        actual = memoria_mb()
+        return {
+            'fase': self.fase,
+            'origen': self.origen,
+            'segundos': segundos,
+            'memoria_modelo_mb': memoria_modelo,
+            'memoria_proceso_mb': round(actual, 1) if actual is not None else None,
+            'cargas': self.cargas,
+            'error': self.error,
+        }
+
+
+# Un modelo por proceso (compartido entre sesiones de Streamlit)
+_modelo = ModeloOCR()
+_precarga_lanzada = False
+_precarga_lock = threading.Lock()
+
+
+def modelo_ocr() -> ModeloOCR:
+    return _modelo
+
+
+def precargar_modelo_ocr() -> bool:
+    """
+    Precarga si COMPROBANTES_OCR_PRECARGA esta activo, una sola vez por
+    proceso: app.py lo llama en cada rerun, y un modelo liberado desde el
+    panel de admin no se vuelve a cargar solo.
+    """
+    global _precarga_lanzada
+    if not PRECARGA:
+        return False
+    with _precarga_lock:
+        if _precarga_lanzada:
+            return False
+        _precarga_lanzada = True
+    return _modelo.precargar()
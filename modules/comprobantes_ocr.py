@@ -0,0 +1,290 @@
+"""
+OCR de comprobantes con EasyOCR.
+
+Motores (parametro motor_ocr):
+- "easyocr": readtext sobre la captura completa.
+- "easyocr_roi": solo sobre las bandas donde estan los datos (cabecera,
+  formulario, barra inferior), recortadas y reducidas con Pillow.
+Con el sufijo "_procesos" (p.ej. "easyocr_roi_procesos") el OCR se hace en
+un pool de N procesos, cada uno con su propio reader cargado una sola vez.
+Las imagenes llegan por la cola del pool, asi el OCR escala con los nucleos
+de CPU en vez de competir por el GIL sobre un unico modelo.
+
+Este modulo no importa streamlit: los procesos del pool (spawn) lo importan
+y tiene que ser ligero.
+"""
+
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from modules.comprobantes_campos import bandas_de_regiones, extraer_campos
+from modules.comprobantes_imagen import preparar_para_ocr
+from modules.comprobantes_modelo import modelo_ocr
+
+MOTOR_ROI = "easyocr_roi"
+SUFIJO_PROCESOS = "_procesos"
+
+# Bandas de la captura (fracciones x0, y0, x1, y1) y campos que se leen de cada una.
+# Mismo layout que describe el prompt de Claude: match arriba, email en el
+# formulario del modal, cantidad en la barra inferior.
+REGIONES_ROI = {
+    'cabecera': ((0.0, 0.0, 1.0, 0.18), ('match',)),
+    'formulario': ((0.0, 0.28, 1.0, 0.72), ('email', 'categoria')),
+    'barra_inferior': ((0.0, 0.82, 1.0, 1.0), ('cantidad', 'categoria')),
+}
+# Bandas verticales de cada campo (pistas de posicion del parser)
+BANDAS_CAMPO = bandas_de_regiones(REGIONES_ROI)
+# Ancho maximo de cada recorte antes de reconocer (el texto de la UI sigue siendo legible)
+ANCHO_MAX_ROI = 960
+
+# ============== READER ==============
+
+def get_easyocr_reader():
+    """Obtiene el reader de EasyOCR compartido del proceso (lo carga si hace falta)"""
+    return modelo_ocr().obtener()
+
+
+# ============== PARSEO ==============
+
+def parsear_texto_ocr(textos: list, confianzas: list = None, cajas: list = None, alto: float = None) -> dict:
+    """
+    Busca email, match, cantidad y categoria en los textos detectados por el OCR
+    (un solo recorrido con el patron compilado de modules/comprobantes_campos.py).
+    Con `confianzas` (una por texto, la que da readtext) anade
+    resultado['confianza'] = {campo: 0..1}. Con `cajas` (las de readtext sobre
+    la captura completa, de `alto` pixeles) se prefieren las apariciones que
+    estan en la banda de REGIONES_ROI de cada campo.
+    """
+    resultado = extraer_campos(textos, confianzas, cajas, alto, BANDAS_CAMPO)
+    resultado['metodo'] = 'OCR'
+    resultado['cache'] = False
+    return resultado
+
+
+def _resultado_error(error) -> dict:
+    return {
+        'email': None,
+        'match': None,
+        'cantidad': None,
+        'categoria': None,
+        'metodo': 'OCR',
+        'error': str(error),
+        'cache': False
+    }
+
+
+def _alto(imagen):
+    """Alto en pixeles de lo que recibe readtext (array) o None si no se sabe"""
+    forma = getattr(imagen, 'shape', None)
+    return forma[0] if forma else None
+
+
+def extraer_datos_con_ocr(ruta_imagen: str, motor_ocr: str = "easyocr") -> dict:
+    """Extrae datos de una imagen usando EasyOCR (gratuito)"""
+    if motor_ocr.endswith(SUFIJO_PROCESOS):
+        motor_ocr = motor_ocr[:-len(SUFIJO_PROCESOS)]
+        pool = _pool_actual()
+        if pool is not None:
+            return pool.extraer(ruta_imagen, motor_ocr)
+    if motor_ocr == MOTOR_ROI:
+        return extraer_datos_con_ocr_roi(ruta_imagen)
+    try:
+        reader = get_easyocr_reader()
+        imagen = preparar_para_ocr(ruta_imagen)
+        resultados = reader.readtext(imagen)
+        return parsear_texto_ocr(
+            [r[1] for r in resultados], [r[2] for r in resultados], [r[0] for r in resultados], _alto(imagen)
+        )
+    except Exception as e:
+        return _resultado_error(e)
+
+
+def recortar_regiones(ruta_imagen: str) -> dict:
+    """Recorta y reduce las bandas de REGIONES_ROI. Retorna {region: array en grises}"""
+    import numpy as np
+    from PIL import Image
+
+    with Image.open(ruta_imagen) as img:
+        img = img.convert('L')
+        ancho, alto = img.size
+        recortes = {}
+        for nombre, ((x0, y0, x1, y1), _) in REGIONES_ROI.items():
+            banda = img.crop((int(x0 * ancho), int(y0 * alto), int(x1 * ancho), int(y1 * alto)))
+            if banda.width > ANCHO_MAX_ROI:
+                nuevo_alto = max(1, round(banda.height * ANCHO_MAX_ROI / banda.width))
+                banda = banda.resize((ANCHO_MAX_ROI, nuevo_alto), Image.LANCZOS)
+            recortes[nombre] = np.asarray(banda)
+    return recortes
+
+
+def extraer_datos_con_ocr_roi(ruta_imagen: str) -> dict:
+    """
+    OCR por regiones: cada campo se toma de la banda donde deberia estar y,
+    si no aparece, de cualquier otra banda. Si faltan email o match tras las
+    bandas se hace un OCR completo como red de seguridad.
+    resultado['regiones'] indica de que region salio cada campo.
+    """
+    try:
+        reader = get_easyocr_reader()
+        por_region = {}
+        textos_todos = []
+        for nombre, recorte in recortar_regiones(ruta_imagen).items():
+            detecciones = reader.readtext(recorte)
+            textos = [r[1] for r in detecciones]
+            textos_todos.extend(textos)
+            por_region[nombre] = parsear_texto_ocr(textos, [r[2] for r in detecciones])
+
+        # Los campos salen de las regiones: sin volver a parsear el texto unido
+        resultado = {'metodo': 'OCR', 'cache': False, 'texto_raw': ' '.join(textos_todos).lower()[:500]}
+        regiones = {}
+        confianza = {}
+        for campo in ('email', 'match', 'cantidad', 'categoria'):
+            resultado[campo] = None
+            propias = [n for n, (_, campos) in REGIONES_ROI.items() if campo in campos]
+            otras = [n for n in REGIONES_ROI if n not in propias]
+            for nombre in propias + otras:
+                valor = por_region[nombre].get(campo)
+                if valor:
+                    resultado[campo] = valor
+                    regiones[campo] = nombre
+                    if campo in por_region[nombre]['confianza']:
+                        confianza[campo] = por_region[nombre]['confianza'][campo]
+                    break
+
+        if not (resultado['email'] and resultado['match']):
+            imagen = preparar_para_ocr(ruta_imagen)
+            detecciones = reader.readtext(imagen)
+            completo = parsear_texto_ocr(
+                [r[1] for r in detecciones], [r[2] for r in detecciones], [r[0] for r in detecciones], _alto(imagen)
+            )
+            for campo in ('email', 'match', 'cantidad', 'categoria'):
+                if not resultado[campo] and completo.get(campo):
+                    resultado[campo] = completo[campo]
+                    regiones[campo] = 'completa'
+                    if campo in completo['confianza']:
+                        confianza[campo] = completo['confianza'][campo]
+
+        resultado['confianza'] = confianza
+
+        resultado['motor'] = MOTOR_ROI
+        resultado['regiones'] = regiones
+        return resultado
+    except Exception as e:
+        return _resultado_error(e)
+
+
+# ============== POOL DE PROCESOS ==============
+
+def _inicializar_proceso(hilos_torch: int):
+    """Se ejecuta una vez en cada proceso del pool: limita hilos y carga el modelo"""
+    try:
+        import torch
+        torch.set_num_threads(hilos_torch)
+    except ImportError:
+        pass
+    get_easyocr_reader()
+
+
+def _extraer_en_proceso(ruta_imagen: str, motor_ocr: str) -> dict:
+    return extraer_datos_con_ocr(ruta_imagen, motor_ocr)
+
+
+def _pid_proceso() -> int:
+    return os.getpid()
+
+
+class PoolOCR:
+    """Pool de procesos EasyOCR (un reader por proceso)"""
+
+    def __init__(self, procesos: int, hilos_torch: int = 1):
+        self.procesos = procesos
+        self.hilos_torch = hilos_torch
+        self.roto = False
+        # spawn: el proceso de Streamlit tiene hilos y fork podria dejar locks tomados
+        self._executor = ProcessPoolExecutor(
+            max_workers=procesos,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_inicializar_proceso,
+            initargs=(hilos_torch,),
+        )
+
+    def precargar(self) -> int:
+        """Arranca los procesos y espera a que todos tengan el modelo cargado"""
+        try:
+            futures = [self._executor.submit(_pid_proceso) for _ in range(self.procesos)]
+            return len({f.result() for f in futures})
+        except BrokenProcessPool:
+            # Normalmente el modelo no se pudo cargar en algun proceso
+            self.roto = True
+            raise
+
+    def extraer(self, ruta_imagen, motor_ocr: str = "easyocr") -> dict:
+        try:
+            futuro = self._executor.submit(_extraer_en_proceso, str(ruta_imagen), motor_ocr)
+        except BrokenProcessPool as e:
+            self.roto = True
+            return _resultado_error(e)
+        except RuntimeError:
+            # Retirado entre obtenerlo y enviar (otra sesion pidio otro tamano):
+            # la imagen va al pool actual o, si no hay, al reader de este proceso
+            pool = _pool_actual()
+            if pool is not None and pool is not self:
+                return pool.extraer(ruta_imagen, motor_ocr)
+            return extraer_datos_con_ocr(ruta_imagen, motor_ocr)
+        try:
+            return futuro.result()
+        except BrokenProcessPool as e:
+            self.roto = True
+            return _resultado_error(e)
+        except Exception as e:
+            return _resultado_error(e)
+
+    def retirar(self):
+        """No acepta mas imagenes pero termina las que ya tiene en cola (de otras sesiones)"""
+        self._executor.shutdown(wait=False)
+
+    def cerrar(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Un pool por proceso de Streamlit, reutilizado entre ejecuciones (el modelo queda cargado)
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _pool_actual():
+    return _pool
+
+
+def obtener_pool_ocr(procesos: int, hilos_torch: int = 1) -> PoolOCR:
+    """
+    Obtiene el pool con `procesos` procesos. Si cambia el tamano se crea
+    otro y el anterior se retira sin cancelar lo que tiene en cola: las
+    verificaciones de otras sesiones que lo usan no pierden su OCR.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool.roto:
+            _pool.cerrar()
+            _pool = None
+        elif _pool is not None and (_pool.procesos != procesos or _pool.hilos_torch != hilos_torch):
+            _pool.retirar()
+            _pool = None
+        if _pool is None:
+            _pool = PoolOCR(procesos, hilos_torch)
+        return _pool
+
+
+def cerrar_pool_ocr():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.cerrar()
+            _pool = None
+
+
+atexit.register(cerrar_pool_ocr)
@@ -4,7 +4,7 @@ Ejecutar con: streamlit run verificador_web.py
 
 Mejoras incluidas:
 - OCR gratuito (EasyOCR) con fallback a Claude Vision
-- Cache de resultados para ahorrar tiempo y dinero
+- Cache de resultados para ahorrar tiempo y dinero (SQLite, persistido por imagen)
 - Procesamiento en paralelo
 - Tolerancia en comparacion de emails
 - Vista previa para debug
@@ -13,135 +13,51 @@ Mejoras incluidas:
 """
 
 import configparser
-import shutil
 import base64
-import json
-import time
-import hashlib
-import re
 import os
-import ssl
+import time
 import streamlit as st
+import numpy as np
 import pandas as pd
 from pathlib import Path
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from difflib import SequenceMatcher
-from io import BytesIO
 from dotenv import load_dotenv
 
-# Desactivar verificacion SSL para descarga de modelos EasyOCR
-ssl._create_default_https_context = ssl._create_unverified_context
-
 import anthropic
 
+from modules.claude_batches import MAX_FALLOS_CONSULTA, GestorLotes, iniciar_sondeo
+from modules.claude_vision import MotorAgrupado, MotorVision, obtener_motor_vision
+from modules.comprobantes_imagen import preparar_para_claude, recortar_vertical
+from modules.comprobantes_cache import abrir_cache, namespace_de_metodo, namespaces_para
+from modules.comprobantes_campos import email_valido
+from modules.comprobantes_clasificacion import clasificar_archivos
+from modules.comprobantes_ejecuciones import (
+    DiarioEjecucion, firma_imagen, limpiar_ejecuciones, listar_ejecuciones, separar_por_parametros
+)
+from modules.comprobantes_emails import IndiceEmails
+from modules.comprobantes_excel import excel_de_resultados
+from modules.comprobantes_subidas import iterar_subidas, nuevo_resumen
+from modules.comprobantes_tabla import borrar_copias, cargar_tabla, version_tabla
+from modules.comprobantes_trabajos import (
+    INTERVALO_UI, TrabajoVerificacion, iniciar_trabajo, obtener_trabajo, quitar_trabajo
+)
+from modules.comprobantes_ocr import (
+    MOTOR_ROI, REGIONES_ROI, SUFIJO_PROCESOS, extraer_datos_con_ocr, modelo_ocr, obtener_pool_ocr
+)
+
 # Cargar variables de entorno
 env_path = Path(__file__).parent.parent / '.env'
 if env_path.exists():
     load_dotenv(env_path)
 
 # ============== OCR (EasyOCR) ==============
+# Reader, parseo y pool de procesos en modules/comprobantes_ocr.py
 
-# Variable global para el reader de EasyOCR (lazy loading)
-_easyocr_reader = None
-
-
-def get_easyocr_reader():
-    """Obtiene el reader de EasyOCR (lazy loading)"""
-    global _easyocr_reader
-    if _easyocr_reader is None:
-        import easyocr
-        _easyocr_reader = easyocr.Reader(['en'], gpu=False, verbose=False)
-    return _easyocr_reader
-
+CAMPOS_COMPROBANTE = ('email', 'match', 'cantidad', 'categoria')
 
-def extraer_datos_con_ocr(ruta_imagen: str, motor_ocr: str = "easyocr") -> dict:
-    """Extrae datos de una imagen usando EasyOCR (gratuito)"""
-    # Solo EasyOCR disponible
-    try:
-        reader = get_easyocr_reader()
-        resultados = reader.readtext(ruta_imagen)
-
-        # Extraer todo el texto
-        textos = [r[1] for r in resultados]
-        texto_completo = ' '.join(textos).lower()
-
-        # Buscar email (patron comun)
-        email = None
-        email_pattern = r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}'
-        emails_encontrados = re.findall(email_pattern, ' '.join(textos))
-        if emails_encontrados:
-            # Filtrar emails que no sean del sistema (ej: noreply, support, etc)
-            for e in emails_encontrados:
-                e_lower = e.lower()
-                if not any(x in e_lower for x in ['noreply', 'support', 'fifa', 'ticket']):
-                    email = e_lower
-                    break
-            if not email and emails_encontrados:
-                email = emails_encontrados[0].lower()
-
-        # Buscar Match number
-        match_num = None
-        match_patterns = [
-            r'match\s*(\d{1,3})',
-            r'match\s*#\s*(\d{1,3})',
-            r'partido\s*(\d{1,3})'
-        ]
-        for pattern in match_patterns:
-            match_found = re.search(pattern, texto_completo)
-            if match_found:
-                match_num = int(match_found.group(1))
-                break
-
-        # Buscar cantidad de tickets
-        cantidad = None
-        cantidad_patterns = [
-            r'(\d+)\s*tickets?\s*selected',
-            r'(\d+)\s*tickets?',
-            r'transfer\s*(\d+)',
-            r'(\d+)\s*entradas?'
-        ]
-        for pattern in cantidad_patterns:
-            match_found = re.search(pattern, texto_completo)
-            if match_found:
-                num = int(match_found.group(1))
-                if 1 <= num <= 20:  # Rango razonable de tickets
-                    cantidad = num
-                    break
-
-        # Buscar categoria
-        categoria = None
-        cat_patterns = [
-            r'category\s*(\d+)',
-            r'cat\.?\s*(\d+)',
-            r'categoria\s*(\d+)'
-        ]
-        for pattern in cat_patterns:
-            match_found = re.search(pattern, texto_completo)
-            if match_found:
-                categoria = f"Category {match_found.group(1)}"
-                break
-
-        return {
-            'email': email,
-            'match': match_num,
-            'cantidad': cantidad,
-            'categoria': categoria,
-            'metodo': 'OCR',
-            'texto_raw': texto_completo[:500],  # Para debug
-            'cache': False
-        }
-
-    except Exception as e:
-        return {
-            'email': None,
-            'match': None,
-            'cantidad': None,
-            'categoria': None,
-            'metodo': 'OCR',
-            'error': str(e),
-            'cache': False
-        }
+# Por debajo de esta confianza (0-1, la de readtext) un campo del OCR se pide a Claude
+UMBRAL_CONFIANZA_OCR = float(os.getenv('COMPROBANTES_OCR_CONFIANZA_MIN', '0.35'))
 
 
 def validar_resultado_ocr(resultado: dict) -> tuple:
@@ -154,8 +70,7 @@ def validar_resultado_ocr(resultado: dict) -> tuple:
 
     # Validar email
     if resultado.get('email'):
-        email = resultado['email']
-        if re.match(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$', email):
+        if email_valido(resultado['email']):
             campos_validos.append('email')
         else:
             campos_faltantes.append('email')
@@ -192,6 +107,31 @@ def validar_resultado_ocr(resultado: dict) -> tuple:
     return es_valido, campos_validos, campos_faltantes
 
 
+def campos_dudosos(resultado: dict, umbral: float = UMBRAL_CONFIANZA_OCR) -> list:
+    """Campos leidos por el OCR con confianza menor que el umbral"""
+    confianza = resultado.get('confianza') or {}
+    return [c for c in CAMPOS_COMPROBANTE if resultado.get(c) and confianza.get(c, 1.0) < umbral]
+
+
+def ocr_suficiente(resultado: dict) -> bool:
+    """El OCR basta sin Claude: valido y sin email ni match dudosos"""
+    es_valido, _, campos_faltantes = validar_resultado_ocr(resultado)
+    dudosos = campos_dudosos(resultado)
+    return es_valido and not any(c in campos_faltantes or c in dudosos for c in ('email', 'match'))
+
+
+def cargar_modelo_ocr(status_text):
+    """Reader compartido del proceso; solo muestra estado si aun no esta cargado"""
+    modelo = modelo_ocr()
+    if modelo.listo():
+        return
+    if modelo.fase == 'cargando':
+        status_text.text("🔧 Esperando a que termine la precarga de EasyOCR...")
+    else:
+        status_text.text("🔧 Cargando EasyOCR (primera vez puede tardar)...")
+    modelo.obtener()
+
+
 # ============== CONFIGURACION POR USUARIO ==============
 
 # Carpeta base para datos de usuarios (configurable)
@@ -243,9 +183,26 @@ def get_config_path(email: str = None):
 
 
 def get_cache_path(email: str = None):
-    """Retorna la ruta del archivo de cache del usuario"""
+    """Retorna la ruta de la base de datos de cache del usuario"""
+    carpeta = get_carpeta_usuario(email)
+    return carpeta / 'cache_resultados.db'
+
+
+def get_lotes_path(email: str = None):
+    """Retorna la ruta del registro de lotes de Claude Vision del usuario"""
+    carpeta = get_carpeta_usuario(email)
+    return carpeta / 'lotes_claude.json'
+
+
+def get_ejecuciones_path(email: str = None):
+    """Retorna la carpeta con los diarios de ejecucion (reanudables) del usuario"""
     carpeta = get_carpeta_usuario(email)
-    return carpeta / 'cache_resultados.json'
+    return carpeta / 'ejecuciones'
+
+
+def get_gestor_lotes(api_key: str) -> GestorLotes:
+    """Gestor de lotes (Message Batches) del usuario actual"""
+    return GestorLotes(get_lotes_path(), get_cache_path(), anthropic.Anthropic(api_key=api_key))
 
 
 def cargar_config() -> dict:
@@ -404,70 +361,64 @@ def guardar_config(imagenes: str, tabla: str, reporte: str, api_key: str, email:
 
 # ============== CACHE ==============
 
-def cargar_cache() -> dict:
-    """Carga el cache de resultados"""
+def cargar_cache():
+    """
+    Abre el cache de resultados del usuario (SQLite en modo WAL).
+    Cada entrada se escribe en disco al asignarla; migra el antiguo
+    cache_resultados.json la primera vez.
+    """
     cache_path = get_cache_path()
-    if cache_path.exists():
-        try:
-            with open(cache_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
+    return abrir_cache(cache_path, cache_path.with_suffix('.json'))
 
 
-def guardar_cache(cache: dict):
-    """Guarda el cache de resultados"""
-    with open(get_cache_path(), 'w', encoding='utf-8') as f:
-        json.dump(cache, f, ensure_ascii=False, indent=2)
+def guardar_cache(cache):
+    """Vuelca el WAL del cache (las entradas ya se persisten una a una)"""
+    cache.sincronizar()
 
 
-def calcular_hash_imagen(ruta_imagen: str) -> str:
-    """Calcula el hash MD5 de una imagen para identificarla en cache"""
-    with open(ruta_imagen, 'rb') as f:
-        return hashlib.md5(f.read()).hexdigest()
+def calcular_hash_imagen(ruta_imagen: str, cache=None) -> str:
+    """
+    Hash BLAKE2b de la imagen para identificarla en cache. Usa el indice
+    (ruta, tamano, mtime) del cache: las imagenes sin cambios no se releen.
+    """
+    if cache is None:
+        cache = cargar_cache()
+    return cache.hash_archivo(ruta_imagen)[0]
 
 
 def limpiar_cache():
-    """Elimina el archivo de cache"""
-    cache_path = get_cache_path()
-    if cache_path.exists():
-        cache_path.unlink()
+    """Vacia el cache de resultados"""
+    cargar_cache().limpiar()
 
 
 # ============== DATOS ==============
 
-def cargar_tabla(ruta: str) -> pd.DataFrame:
-    """Carga la tabla de referencia."""
-    ruta = Path(ruta)
-    if ruta.suffix.lower() == '.csv':
-        # Intentar diferentes codificaciones y separadores
-        separadores = [',', ';', '\t', '|']
-        codificaciones = ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']
+# Lectura de la tabla (deteccion de formato y copia columnar) en modules/comprobantes_tabla.py
 
-        for sep in separadores:
-            for encoding in codificaciones:
-                try:
-                    df = pd.read_csv(ruta, encoding=encoding, sep=sep)
-                    # Verificar que tiene mas de una columna (separador correcto)
-                    if len(df.columns) > 1:
-                        print(f"[CSV] Cargado con sep='{sep}', encoding={encoding}")
-                        return df
-                except:
-                    continue
+def normalizar_pedidos(columna: pd.Series) -> pd.Series:
+    """
+    PEDIDO VENTA como texto: los numericos sin decimales ('12345.0' -> '12345'),
+    el resto tal cual sin espacios. Los vacios quedan como NaN.
+    """
+    numeros = pd.to_numeric(columna, errors='coerce').astype(float)
+    enteros = np.isfinite(numeros) & (numeros.abs() < 1e18)
+    pedidos = pd.Series(None, index=columna.index, dtype=object)
+    pedidos[enteros] = numeros[enteros].astype('int64').astype(str)
 
-        # Fallback: intentar con deteccion automatica
-        return pd.read_csv(ruta, encoding='utf-8', errors='ignore')
-    elif ruta.suffix.lower() in ['.xlsx', '.xls']:
-        return pd.read_excel(ruta)
-    else:
-        raise ValueError(f"Formato no soportado: {ruta.suffix}")
+    # Solo los no numericos pasan por texto
+    resto = ~enteros & columna.notna()
+    if resto.any():
+        texto = columna[resto].astype(str).str.strip()
+        pedidos[resto] = texto.where(texto != '', None)
+    return pedidos
 
 
 def agrupar_por_pedido(tabla: pd.DataFrame) -> dict:
-    """Agrupa los datos por PEDIDO VENTA."""
-    agrupados = {}
-
+    """
+    Agrupa los datos por PEDIDO VENTA: {pedido: {match, partido, categoria, cantidad, email}}.
+    Datos de la primera fila de cada pedido; cantidad = numero de filas.
+    Pedidos normalizados en bloque y un solo groupby (sin mascara por pedido).
+    """
     # Verificar columnas requeridas
     columnas_requeridas = ['PEDIDO VENTA', 'match', 'email_envio']
     columnas_tabla = list(tabla.columns)
@@ -477,40 +428,49 @@ def agrupar_por_pedido(tabla: pd.DataFrame) -> dict:
             print(f"[Error] Columna '{col}' no encontrada. Columnas disponibles: {columnas_tabla}")
             raise KeyError(f"Columna '{col}' no encontrada en la tabla. Columnas disponibles: {columnas_tabla}")
 
-    for pedido in tabla['PEDIDO VENTA'].unique():
-        filas = tabla[tabla['PEDIDO VENTA'] == pedido]
-        primera = filas.iloc[0]
+    pedidos = normalizar_pedidos(tabla['PEDIDO VENTA'])
+    validos = pedidos.notna().to_numpy()
+    if not validos.any():
+        return {}
+
+    # Solo las columnas usadas; columnas opcionales con 'N/A' si no existen
+    columnas = {
+        'match': tabla['match'],
+        'team_a': tabla['Team A'] if 'Team A' in columnas_tabla else 'N/A',
+        'team_b': tabla['Team B'] if 'Team B' in columnas_tabla else 'N/A',
+        'categoria': tabla['Category'] if 'Category' in columnas_tabla else 'N/A',
+        'email': tabla['email_envio'],
+    }
+    datos = pd.DataFrame(columnas, index=tabla.index)[validos]
+    datos['pedido'] = pedidos[validos].to_numpy()
 
-        if pd.notna(pedido):
-            try:
-                pedido_str = str(int(float(pedido)))
-            except (ValueError, TypeError):
-                pedido_str = str(pedido).strip()
-        else:
-            continue
-
-        # Obtener campos con valores por defecto si no existen
-        match_val = primera.get('match', 0)
-        team_a = primera.get('Team A', 'N/A')
-        team_b = primera.get('Team B', 'N/A')
-        categoria = primera.get('Category', 'N/A')
-        email = primera.get('email_envio', 'N/A')
-
-        agrupados[pedido_str] = {
-            'match': int(match_val) if pd.notna(match_val) else 0,
-            'partido': f"{team_a} vs {team_b}",
-            'categoria': categoria,
-            'cantidad': len(filas),
-            'email': str(email).strip().lower() if pd.notna(email) else ''
-        }
+    # Primera fila de cada pedido (con sus nulos, como iloc[0]) y numero de filas
+    primeras = datos.drop_duplicates('pedido').set_index('pedido')
+    cantidades = datos.groupby('pedido', sort=False).size()
 
-    return agrupados
+    match = pd.to_numeric(primeras['match'], errors='coerce').fillna(0).astype('int64')
+    partido = primeras['team_a'].astype(str) + ' vs ' + primeras['team_b'].astype(str)
+    email = primeras['email'].astype('string').str.strip().str.lower().fillna('')
+
+    return {
+        pedido: {
+            'match': m,
+            'partido': p,
+            'categoria': c,
+            'cantidad': n,
+            'email': e,
+        }
+        for pedido, m, p, c, n, e in zip(
+            primeras.index, match.tolist(), partido.tolist(), primeras['categoria'].tolist(),
+            cantidades.reindex(primeras.index).tolist(), email.tolist()
+        )
+    }
 
 
 def obtener_imagenes(carpeta: Path) -> list:
     """Obtiene las imagenes de la carpeta."""
-    extensiones = {'.jpg', '.jpeg', '.png', '.JPG', '.JPEG', '.PNG'}
-    return [f for f in carpeta.iterdir() if f.suffix in extensiones]
+    extensiones = {'.jpg', '.jpeg', '.png'}
+    return [f for f in carpeta.iterdir() if f.suffix.lower() in extensiones]
 
 
 # ============== TOLERANCIA EMAIL ==============
@@ -557,114 +517,79 @@ def comparar_emails(email_img: str, email_tabla: str, tolerancia: float = 0.9) -
 
 # ============== CLAUDE VISION ==============
 
-def extraer_datos_con_claude(ruta_imagen: str, client, max_reintentos: int = 3, delay: float = 2.0) -> dict:
-    """Extrae datos de una imagen usando Claude Vision con reintentos automaticos."""
-
-    with open(ruta_imagen, 'rb') as f:
-        imagen_bytes = f.read()
-
-    imagen_base64 = base64.standard_b64encode(imagen_bytes).decode('utf-8')
-
-    extension = Path(ruta_imagen).suffix.lower()
-    media_type = "image/jpeg" if extension in ['.jpg', '.jpeg'] else "image/png"
-
-    prompt = """Analiza esta imagen de un comprobante de tickets del Mundial FIFA 2026.
-
-Extrae los siguientes datos que estan visibles en la imagen:
-1. **email**: El email que aparece en el campo "Transfer Recipient's email address" (dentro del modal/formulario)
-2. **match**: El numero de partido que aparece en la parte SUPERIOR de la imagen (formato "Match X" o "Match XX")
-3. **cantidad**: La cantidad de tickets que se estan TRANSFIRIENDO. IMPORTANTE: Busca "X tickets" en la parte INFERIOR de la imagen (en la barra de abajo, cerca del boton "TRANSFER TICKET(S)"). NO uses el numero de arriba que muestra el total de tickets disponibles.
-4. **categoria**: La categoria que aparece junto a los tickets (formato "Category X")
-
-IMPORTANTE:
-- El match SIEMPRE esta en la parte superior de la imagen, no uses el que pueda aparecer detras del modal
-- El email esta dentro del campo de texto del formulario
-- La cantidad de tickets a transferir esta en la parte INFERIOR de la pantalla (barra de abajo), NO en la parte superior. La parte superior muestra el total, pero la inferior muestra los seleccionados con checkbox.
-
-Responde SOLO con un JSON valido en este formato exacto:
-{"email": "email@ejemplo.com", "match": 25, "cantidad": 4, "categoria": 3}
-
-Si no puedes leer algun campo, usa null para ese campo."""
-
-    ultimo_error = None
+def extraer_datos_con_claude(ruta_imagen: str, client, max_reintentos: int = 3, delay: float = 2.0,
+                             imagen_bytes: bytes = None) -> dict:
+    """
+    Extrae datos de una imagen usando Claude Vision con reintentos automaticos.
+    client: MotorVision / MotorAgrupado (o un anthropic.Anthropic, se usa su api_key).
+    imagen_bytes: contenido ya leido al calcular el hash (evita releer el fichero).
+    delay: base del backoff exponencial con jitter entre reintentos.
+    """
 
-    for intento in range(max_reintentos):
-        try:
-            response = client.messages.create(
-                model="claude-sonnet-4-20250514",
-                max_tokens=200,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "image",
-                                "source": {
-                                    "type": "base64",
-                                    "media_type": media_type,
-                                    "data": imagen_base64
-                                }
-                            },
-                            {
-                                "type": "text",
-                                "text": prompt
-                            }
-                        ]
-                    }
-                ]
-            )
+    if imagen_bytes is None:
+        with open(ruta_imagen, 'rb') as f:
+            imagen_bytes = f.read()
 
-            respuesta_texto = response.content[0].text.strip()
+    # Reducir al presupuesto de pixeles y re-codificar (menos bytes y tokens)
+    try:
+        imagen_bytes, media_type = preparar_para_claude(imagen_bytes)
+    except Exception:
+        extension = Path(ruta_imagen).suffix.lower()
+        media_type = "image/jpeg" if extension in ['.jpg', '.jpeg'] else "image/png"
 
-            if respuesta_texto.startswith('```'):
-                respuesta_texto = respuesta_texto.split('```')[1]
-                if respuesta_texto.startswith('json'):
-                    respuesta_texto = respuesta_texto[4:]
-                respuesta_texto = respuesta_texto.strip()
+    imagen_base64 = base64.standard_b64encode(imagen_bytes).decode('utf-8')
 
-            datos = json.loads(respuesta_texto)
+    motor = client if isinstance(client, (MotorVision, MotorAgrupado)) else obtener_motor_vision(client.api_key)
+    return motor.extraer(imagen_base64, media_type, max_reintentos, delay)
 
-            return {
-                'email': datos.get('email', '').lower() if datos.get('email') else None,
-                'match': datos.get('match'),
-                'cantidad': datos.get('cantidad'),
-                'categoria': f"Category {datos.get('categoria')}" if datos.get('categoria') else None,
-                'metodo': 'Claude Vision',
-                'reintentos': intento,
-                'cache': False
-            }
 
-        except Exception as e:
-            ultimo_error = str(e)
-            if intento < max_reintentos - 1:
-                time.sleep(delay * (intento + 1))
+def extraer_campos_con_claude(ruta_imagen: str, client, campos: list, imagen_bytes: bytes = None) -> dict:
+    """
+    Pide a Claude solo `campos`, enviando si se puede solo la banda de la
+    captura donde estan (REGIONES_ROI). Retorna {campo: valor} o 'error'.
+    """
+    if imagen_bytes is None:
+        with open(ruta_imagen, 'rb') as f:
+            imagen_bytes = f.read()
+
+    bandas = [(nombre, caja) for nombre, (caja, campos_region) in REGIONES_ROI.items()
+              if any(c in campos_region for c in campos)]
+    y0 = min(caja[1] for _, caja in bandas)
+    y1 = max(caja[3] for _, caja in bandas)
+    zona = None
+    try:
+        if y1 - y0 < 0.9:
+            imagen_bytes = recortar_vertical(imagen_bytes, y0, y1)
+            zona = " y ".join(nombre.replace('_', ' ') for nombre, _ in bandas)
+        imagen_bytes, media_type = preparar_para_claude(imagen_bytes)
+    except Exception:
+        extension = Path(ruta_imagen).suffix.lower()
+        media_type = "image/jpeg" if extension in ['.jpg', '.jpeg'] else "image/png"
 
-    return {
-        'email': None,
-        'match': None,
-        'cantidad': None,
-        'categoria': None,
-        'metodo': 'Claude Vision',
-        'error': f"Fallo despues de {max_reintentos} intentos: {ultimo_error}",
-        'reintentos': max_reintentos,
-        'cache': False
-    }
+    imagen_base64 = base64.standard_b64encode(imagen_bytes).decode('utf-8')
+    motor = client if isinstance(client, (MotorVision, MotorAgrupado)) else obtener_motor_vision(client.api_key)
+    return motor.extraer_campos(imagen_base64, media_type, campos, zona)
 
 
 # ============== EXTRACCION INTELIGENTE ==============
 
-def extraer_datos_inteligente(ruta_imagen: str, client, metodo: str = "ocr_fallback", motor_ocr: str = "easyocr") -> dict:
+def extraer_datos_inteligente(ruta_imagen: str, client, metodo: str = "ocr_fallback", motor_ocr: str = "easyocr",
+                              imagen_bytes: bytes = None) -> dict:
     """
     Extrae datos usando el metodo especificado:
     - "solo_ocr": Solo usa OCR (gratuito)
     - "solo_claude": Solo usa Claude Vision (de pago)
-    - "ocr_fallback": Intenta OCR primero, si falla usa Claude Vision
+    - "ocr_fallback": Intenta OCR primero; si faltan o son dudosos (baja
+      confianza) email o match, pide a Claude solo los campos que faltan o
+      son dudosos y los combina con los del OCR. Si el OCR no leyo nada
+      util, usa Claude Vision con la imagen completa.
 
-    motor_ocr puede ser "easyocr" o "paddleocr"
+    motor_ocr puede ser "easyocr" o "easyocr_roi" (con sufijo "_procesos" para el pool)
+    imagen_bytes (opcional) se reutiliza para Claude Vision
     """
 
     if metodo == "solo_claude":
-        return extraer_datos_con_claude(ruta_imagen, client)
+        return extraer_datos_con_claude(ruta_imagen, client, imagen_bytes=imagen_bytes)
 
     elif metodo == "solo_ocr":
         return extraer_datos_con_ocr(ruta_imagen, motor_ocr)
@@ -675,39 +600,72 @@ def extraer_datos_inteligente(ruta_imagen: str, client, metodo: str = "ocr_fallb
 
         # Validar resultado
         es_valido, campos_validos, campos_faltantes = validar_resultado_ocr(resultado_ocr)
+        dudosos = campos_dudosos(resultado_ocr)
+        criticos = [c for c in ('email', 'match') if c in campos_faltantes or c in dudosos]
 
-        if es_valido:
+        if es_valido and not criticos:
             # OCR fue suficiente
             resultado_ocr['fallback_usado'] = False
             return resultado_ocr
-        else:
-            # Necesitamos Claude Vision
-            resultado_claude = extraer_datos_con_claude(ruta_imagen, client)
-            resultado_claude['fallback_usado'] = True
-            resultado_claude['ocr_campos_encontrados'] = campos_validos
-            resultado_claude['metodo'] = 'Claude Vision (fallback)'
-            return resultado_claude
-
-
-def extraer_con_cache(ruta_imagen: str, client, cache: dict, usar_cache: bool = True, metodo: str = "ocr_fallback", motor_ocr: str = "easyocr") -> dict:
-    """Extrae datos usando cache si esta disponible"""
-    imagen_hash = calcular_hash_imagen(ruta_imagen)
-
-    if usar_cache and imagen_hash in cache:
-        resultado = cache[imagen_hash].copy()
-        resultado['cache'] = True
-        return resultado
 
-    resultado = extraer_datos_inteligente(ruta_imagen, client, metodo, motor_ocr)
-
-    # Guardar en cache si no hay error
+        # Solo los campos que faltan o son dudosos (los que van de paso no cuestan otra peticion)
+        pedir = [c for c in CAMPOS_COMPROBANTE if c in campos_faltantes or c in dudosos]
+        if len(pedir) < len(CAMPOS_COMPROBANTE) and 'error' not in resultado_ocr:
+            parcial = extraer_campos_con_claude(ruta_imagen, client, pedir, imagen_bytes)
+            if 'error' not in parcial:
+                resultado = dict(resultado_ocr)
+                for campo in pedir:
+                    if parcial.get(campo) is not None:
+                        resultado[campo] = parcial[campo]
+                resultado['metodo'] = 'OCR + Claude (parcial)'
+                resultado['campos_claude'] = pedir
+                resultado['fallback_usado'] = True
+                resultado['reintentos'] = parcial.get('reintentos', 0)
+                return resultado
+
+        # Necesitamos Claude Vision con la imagen completa
+        resultado_claude = extraer_datos_con_claude(ruta_imagen, client, imagen_bytes=imagen_bytes)
+        resultado_claude['fallback_usado'] = True
+        resultado_claude['ocr_campos_encontrados'] = campos_validos
+        resultado_claude['metodo'] = 'Claude Vision (fallback)'
+        return resultado_claude
+
+
+def extraer_con_cache(ruta_imagen: str, client, cache, usar_cache: bool = True, metodo: str = "ocr_fallback", motor_ocr: str = "easyocr") -> dict:
+    """
+    Extrae datos usando cache si esta disponible. Solo se aceptan entradas
+    del namespace que corresponde al metodo (un resultado de OCR no sirve
+    para "solo_claude"; en "ocr_fallback" el OCR cacheado debe ser valido y
+    sin email ni match dudosos segun su confianza guardada, si no pasa por
+    el fallback como uno recien leido).
+    """
+    # Si la imagen no estaba en el indice se lee una sola vez: el mismo
+    # contenido sirve para el hash y para el base64 de Claude Vision
+    imagen_hash, imagen_bytes = cache.hash_archivo(ruta_imagen, devolver_bytes=True)
+
+    if usar_cache:
+        resultado = cache.get(imagen_hash, namespaces=namespaces_para(metodo))
+        if resultado is not None and (
+            metodo != "ocr_fallback"
+            or namespace_de_metodo(resultado.get('metodo')) != 'ocr'
+            or ocr_suficiente(resultado)
+        ):
+            resultado['cache'] = True
+            return resultado
+
+    resultado = extraer_datos_inteligente(ruta_imagen, client, metodo, motor_ocr, imagen_bytes=imagen_bytes)
+
+    # Guardar en cache si no hay error (se persiste inmediatamente)
     if 'error' not in resultado:
-        cache[imagen_hash] = {
+        cache[imagen_hash] = {  # namespace segun resultado['metodo']
             'email': resultado.get('email'),
             'match': resultado.get('match'),
             'cantidad': resultado.get('cantidad'),
             'categoria': resultado.get('categoria'),
             'metodo': resultado.get('metodo'),
+            'regiones': resultado.get('regiones'),
+            'confianza': resultado.get('confianza'),
+            'campos_claude': resultado.get('campos_claude'),
             'fecha_cache': datetime.now().isoformat()
         }
 
@@ -716,9 +674,53 @@ def extraer_con_cache(ruta_imagen: str, client, cache: dict, usar_cache: bool =
 
 # ============== PROCESAMIENTO ==============
 
+def contar_metodo(contadores: dict, resultado: dict):
+    """
+    Suma el resultado al contador de su metodo (ocr / mixto / claude) y los
+    campos que leyo el OCR a 'campos_ocr' (base del ahorro estimado)
+    """
+    metodo_usado = resultado.get('metodo_usado', '')
+    total_campos = len(CAMPOS_COMPROBANTE)
+    if 'parcial' in metodo_usado.lower():
+        contadores['mixto'] += 1
+        n_claude = len([c for c in resultado.get('campos_claude', '').split(', ') if c])
+        contadores['campos_ocr'] += total_campos - n_claude
+    elif 'Claude' in metodo_usado:
+        contadores['claude'] += 1
+    elif 'OCR' in metodo_usado:
+        contadores['ocr'] += 1
+        contadores['campos_ocr'] += total_campos
+
+
+def sugerir_pedido(resultado: dict, indice_emails, email: str, pedido: str, tolerancia: float):
+    """Si el email leido es de otro pedido de la tabla, lo anota como sugerencia (nombre de fichero erroneo)"""
+    if indice_emails is None or not email:
+        return
+    pedidos, similitud = indice_emails.sugerir_pedido(email, pedido, tolerancia)
+    if pedidos:
+        resultado['pedido_sugerido'] = ', '.join(pedidos)
+        resultado['similitud_sugerido'] = round(similitud * 100, 1)
+
+
+def contar_resultado(contadores: dict, resultado: dict):
+    """Suma el resultado a los contadores de estado y de metodo"""
+    if resultado['estado'] == 'ERROR' or resultado.get('error_extraccion'):
+        # No se pudo procesar (worker o extraccion fallidos): no es una discrepancia
+        contadores['errores'] += 1
+    elif resultado['estado'] in ['OK', 'OK (EMAIL SIMILAR)']:
+        contadores['ok'] += 1
+    elif resultado['estado'] == 'PARCIAL':
+        contadores['parcial'] += 1
+    elif resultado['estado'] == 'NO ENCONTRADO EN TABLA':
+        contadores['no_encontrado'] += 1
+    else:
+        contadores['no_coincide'] += 1
+    contar_metodo(contadores, resultado)
+
+
 def procesar_imagen_worker(args):
     """Worker para procesamiento paralelo"""
-    imagen, client, cache, usar_cache, datos_tabla, tolerancia_email, metodo_extraccion, motor_ocr = args
+    imagen, client, cache, usar_cache, datos_tabla, tolerancia_email, metodo_extraccion, motor_ocr, indice_emails = args
 
     pedido = imagen.stem
     resultado = {
@@ -738,9 +740,18 @@ def procesar_imagen_worker(args):
     resultado['fallback_usado'] = datos_img.get('fallback_usado', False)
     resultado['reintentos'] = datos_img.get('reintentos', 0)
     resultado['error_extraccion'] = datos_img.get('error')
+    # OCR por regiones: de que banda salio cada campo
+    regiones = datos_img.get('regiones') or {}
+    resultado['regiones_ocr'] = ', '.join(f"{campo}:{region}" for campo, region in regiones.items())
+    # Fallback parcial: campos que leyo Claude en lugar del OCR
+    resultado['campos_claude'] = ', '.join(datos_img.get('campos_claude') or [])
+
+    resultado['pedido_sugerido'] = ''
+    resultado['similitud_sugerido'] = 0.0
 
     # Buscar en tabla
     if pedido not in datos_tabla:
+        sugerir_pedido(resultado, indice_emails, datos_img.get('email'), pedido, tolerancia_email)
         resultado['estado'] = 'NO ENCONTRADO EN TABLA'
         resultado['email_tabla'] = ''
         resultado['match_tabla'] = ''
@@ -789,143 +800,11 @@ def procesar_imagen_worker(args):
         resultado['estado'] = "PARCIAL"
     else:
         resultado['estado'] = "NO COINCIDE"
+        sugerir_pedido(resultado, indice_emails, datos_img.get('email'), pedido, tolerancia_email)
 
     return resultado
 
 
-# ============== CLASIFICACION ==============
-
-def clasificar_archivos(resultados, carpeta_imagenes, carpeta_reporte):
-    """Clasifica los archivos en carpetas"""
-    carpeta_buenos = carpeta_reporte / 'buenos'
-    carpeta_regular = carpeta_reporte / 'regular'
-    carpeta_malos = carpeta_reporte / 'malos'
-
-    for carpeta in [carpeta_buenos, carpeta_regular, carpeta_malos]:
-        if carpeta.exists():
-            shutil.rmtree(carpeta)
-        carpeta.mkdir(exist_ok=True)
-
-    for r in resultados:
-        archivo_origen = carpeta_imagenes / r['archivo']
-
-        if r['estado'] in ['OK', 'OK (EMAIL SIMILAR)']:
-            destino = carpeta_buenos / r['archivo']
-        elif r['estado'] == 'PARCIAL':
-            destino = carpeta_regular / r['archivo']
-        else:
-            destino = carpeta_malos / r['archivo']
-
-        shutil.copy2(archivo_origen, destino)
-
-    return carpeta_buenos, carpeta_regular, carpeta_malos
-
-
-# ============== EXPORTACION EXCEL ==============
-
-def exportar_excel(df: pd.DataFrame) -> bytes:
-    """Exporta el DataFrame a Excel con formato"""
-    from openpyxl import Workbook
-    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-    from openpyxl.utils.dataframe import dataframe_to_rows
-
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Verificacion"
-
-    # Estilos
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-    ok_fill = PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")
-    parcial_fill = PatternFill(start_color="FFEB9C", end_color="FFEB9C", fill_type="solid")
-    error_fill = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")
-    border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
-
-    # Escribir datos
-    for r_idx, row in enumerate(dataframe_to_rows(df, index=False, header=True), 1):
-        for c_idx, value in enumerate(row, 1):
-            cell = ws.cell(row=r_idx, column=c_idx, value=value)
-            cell.border = border
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-
-            if r_idx == 1:  # Header
-                cell.font = header_font
-                cell.fill = header_fill
-            else:
-                # Colorear segun estado
-                if c_idx == 2:  # Columna estado
-                    if value in ['OK', 'OK (EMAIL SIMILAR)']:
-                        cell.fill = ok_fill
-                    elif value == 'PARCIAL':
-                        cell.fill = parcial_fill
-                    else:
-                        cell.fill = error_fill
-
-    # Ajustar anchos
-    for column in ws.columns:
-        max_length = 0
-        column_letter = column[0].column_letter
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = min(max_length + 2, 50)
-        ws.column_dimensions[column_letter].width = adjusted_width
-
-    # Crear hoja de resumen
-    ws_resumen = wb.create_sheet(title="Resumen")
-
-    # Contar estados
-    conteo = df['estado'].value_counts()
-
-    ws_resumen['A1'] = "RESUMEN DE VERIFICACION"
-    ws_resumen['A1'].font = Font(bold=True, size=14)
-    ws_resumen['A3'] = "Estado"
-    ws_resumen['B3'] = "Cantidad"
-    ws_resumen['A3'].font = header_font
-    ws_resumen['B3'].font = header_font
-    ws_resumen['A3'].fill = header_fill
-    ws_resumen['B3'].fill = header_fill
-
-    row = 4
-    for estado, cantidad in conteo.items():
-        ws_resumen[f'A{row}'] = estado
-        ws_resumen[f'B{row}'] = cantidad
-        row += 1
-
-    ws_resumen[f'A{row}'] = "TOTAL"
-    ws_resumen[f'B{row}'] = len(df)
-    ws_resumen[f'A{row}'].font = Font(bold=True)
-    ws_resumen[f'B{row}'].font = Font(bold=True)
-
-    # Estadisticas de metodo
-    if 'metodo_usado' in df.columns:
-        row += 3
-        ws_resumen[f'A{row}'] = "METODO DE EXTRACCION"
-        ws_resumen[f'A{row}'].font = Font(bold=True, size=12)
-        row += 1
-        metodo_conteo = df['metodo_usado'].value_counts()
-        for metodo, cant in metodo_conteo.items():
-            ws_resumen[f'A{row}'] = metodo
-            ws_resumen[f'B{row}'] = cant
-            row += 1
-
-    ws_resumen['A{}'.format(row + 2)] = f"Generado: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-
-    # Guardar en bytes
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-    return output.getvalue()
-
-
 # ============== INTERFAZ PRINCIPAL ==============
 
 def render():
@@ -955,9 +834,9 @@ def render():
 
         imagenes_subidas = st.file_uploader(
             "Arrastra o selecciona imagenes de comprobantes",
-            type=['jpg', 'jpeg', 'png'],
+            type=['jpg', 'jpeg', 'png', 'zip'],
             accept_multiple_files=True,
-            help="Sube las capturas de pantalla de los comprobantes de transferencia",
+            help="Sube las capturas de pantalla de los comprobantes de transferencia (sueltas o en ZIP)",
             key="upload_imagenes"
         )
 
@@ -967,15 +846,15 @@ def render():
 
             if st.button("💾 Guardar imagenes", key="btn_guardar_imgs", type="primary"):
                 carpeta_imagenes = carpeta_usuario / 'imagenes'
-                guardadas = 0
-                for img_file in imagenes_subidas:
-                    ruta_destino = carpeta_imagenes / img_file.name
-                    with open(ruta_destino, 'wb') as f:
-                        f.write(img_file.getbuffer())
-                    guardadas += 1
-                    print(f"[Guardado] {img_file.name}")
-                st.success(f"✅ {guardadas} imagenes guardadas")
-                st.rerun()
+                resumen_subida = nuevo_resumen()
+                for _ in iterar_subidas(imagenes_subidas, carpeta_imagenes, cargar_cache(), resumen=resumen_subida):
+                    pass
+                st.success(f"✅ {resumen_subida['guardadas'] + resumen_subida['sin_cambios']} imagenes guardadas")
+                if resumen_subida['omitidas']:
+                    # Sin rerun: que el aviso se vea
+                    mostrar_omitidas(resumen_subida)
+                else:
+                    st.rerun()
 
         # Mostrar imagenes existentes
         carpeta_imagenes = carpeta_usuario / 'imagenes'
@@ -1056,18 +935,17 @@ def render():
                 # Preview de la tabla
                 with st.expander("👁️ Vista previa de la tabla", expanded=False):
                     try:
-                        if tabla_actual.suffix == '.csv':
-                            df_preview = pd.read_csv(tabla_actual)
-                        else:
-                            df_preview = pd.read_excel(tabla_actual)
+                        # Misma carga que la verificacion: deja la copia columnar lista
+                        df_preview = cargar_tabla(tabla_actual)
                         st.dataframe(df_preview.head(10), use_container_width=True)
-                        st.caption(f"Mostrando 10 de {len(df_preview)} filas")
+                        st.caption(f"Mostrando 10 de {len(df_preview)} filas (columnas usadas en la verificacion)")
                     except Exception as e:
                         st.error(f"Error leyendo tabla: {e}")
 
                 if st.button("🗑️ Borrar tabla", key="del_tabla"):
                     for t in tablas_existentes:
                         t.unlink()
+                        borrar_copias(t)
                     st.success("Tabla eliminada")
                     st.rerun()
 
@@ -1216,10 +1094,10 @@ def render():
                                     st.write(f"Campos OK: {campos_ok}")
                                     st.write(f"Campos faltantes: {campos_fail}")
                                 elif metodo == "solo_claude":
-                                    client = anthropic.Anthropic(api_key=config['api_key'])
+                                    client = obtener_motor_vision(config['api_key'])
                                     resultado = extraer_datos_con_claude(str(imagen_seleccionada), client)
                                 else:
-                                    client = anthropic.Anthropic(api_key=config['api_key'])
+                                    client = obtener_motor_vision(config['api_key'])
                                     resultado = extraer_datos_inteligente(str(imagen_seleccionada), client, metodo)
                                     if resultado.get('fallback_usado'):
                                         st.warning("⚠️ EasyOCR fallo, se uso Claude Vision como fallback")
@@ -1305,7 +1183,7 @@ def render():
                         with col2:
                             st.markdown("### 💰 Claude Vision")
                             with st.spinner("Analizando..."):
-                                client = anthropic.Anthropic(api_key=config['api_key'])
+                                client = obtener_motor_vision(config['api_key'])
                                 res_claude = extraer_datos_con_claude(str(imagen_comparar), client)
 
                             st.info("De pago pero preciso")
@@ -1425,24 +1303,56 @@ def render():
             with col1:
                 st.metric("Imagenes en cache", len(cache))
             with col2:
-                cache_path = get_cache_path()
-                if cache_path.exists():
-                    size_kb = cache_path.stat().st_size / 1024
-                    st.metric("Tamano cache", f"{size_kb:.1f} KB")
+                size_kb = cache.tamano_bytes() / 1024
+                st.metric("Tamano cache", f"{size_kb:.1f} KB")
             with col3:
                 if st.button("🗑️ Limpiar Cache"):
                     limpiar_cache()
                     st.success("Cache eliminado")
                     st.rerun()
 
+            # Estadisticas por namespace (hits/misses desde que arranco la app)
+            st.caption(
+                f"Limites: {cache.max_entradas} entradas · {cache.max_bytes / 1024 / 1024:.0f} MB · "
+                f"TTL {cache.ttl_dias} dias (expulsion LRU)"
+            )
+            stats = cache.estadisticas()
+            df_stats = pd.DataFrame([
+                {
+                    'Namespace': ns,
+                    'Entradas': s['entradas'],
+                    'KB': round(s['bytes'] / 1024, 1),
+                    'Hits': s['hits'],
+                    'Misses': s['misses'],
+                    'Hit rate': f"{s['hit_rate']:.0%}",
+                    'Expulsadas': s['expulsiones'],
+                }
+                for ns, s in stats.items()
+            ])
+            st.dataframe(df_stats, use_container_width=True, hide_index=True)
+
+            col_ns1, col_ns2, col_ns3 = st.columns(3)
+            with col_ns1:
+                if st.button("🗑️ Limpiar solo OCR"):
+                    cache.limpiar('ocr')
+                    st.rerun()
+            with col_ns2:
+                if st.button("🗑️ Limpiar solo Claude"):
+                    cache.limpiar('claude')
+                    st.rerun()
+            with col_ns3:
+                if st.button("🗑️ Limpiar solo OCR + Claude"):
+                    cache.limpiar('mixto')
+                    st.rerun()
+
             st.markdown("---")
 
             # Ver contenido del cache
             st.subheader("📋 Contenido del Cache")
-            if cache:
+            if len(cache):
                 df_cache = pd.DataFrame([
                     {'hash': k[:8] + '...', **{key: v for key, v in val.items()}}
-                    for k, val in list(cache.items())[:20]
+                    for k, val in cache.items(limite=20)
                 ])
                 st.dataframe(df_cache, use_container_width=True)
                 if len(cache) > 20:
@@ -1490,16 +1400,15 @@ def render():
 
         if total_imagenes == 0:
             st.warning("⚠️ No has subido imagenes de comprobantes.")
-            st.write("Ve a la pestaña **Configuracion** y sube las imagenes de los comprobantes a verificar.")
-            return
+            st.write("Subelas mas abajo con **Subir y verificar** o en la pestaña **Configuracion**.")
+        else:
+            st.info(f"📷 **{total_imagenes} imagenes** encontradas para verificar")
 
         # Actualizar config con rutas actuales
         config['imagenes'] = carpeta_imagenes
         config['tabla'] = tabla_path
         config['reporte'] = carpeta_usuario / 'reportes'
 
-        st.info(f"📷 **{total_imagenes} imagenes** encontradas para verificar")
-
         # Opciones avanzadas
         with st.expander("⚙️ Opciones de procesamiento", expanded=True):
             col1, col2 = st.columns(2)
@@ -1531,31 +1440,131 @@ def render():
                     st.warning("⚠️ Se usara Claude para todas las imagenes")
 
                 # Solo EasyOCR disponible
-                motor_ocr = "easyocr"
+                usar_roi = st.checkbox(
+                    "✂️ OCR por regiones",
+                    value=False,
+                    disabled=metodo == "solo_claude",
+                    help="Lee solo la cabecera (match), el formulario (email) y la barra inferior (cantidad), "
+                         "recortadas y reducidas. Mucho mas rapido; si falta email o match hace OCR completo"
+                )
+                motor_ocr = MOTOR_ROI if usar_roi else "easyocr"
+
+                modo_lote = st.checkbox(
+                    "📦 Modo lote (Message Batches)",
+                    value=False,
+                    disabled=metodo == "solo_ocr",
+                    help="Envia a Claude, en un lote, las imagenes que el OCR no resuelve. Precio de lote "
+                         "(mas barato), tarda hasta 24h y no hace falta mantener la pagina abierta: los "
+                         "resultados se guardan en el cache al terminar"
+                ) and metodo != "solo_ocr"
+
+                agrupar_claude = st.checkbox(
+                    "🧩 Varias imagenes por peticion",
+                    value=False,
+                    disabled=metodo == "solo_ocr" or modo_lote,
+                    help="Junta varias imagenes en una sola peticion a Claude (el prompt se envia una vez). "
+                         "Las que no se lean bien se reintentan de una en una"
+                ) and metodo != "solo_ocr" and not modo_lote
+                imagenes_por_peticion = None
+                if agrupar_claude:
+                    imagenes_por_peticion = st.slider("Imagenes por peticion", 2, 8, 6)
 
             with col2:
                 usar_cache = st.checkbox("💾 Usar cache", value=True, help="Evita re-procesar imagenes ya analizadas")
                 cache = cargar_cache()
-                imagenes_en_cache = sum(1 for img in imagenes if calcular_hash_imagen(str(img)) in cache)
+                # Solo el indice de hashes: sin leer las imagenes nuevas, que la
+                # verificacion lee una vez para el hash y para Claude Vision
+                namespaces_metodo = namespaces_para(metodo)
+                hashes_conocidos = (cache.hash_indexado(img) for img in imagenes)
+                imagenes_en_cache = sum(
+                    1 for imagen_hash in hashes_conocidos
+                    if imagen_hash and cache.contiene(imagen_hash, namespaces_metodo)
+                )
                 if usar_cache and imagenes_en_cache > 0:
                     st.caption(f"📦 {imagenes_en_cache}/{total_imagenes} en cache")
 
                 usar_paralelo = st.checkbox("⚡ Procesamiento paralelo", value=False, help="Mas rapido pero puede saturar")
                 if usar_paralelo:
-                    max_workers = st.slider("Workers", 2, 6, 3)
+                    max_workers = st.slider("Workers", 2, 16, 3)
                 else:
                     max_workers = 1
 
+                # OCR en procesos: cada proceso carga su propio EasyOCR
+                nucleos = os.cpu_count() or 2
+                usar_procesos_ocr = st.checkbox(
+                    "🧠 OCR en procesos",
+                    value=False,
+                    disabled=metodo == "solo_claude",
+                    help="Un EasyOCR por proceso: el OCR escala con los nucleos de CPU (usa mas memoria)"
+                )
+                procesos_ocr = None
+                if usar_procesos_ocr and metodo != "solo_claude":
+                    procesos_ocr = st.slider("Procesos OCR", 2, max(3, nucleos), min(4, max(2, nucleos)))
+                    motor_ocr += SUFIJO_PROCESOS
+                    # Hace falta al menos un hilo por proceso para mantener el pool ocupado
+                    usar_paralelo = True
+                    max_workers = max(max_workers, procesos_ocr)
+
+                # Agrupar necesita varios hilos esperando a Claude a la vez
+                if agrupar_claude:
+                    usar_paralelo = True
+                    max_workers = max(max_workers, imagenes_por_peticion * 2)
+
                 tolerancia_email = st.slider(
                     "📧 Tolerancia email (%)",
                     80, 100, 90,
                     help="Porcentaje minimo de similitud para aceptar emails"
                 ) / 100
 
+        # Ejecuciones interrumpidas contra esta misma tabla e imagenes (se pueden reanudar).
+        # Solo las de los mismos parametros: una ejecucion no mezcla metodos ni tolerancias
+        parametros_actuales = {'metodo': metodo, 'motor_ocr': motor_ocr, 'tolerancia_email': tolerancia_email}
+        interrumpidas = [
+            e for e in listar_ejecuciones(get_ejecuciones_path(), version_tabla(tabla_path))
+            if e['parametros'].get('carpeta_imagenes') == str(carpeta_imagenes)
+        ]
+        interrumpidas, otros_parametros = separar_por_parametros(interrumpidas, parametros_actuales)
+        if otros_parametros:
+            st.caption(
+                f"♻️ {len(otros_parametros)} ejecucion(es) interrumpida(s) con otro metodo, motor OCR o "
+                f"tolerancia: elige los mismos parametros para reanudarlas."
+            )
+        reanudar_ruta = None
+        if interrumpidas:
+            opciones_ejecucion = {"🆕 Nueva ejecucion": None}
+            for e in interrumpidas:
+                etiqueta = f"♻️ Reanudar {e['run_id']} ({e['verificadas']} verificadas, {e['parametros'].get('metodo')})"
+                opciones_ejecucion[etiqueta] = e['ruta']
+            eleccion = st.selectbox(
+                "Ejecucion",
+                list(opciones_ejecucion),
+                help="Reanudar salta las imagenes ya verificadas con esta misma tabla (si la imagen no ha cambiado)"
+            )
+            reanudar_ruta = opciones_ejecucion[eleccion]
+
         # Botones de accion
         col1, col2, col3 = st.columns([1, 2, 1])
         with col2:
-            iniciar = st.button("🚀 Iniciar Verificacion", use_container_width=True, type="primary")
+            iniciar = st.button(
+                "🚀 Iniciar Verificacion", use_container_width=True, type="primary", disabled=total_imagenes == 0
+            )
+
+        # Subida directa: cada imagen se verifica en cuanto se guarda
+        with st.expander("📤 Subir y verificar", expanded=total_imagenes == 0):
+            st.caption(
+                "Imagenes sueltas o ZIP. Se guardan en tu carpeta y se van verificando mientras se "
+                "desempaquetan; las repetidas o ya analizadas salen del cache."
+            )
+            subidas_verificar = st.file_uploader(
+                "Comprobantes a verificar",
+                type=['jpg', 'jpeg', 'png', 'zip'],
+                accept_multiple_files=True,
+                key="upload_verificar"
+            )
+            subir_y_verificar = st.button(
+                "⚡ Subir y verificar", disabled=not subidas_verificar or modo_lote,
+                help="No disponible en modo lote"
+            )
 
         # Boton para limpiar carpetas
         with st.expander("🧹 Limpiar carpetas de resultados"):
@@ -1590,254 +1599,505 @@ def render():
             else:
                 st.info("Las carpetas estan vacias")
 
-        if iniciar:
-            # Contenedores para actualizacion en tiempo real
+        # Lotes de Claude Vision enviados (se consultan en segundo plano)
+        gestor_lotes = get_gestor_lotes(config['api_key']) if config.get('api_key') else None
+        if gestor_lotes and gestor_lotes.lotes():
+            if gestor_lotes.pendientes():
+                iniciar_sondeo(gestor_lotes)
+            with st.expander(f"📦 Lotes de Claude Vision ({len(gestor_lotes.pendientes())} pendientes)"):
+                df_lotes = pd.DataFrame([
+                    {
+                        'Lote': bid,
+                        'Creado': info.get('creado', '')[:16],
+                        'Estado': info.get('estado'),
+                        'Imagenes': info.get('peticiones'),
+                        'En cache': info.get('guardados', ''),
+                        'Fallidas': len(info.get('fallidos', [])),
+                        'Fusionado': '✅' if info.get('fusionado') else ('❌' if info.get('fallido') else '⏳'),
+                        'Error': info.get('ultimo_error', ''),
+                    }
+                    for bid, info in gestor_lotes.lotes().items()
+                ])
+                st.dataframe(df_lotes, use_container_width=True, hide_index=True)
+                st.caption("Las fallidas no se guardan en el cache: la siguiente verificacion las reintenta.")
+                fallidos_lote = [bid for bid, info in gestor_lotes.lotes().items() if info.get('fallido')]
+                if fallidos_lote:
+                    st.warning(f"{len(fallidos_lote)} lote(s) sin respuesta tras {MAX_FALLOS_CONSULTA} consultas: "
+                               "ya no se consultan solos. *Consultar ahora* los reintenta.")
+                col_l1, col_l2 = st.columns(2)
+                with col_l1:
+                    if st.button("🔄 Consultar ahora"):
+                        gestor_lotes.sondear_pendientes(incluir_fallidos=True)
+                        if gestor_lotes.pendientes():
+                            iniciar_sondeo(gestor_lotes)
+                        st.rerun()
+                with col_l2:
+                    if st.button("🧹 Quitar lotes fusionados"):
+                        for bid, info in gestor_lotes.lotes().items():
+                            if info.get('fusionado'):
+                                gestor_lotes.olvidar(bid)
+                        st.rerun()
+
+        if iniciar and modo_lote:
+            # Solo OCR aqui; lo que el OCR no resuelve va al lote
             progress_bar = st.progress(0)
             status_text = st.empty()
-
-            # Metricas en tiempo real
-            col1, col2, col3, col4, col5, col6 = st.columns(6)
-            metric_ok = col1.empty()
-            metric_parcial = col2.empty()
-            metric_no_coincide = col3.empty()
-            metric_no_encontrado = col4.empty()
-            metric_ocr = col5.empty()
-            metric_claude = col6.empty()
-
-            # Log expandible
-            log_container = st.expander("📋 Log de procesamiento", expanded=True)
-            log_text = log_container.empty()
-            log_messages = []
-
-            # Inicializar contadores
-            contadores = {
-                'ok': 0, 'parcial': 0, 'no_coincide': 0, 'no_encontrado': 0,
-                'ocr': 0, 'claude': 0, 'desde_cache': 0
-            }
-
-            def actualizar_metricas():
-                metric_ok.metric("✅ OK", contadores['ok'])
-                metric_parcial.metric("⚠️ Parcial", contadores['parcial'])
-                metric_no_coincide.metric("❌ No coincide", contadores['no_coincide'])
-                metric_no_encontrado.metric("🔍 No encontrado", contadores['no_encontrado'])
-                metric_ocr.metric("🆓 OCR", contadores['ocr'])
-                metric_claude.metric("💰 Claude", contadores['claude'])
-
-            actualizar_metricas()
-
-            # Inicializar cliente Claude (puede ser None si solo usamos OCR)
-            client = None
-            if metodo != "solo_ocr":
-                status_text.text("🔌 Conectando con Claude Vision...")
-                client = anthropic.Anthropic(api_key=config['api_key'])
-
-            # Cargar tabla
-            status_text.text("📊 Cargando tabla de referencia...")
-            tabla = cargar_tabla(str(config['tabla']))
-            datos_tabla = agrupar_por_pedido(tabla)
-
-            # Cargar cache
             cache = cargar_cache()
 
-            # Precarga del modelo OCR si es necesario
-            if metodo != "solo_claude":
-                status_text.text("🔧 Cargando EasyOCR (primera vez puede tardar)...")
+            if metodo == "ocr_fallback":
                 try:
-                    get_easyocr_reader()
+                    if motor_ocr.endswith(SUFIJO_PROCESOS):
+                        status_text.text(f"🔧 Arrancando {procesos_ocr} procesos OCR (cada uno carga EasyOCR)...")
+                        obtener_pool_ocr(procesos_ocr).precargar()
+                    else:
+                        cargar_modelo_ocr(status_text)
                 except Exception as e:
                     st.error(f"Error cargando EasyOCR: {e}")
                     return
 
-            resultados = []
-            imagenes_ordenadas = sorted(imagenes)
-
-            if usar_paralelo and max_workers > 1:
-                # Procesamiento paralelo
-                status_text.text(f"⚡ Procesando {total_imagenes} imagenes en paralelo ({max_workers} workers)...")
-
-                args_list = [
-                    (img, client, cache, usar_cache, datos_tabla, tolerancia_email, metodo, motor_ocr)
-                    for img in imagenes_ordenadas
-                ]
-
-                completados = 0
-                with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                    futures = {executor.submit(procesar_imagen_worker, args): args[0] for args in args_list}
-
-                    for future in as_completed(futures):
-                        resultado = future.result()
-                        resultados.append(resultado)
-                        completados += 1
-
-                        # Actualizar contadores
-                        if resultado['estado'] in ['OK', 'OK (EMAIL SIMILAR)']:
-                            contadores['ok'] += 1
-                        elif resultado['estado'] == 'PARCIAL':
-                            contadores['parcial'] += 1
-                        elif resultado['estado'] == 'NO ENCONTRADO EN TABLA':
-                            contadores['no_encontrado'] += 1
-                        else:
-                            contadores['no_coincide'] += 1
-
-                        # Contadores de metodo
-                        metodo_usado = resultado.get('metodo_usado', '')
-                        if 'OCR' in metodo_usado and 'fallback' not in metodo_usado.lower():
-                            contadores['ocr'] += 1
-                        elif 'Claude' in metodo_usado:
-                            contadores['claude'] += 1
-
-                        # Log
-                        cache_tag = " [CACHE]" if resultado.get('desde_cache') else ""
-                        metodo_tag = f" [{metodo_usado}]" if metodo_usado else ""
-                        emoji = "✅" if resultado['estado'].startswith('OK') else ("⚠️" if resultado['estado'] == 'PARCIAL' else "❌")
-                        log_messages.append(f"{emoji} {resultado['archivo']}{cache_tag}{metodo_tag}")
-
-                        progress_bar.progress(completados / total_imagenes)
-                        status_text.text(f"⚡ Procesando: {completados}/{total_imagenes}")
-                        actualizar_metricas()
-                        log_text.code('\n'.join(log_messages[-20:]))
+            para_lote = []
+            resueltas_ocr = 0
+            for i, imagen in enumerate(sorted(imagenes)):
+                progress_bar.progress((i + 1) / total_imagenes)
+                status_text.text(f"🔍 Preparando lote: {imagen.name} ({i+1}/{total_imagenes})")
+                imagen_hash = calcular_hash_imagen(str(imagen), cache)
+                # Ya resueltas por Claude (o, con fallback, por OCR + Claude parcial)
+                if usar_cache and cache.contiene(imagen_hash, ('claude', 'mixto') if metodo == "ocr_fallback" else ('claude',)):
+                    continue
+                if metodo == "ocr_fallback":
+                    datos_ocr = extraer_con_cache(str(imagen), None, cache, usar_cache, "solo_ocr", motor_ocr)
+                    if ocr_suficiente(datos_ocr):
+                        resueltas_ocr += 1
+                        continue
+                para_lote.append((imagen_hash, imagen))
+
+            if para_lote and gestor_lotes is None:
+                st.error("❌ Falta la API key de Anthropic (pestana Configuracion) para enviar el lote.")
+            elif para_lote:
+                status_text.text(f"📤 Enviando {len(para_lote)} imagenes a Claude (lote)...")
+                ids_lote = gestor_lotes.enviar(para_lote)
+                iniciar_sondeo(gestor_lotes)
+                status_text.text("✅ Lote enviado")
+                st.success(
+                    f"📦 {len(para_lote)} imagenes enviadas en {len(ids_lote)} lote(s) "
+                    f"({resueltas_ocr} resueltas con OCR). Puedes cerrar la pagina: al terminar, los "
+                    f"resultados se guardan en el cache y la siguiente verificacion (con cache) los usa."
+                )
             else:
-                # Procesamiento secuencial
-                for i, imagen in enumerate(imagenes_ordenadas):
-                    progress_bar.progress((i + 1) / total_imagenes)
-                    status_text.text(f"🔄 Procesando: {imagen.name} ({i+1}/{total_imagenes})")
-
-                    args = (imagen, client, cache, usar_cache, datos_tabla, tolerancia_email, metodo, motor_ocr)
-                    resultado = procesar_imagen_worker(args)
-                    resultados.append(resultado)
-
-                    # Actualizar contadores
-                    if resultado['estado'] in ['OK', 'OK (EMAIL SIMILAR)']:
-                        contadores['ok'] += 1
-                    elif resultado['estado'] == 'PARCIAL':
-                        contadores['parcial'] += 1
-                    elif resultado['estado'] == 'NO ENCONTRADO EN TABLA':
-                        contadores['no_encontrado'] += 1
-                    else:
-                        contadores['no_coincide'] += 1
-
-                    # Contadores de metodo
-                    metodo_usado = resultado.get('metodo_usado', '')
-                    if 'OCR' in metodo_usado and 'fallback' not in metodo_usado.lower():
-                        contadores['ocr'] += 1
-                    elif 'Claude' in metodo_usado:
-                        contadores['claude'] += 1
-
-                    # Log
-                    cache_tag = " [CACHE]" if resultado.get('desde_cache') else ""
-                    metodo_tag = f" [{metodo_usado}]" if metodo_usado else ""
-                    emoji = "✅" if resultado['estado'].startswith('OK') else ("⚠️" if resultado['estado'] == 'PARCIAL' else "❌")
-                    log_messages.append(f"{emoji} {resultado['archivo']}{cache_tag}{metodo_tag}")
-
-                    actualizar_metricas()
-                    log_text.code('\n'.join(log_messages[-20:]))
-
-            # Guardar cache actualizado
-            guardar_cache(cache)
-
-            # Ordenar resultados por archivo
-            resultados.sort(key=lambda x: x['archivo'])
-
-            # Guardar reporte CSV
-            status_text.text("💾 Guardando reportes...")
-            df = pd.DataFrame(resultados)
-
-            # Seleccionar columnas para el reporte
-            columnas_reporte = [
-                'archivo', 'estado', 'pedido', 'metodo_usado',
-                'email_imagen', 'email_tabla', 'email_ok', 'email_similar', 'similitud_email',
-                'match_imagen', 'match_tabla', 'match_ok',
-                'cantidad_imagen', 'cantidad_tabla', 'cantidad_ok',
-                'categoria_imagen', 'categoria_tabla', 'categoria_ok',
-                'desde_cache', 'fallback_usado'
-            ]
-            df_reporte = df[[c for c in columnas_reporte if c in df.columns]]
-
-            reporte_path = config['reporte'] / 'reporte_verificacion.csv'
-            df_reporte.to_csv(reporte_path, index=False)
-
-            # Clasificar archivos
-            status_text.text("📂 Clasificando archivos...")
-            carpeta_buenos, carpeta_regular, carpeta_malos = clasificar_archivos(
-                resultados, config['imagenes'], config['reporte']
-            )
+                status_text.text("✅ Nada que enviar")
+                st.info(f"Todas las imagenes estan resueltas ({resueltas_ocr} con OCR, el resto en cache).")
+
+        clave_usuario = get_usuario_email()
+        if (iniciar or subir_y_verificar) and not modo_lote:
+            trabajo_previo = obtener_trabajo(clave_usuario)
+            if trabajo_previo is not None and not trabajo_previo.terminado:
+                st.warning("⏳ Ya hay una verificacion en curso; espera a que termine o detenla.")
+            else:
+                preparar_verificacion(
+                    config, imagenes, total_imagenes, clave_usuario, metodo, motor_ocr, procesos_ocr,
+                    usar_cache, tolerancia_email, usar_paralelo, max_workers,
+                    agrupar_claude, imagenes_por_peticion, reanudar_ruta,
+                    subidas=subidas_verificar if subir_y_verificar else None
+                )
 
-            # Completado
-            progress_bar.progress(1.0)
-            status_text.text("✅ ¡Verificacion completada!")
+        # Verificacion en segundo plano (lanzada ahora o en una visita anterior)
+        trabajo = obtener_trabajo(clave_usuario)
+        if trabajo is not None:
+            mostrar_trabajo(trabajo, clave_usuario)
 
-            st.success("🎉 Proceso completado")
 
-            # Resumen final
-            st.subheader("📊 Resumen Final")
-            col1, col2, col3, col4 = st.columns(4)
-            col1.metric("✅ OK", contadores['ok'])
-            col2.metric("⚠️ Parcial", contadores['parcial'])
-            col3.metric("❌ No coincide", contadores['no_coincide'])
-            col4.metric("🔍 No encontrado", contadores['no_encontrado'])
+# ============== VERIFICACION EN SEGUNDO PLANO ==============
 
-            # Estadisticas de ahorro
-            st.subheader("💰 Ahorro en API")
-            col1, col2, col3 = st.columns(3)
-            col1.metric("🆓 Procesadas con OCR", contadores['ocr'])
-            col2.metric("💰 Procesadas con Claude", contadores['claude'])
+COLUMNAS_REPORTE = [
+    'archivo', 'estado', 'pedido', 'metodo_usado',
+    'email_imagen', 'email_tabla', 'email_ok', 'email_similar', 'similitud_email',
+    'match_imagen', 'match_tabla', 'match_ok',
+    'cantidad_imagen', 'cantidad_tabla', 'cantidad_ok',
+    'categoria_imagen', 'categoria_tabla', 'categoria_ok',
+    'pedido_sugerido', 'similitud_sugerido',
+    'desde_cache', 'fallback_usado', 'campos_claude', 'regiones_ocr'
+]
 
-            if total_imagenes > 0:
-                porcentaje_ahorro = (contadores['ocr'] / total_imagenes) * 100
-                col3.metric("📈 Ahorro estimado", f"{porcentaje_ahorro:.0f}%")
 
-            # Mostrar rutas
-            st.subheader("📁 Archivos clasificados")
-            st.write(f"- **Buenos:** {carpeta_buenos}")
-            st.write(f"- **Regular:** {carpeta_regular}")
-            st.write(f"- **Malos:** {carpeta_malos}")
-            st.write(f"- **Reporte:** {reporte_path}")
+def nuevos_contadores() -> dict:
+    return {
+        'ok': 0, 'parcial': 0, 'no_coincide': 0, 'no_encontrado': 0, 'errores': 0,
+        'ocr': 0, 'claude': 0, 'mixto': 0, 'campos_ocr': 0, 'desde_cache': 0
+    }
 
-            # Mostrar tabla de resultados
-            st.subheader("📋 Detalle de resultados")
 
-            # Filtros
-            col1, col2 = st.columns(2)
-            with col1:
-                filtro_estado = st.selectbox(
-                    "Filtrar por estado:",
-                    ["Todos", "OK", "OK (EMAIL SIMILAR)", "PARCIAL", "NO COINCIDE", "NO ENCONTRADO EN TABLA"]
-                )
-            with col2:
-                filtro_metodo = st.selectbox(
-                    "Filtrar por metodo:",
-                    ["Todos", "OCR", "Claude Vision", "Claude Vision (fallback)"]
-                )
+def linea_log(resultado: dict) -> str:
+    """Linea del log de procesamiento para un resultado"""
+    metodo_usado = resultado.get('metodo_usado', '')
+    cache_tag = " [CACHE]" if resultado.get('desde_cache') else ""
+    metodo_tag = f" [{metodo_usado}]" if metodo_usado else ""
+    emoji = "✅" if resultado['estado'].startswith('OK') else ("⚠️" if resultado['estado'] == 'PARCIAL' else "❌")
+    sugerido_tag = f" → ¿pedido {resultado['pedido_sugerido']}?" if resultado.get('pedido_sugerido') else ""
+    return f"{emoji} {resultado['archivo']}{cache_tag}{metodo_tag}{sugerido_tag}"
 
-            df_mostrar = df_reporte.copy()
-            if filtro_estado != "Todos":
-                df_mostrar = df_mostrar[df_mostrar['estado'] == filtro_estado]
-            if filtro_metodo != "Todos":
-                df_mostrar = df_mostrar[df_mostrar['metodo_usado'].str.contains(filtro_metodo.split()[0], case=False, na=False)]
 
-            st.dataframe(df_mostrar, use_container_width=True)
+def registrar_en_diario(diario, resultado: dict, imagen: Path):
+    """Anade el resultado al diario; sin firma (se repite al reanudar) si fallo o el fichero ya no esta"""
+    firma = None
+    if resultado.get('estado') != 'ERROR':
+        try:
+            firma = firma_imagen(imagen)
+        except OSError:
+            pass
+    diario.registrar(resultado, firma)
 
-            # Botones de descarga
-            st.subheader("📥 Descargar Reportes")
-            col1, col2 = st.columns(2)
 
-            with col1:
-                csv = df_reporte.to_csv(index=False)
-                st.download_button(
-                    label="📥 Descargar CSV",
-                    data=csv,
-                    file_name="reporte_verificacion.csv",
-                    mime="text/csv"
-                )
+def resultado_error_worker(args, error) -> dict:
+    """Resultado de una imagen cuyo worker lanzo una excepcion (p.ej. el fichero ya no existe)"""
+    imagen = args[0]
+    return {
+        'archivo': imagen.name,
+        'pedido': imagen.stem,
+        'estado': 'ERROR',
+        'metodo_usado': '',
+        'desde_cache': False,
+        'error_extraccion': str(error),
+        'pedido_sugerido': '',
+        'similitud_sugerido': 0.0,
+    }
 
-            with col2:
-                excel_data = exportar_excel(df_reporte)
-                st.download_button(
-                    label="📥 Descargar Excel",
-                    data=excel_data,
-                    file_name="reporte_verificacion.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                )
+
+def finalizar_verificacion(resultados: list, cancelado: bool, config: dict, cache, diario,
+                           ejecuciones_path: Path, contadores: dict) -> dict:
+    """
+    Cierre de la verificacion (hilo del trabajo, sin streamlit): reporte CSV,
+    clasificacion y diario (con los contadores en la linea final). Si se
+    detuvo, solo se cierra el diario (queda reanudable).
+    Las rutas del usuario llegan resueltas: en este hilo no hay session_state.
+    """
+    # Las entradas ya estan en disco; volcar el WAL
+    guardar_cache(cache)
+
+    if cancelado:
+        diario.cerrar(completada=False)
+        return None
+
+    # Ordenar resultados por archivo
+    resultados.sort(key=lambda x: x['archivo'])
+
+    # Guardar reporte CSV
+    df = pd.DataFrame(resultados)
+    df_reporte = df[[c for c in COLUMNAS_REPORTE if c in df.columns]]
+    reporte_path = config['reporte'] / 'reporte_verificacion.csv'
+    df_reporte.to_csv(reporte_path, index=False)
+
+    # Clasificar archivos
+    carpeta_buenos, carpeta_regular, carpeta_malos, resumen_clasificacion = clasificar_archivos(
+        resultados, config['imagenes'], config['reporte']
+    )
+
+    # Ejecucion completa: ya no se ofrece para reanudar
+    diario.cerrar(completada=True, contadores=contadores)
+    limpiar_ejecuciones(ejecuciones_path)
+
+    return {
+        'df_reporte': df_reporte,
+        'reporte_path': reporte_path,
+        'carpetas': (carpeta_buenos, carpeta_regular, carpeta_malos),
+        'resumen_clasificacion': resumen_clasificacion,
+    }
+
+
+def preparar_verificacion(config, imagenes, total_imagenes, clave_usuario, metodo, motor_ocr, procesos_ocr,
+                          usar_cache, tolerancia_email, usar_paralelo, max_workers,
+                          agrupar_claude, imagenes_por_peticion, reanudar_ruta, subidas=None):
+    """
+    Carga todo lo necesario y lanza la verificacion como trabajo en segundo plano.
+    Con subidas (ficheros del navegador, imagenes o ZIP) se verifican solo
+    esas imagenes, cada una en cuanto queda guardada en la carpeta.
+    """
+    status_text = st.empty()
+
+    # Inicializar cliente Claude (puede ser None si solo usamos OCR)
+    client = None
+    if metodo != "solo_ocr":
+        status_text.text("🔌 Conectando con Claude Vision...")
+        client = obtener_motor_vision(config['api_key'])
+        if agrupar_claude:
+            client = MotorAgrupado(client, tamano=imagenes_por_peticion)
+
+    # Cargar tabla
+    status_text.text("📊 Cargando tabla de referencia...")
+    tabla = cargar_tabla(str(config['tabla']))
+    datos_tabla = agrupar_por_pedido(tabla)
+    indice_emails = IndiceEmails(datos_tabla)
+
+    # Cargar cache
+    cache = cargar_cache()
+    ejecuciones_path = get_ejecuciones_path()
+
+    # Precarga del modelo OCR si es necesario
+    if metodo != "solo_claude":
+        try:
+            if motor_ocr.endswith(SUFIJO_PROCESOS):
+                status_text.text(f"🔧 Arrancando {procesos_ocr} procesos OCR (cada uno carga EasyOCR)...")
+                obtener_pool_ocr(procesos_ocr).precargar()
+            else:
+                cargar_modelo_ocr(status_text)
+        except Exception as e:
+            status_text.empty()
+            st.error(f"Error cargando EasyOCR: {e}")
+            return
+
+    contadores = nuevos_contadores()
+    resultados = []
+    log_inicial = []
+    imagenes_ordenadas = sorted(imagenes)
+
+    # Diario de la ejecucion: cada resultado se anade en cuanto termina
+    if reanudar_ruta and not subidas:
+        diario = DiarioEjecucion(reanudar_ruta)
+        previas = diario.verificadas(config['imagenes'], imagenes_ordenadas)
+        for resultado in previas.values():
+            resultados.append(resultado)
+            contar_resultado(contadores, resultado)
+        imagenes_ordenadas = [img for img in imagenes_ordenadas if img.name not in previas]
+        log_inicial.append(f"♻️ Reanudando {diario.run_id}: {len(previas)} imagenes ya verificadas")
+    else:
+        diario = DiarioEjecucion.crear(ejecuciones_path, version_tabla(config['tabla']), {
+            'metodo': metodo,
+            'motor_ocr': motor_ocr,
+            'tolerancia_email': tolerancia_email,
+            'carpeta_imagenes': str(config['imagenes']),
+            'origen': 'subida' if subidas else 'carpeta',
+        })
+
+    resumen_subida = None
+    if subidas:
+        # Las imagenes llegan segun se guardan: total desconocido hasta acabar
+        resumen_subida = nuevo_resumen()
+        imagenes_ordenadas = iterar_subidas(
+            subidas, config['imagenes'], cache, namespaces_para(metodo), resumen_subida
+        )
+        total_imagenes = None
+        log_inicial.append(f"📤 Subida de {len(subidas)} archivos")
+
+    tareas = (
+        (img, client, cache, usar_cache, datos_tabla, tolerancia_email, metodo, motor_ocr, indice_emails)
+        for img in imagenes_ordenadas
+    )
+    trabajo = TrabajoVerificacion(
+        tareas, procesar_imagen_worker, total_imagenes,
+        max_workers=max_workers if usar_paralelo else 1,
+        contadores=contadores,
+        contar=contar_resultado,
+        linea_log=linea_log,
+        registrar=lambda resultado, args: registrar_en_diario(diario, resultado, args[0]),
+        resultado_error=resultado_error_worker,
+        finalizar=lambda resultados, cancelado: finalizar_verificacion(
+            resultados, cancelado, config, cache, diario, ejecuciones_path, contadores
+        ),
+        resultados=resultados,
+        log=log_inicial,
+        contexto={'run_id': diario.run_id, 'client': client, 'subida': resumen_subida},
+    )
+    status_text.empty()
+    if not iniciar_trabajo(clave_usuario, trabajo):
+        st.warning("⏳ Ya hay una verificacion en curso.")
+
+
+def mostrar_omitidas(resumen_subida: dict):
+    """Aviso de las imagenes de la subida que no se guardaron por repetir nombre con otro contenido"""
+    omitidas = resumen_subida.get('omitidas') or []
+    if omitidas:
+        st.warning(
+            f"⚠️ {len(omitidas)} imagenes no se guardaron: repiten el nombre de otra con distinto "
+            "contenido (en los ZIP solo cuenta el nombre del fichero, no la carpeta). "
+            "Renombralas y vuelve a subirlas: " + ', '.join(omitidas[:20])
+            + (f" y {len(omitidas) - 20} mas" if len(omitidas) > 20 else "")
+        )
+
+
+def mostrar_metricas(contenedores: list, contadores: dict):
+    ok, parcial, no_coincide, no_encontrado, errores, ocr, claude = contenedores
+    ok.metric("✅ OK", contadores['ok'])
+    parcial.metric("⚠️ Parcial", contadores['parcial'])
+    no_coincide.metric("❌ No coincide", contadores['no_coincide'])
+    no_encontrado.metric("🔍 No encontrado", contadores['no_encontrado'])
+    errores.metric("💥 Errores", contadores['errores'])
+    ocr.metric("🆓 OCR", contadores['ocr'])
+    claude.metric("💰 Claude", contadores['claude'] + contadores['mixto'])
+
+
+def mostrar_trabajo(trabajo: TrabajoVerificacion, clave_usuario: str):
+    """
+    Sigue el trabajo refrescando la interfaz cada INTERVALO_UI segundos
+    (no por cada imagen) y al terminar muestra el resumen.
+    """
+    st.caption(f"🧾 Ejecucion {trabajo.contexto.get('run_id')}")
+    resumen_subida = trabajo.contexto.get('subida')
+
+    if not trabajo.terminado:
+        if st.button("⏹️ Detener verificacion", key="detener_verificacion"):
+            trabajo.cancelar()
+            st.info("Deteniendo: las imagenes en curso terminan y la ejecucion queda para reanudar.")
+
+    # Contenedores para actualizacion en tiempo real
+    progress_bar = st.progress(0)
+    status_text = st.empty()
+    contenedores = [col.empty() for col in st.columns(7)]
+    log_container = st.expander("📋 Log de procesamiento", expanded=not trabajo.terminado)
+    log_text = log_container.empty()
+
+    while True:
+        progreso = trabajo.progreso()
+        total = max(progreso['total'], 1)
+        progress_bar.progress(min(progreso['completados'] / total, 1.0))
+        if progreso['fase'] == 'finalizando':
+            status_text.text("💾 Guardando reporte y clasificando archivos...")
+        elif progreso['recibiendo']:
+            status_text.text(
+                f"📥 Recibiendo y procesando: {progreso['completados']}/{progreso['total']} "
+                f"({progreso['por_segundo']:.1f} img/s)"
+            )
+        elif not progreso['terminado']:
+            status_text.text(
+                f"⚡ Procesando: {progreso['completados']}/{progreso['total']} "
+                f"({progreso['por_segundo']:.1f} img/s)"
+            )
+        mostrar_metricas(contenedores, progreso['contadores'])
+        log_text.code('\n'.join(progreso['log']))
+        if progreso['terminado']:
+            break
+        time.sleep(INTERVALO_UI)
+
+    if progreso['error']:
+        status_text.text("❌ Verificacion interrumpida")
+        st.error(f"Error en la verificacion: {progreso['error']}. Puedes reanudarla desde el selector de ejecucion.")
+    elif progreso['cancelado']:
+        status_text.text("⏹️ Verificacion detenida")
+        st.warning(
+            f"Se verificaron {progreso['completados']} de {progreso['total']} imagenes. "
+            "Puedes reanudarla desde el selector de ejecucion."
+        )
+    else:
+        progress_bar.progress(1.0)
+        status_text.text(f"✅ ¡Verificacion completada! ({progreso['segundos']:.0f} s)")
+        mostrar_resumen(trabajo, progreso['contadores'])
+
+    if resumen_subida is not None:
+        st.caption(
+            "📤 Subida: {recibidas} imagenes recibidas · {guardadas} guardadas · {sin_cambios} ya estaban · "
+            "{duplicadas} repetidas · {en_cache} ya en cache · {errores} errores".format(**resumen_subida)
+        )
+        mostrar_omitidas(resumen_subida)
+
+    if st.button("🧹 Ocultar resultados", key="ocultar_verificacion"):
+        quitar_trabajo(clave_usuario)
+        st.rerun()
+
+
+def mostrar_resumen(trabajo: TrabajoVerificacion, contadores: dict):
+    """Resumen final, detalle filtrable y descargas de una verificacion completada"""
+    salida = trabajo.salida
+    df_reporte = salida['df_reporte']
+    carpeta_buenos, carpeta_regular, carpeta_malos = salida['carpetas']
+    total_imagenes = trabajo.total
+    client = trabajo.contexto.get('client')
+
+    st.success("🎉 Proceso completado")
+
+    # Resumen final
+    st.subheader("📊 Resumen Final")
+    col1, col2, col3, col4, col5 = st.columns(5)
+    col1.metric("✅ OK", contadores['ok'])
+    col2.metric("⚠️ Parcial", contadores['parcial'])
+    col3.metric("❌ No coincide", contadores['no_coincide'])
+    col4.metric("🔍 No encontrado", contadores['no_encontrado'])
+    col5.metric("💥 Errores", contadores['errores'])
+
+    # Pedidos sugeridos por email (nombre de fichero probablemente erroneo)
+    sugeridos = [r for r in trabajo.resultados if r.get('pedido_sugerido')]
+    if sugeridos:
+        with st.expander(f"🔀 {len(sugeridos)} comprobantes parecen de otro pedido", expanded=False):
+            st.caption("El email leido coincide con el de otro pedido de la tabla")
+            st.dataframe(pd.DataFrame(sugeridos)[
+                ['archivo', 'pedido', 'pedido_sugerido', 'similitud_sugerido', 'email_imagen', 'estado']
+            ], use_container_width=True)
+
+    # Estadisticas de ahorro
+    st.subheader("💰 Ahorro en API")
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("🆓 Procesadas con OCR", contadores['ocr'])
+    col2.metric("🧩 OCR + Claude parcial", contadores['mixto'])
+    col3.metric("💰 Procesadas con Claude", contadores['claude'])
+
+    if total_imagenes > 0:
+        # Proporcion de campos leidos por OCR (el fallback parcial ahorra parte de la imagen)
+        porcentaje_ahorro = contadores['campos_ocr'] / (total_imagenes * len(CAMPOS_COMPROBANTE)) * 100
+        col4.metric("📈 Ahorro estimado", f"{porcentaje_ahorro:.0f}%")
+
+    # Estadisticas del motor de Claude Vision (acumuladas del proceso)
+    if client is not None:
+        st.caption(
+            "Claude Vision: {peticiones} peticiones · {reintentos} reintentos · "
+            "{rate_limit} respuestas 429 · {errores} fallidas · "
+            "{imagenes_agrupadas} imagenes en {grupos} peticiones agrupadas · "
+            "{parciales} peticiones parciales".format(**client.stats)
+        )
+
+    # Mostrar rutas
+    st.subheader("📁 Archivos clasificados")
+    st.write(f"- **Buenos:** {carpeta_buenos}")
+    st.write(f"- **Regular:** {carpeta_regular}")
+    st.write(f"- **Malos:** {carpeta_malos}")
+    st.write(f"- **Reporte:** {salida['reporte_path']}")
+    st.caption(
+        "{sin_cambios} sin cambios · {hardlink} hardlinks · {reflink} reflinks · "
+        "{copia} copias · {eliminados} eliminados · {errores} errores".format(**salida['resumen_clasificacion'])
+    )
+
+    # Mostrar tabla de resultados
+    st.subheader("📋 Detalle de resultados")
+
+    # Filtros
+    col1, col2 = st.columns(2)
+    with col1:
+        filtro_estado = st.selectbox(
+            "Filtrar por estado:",
+            ["Todos", "OK", "OK (EMAIL SIMILAR)", "PARCIAL", "NO COINCIDE", "NO ENCONTRADO EN TABLA", "ERROR"]
+        )
+    with col2:
+        filtro_metodo = st.selectbox(
+            "Filtrar por metodo:",
+            ["Todos", "OCR", "Claude Vision", "Claude Vision (fallback)"]
+        )
+
+    df_mostrar = df_reporte.copy()
+    if filtro_estado != "Todos":
+        df_mostrar = df_mostrar[df_mostrar['estado'] == filtro_estado]
+    if filtro_metodo != "Todos":
+        df_mostrar = df_mostrar[df_mostrar['metodo_usado'].str.contains(filtro_metodo.split()[0], case=False, na=False)]
+
+    st.dataframe(df_mostrar, use_container_width=True)
+
+    # Botones de descarga
+    st.subheader("📥 Descargar Reportes")
+    col1, col2 = st.columns(2)
+
+    with col1:
+        csv = df_reporte.to_csv(index=False)
+        st.download_button(
+            label="📥 Descargar CSV",
+            data=csv,
+            file_name="reporte_verificacion.csv",
+            mime="text/csv"
+        )
+
+    with col2:
+        # Bytes ya generados (data como funcion solo existe en Streamlit reciente):
+        # el cache por contenido evita regenerarlo en cada rerun si el reporte no cambio
+        st.download_button(
+            label="📥 Descargar Excel",
+            data=excel_de_resultados(df_reporte),
+            file_name="reporte_verificacion.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        )
 
 
 # Para ejecutar directamente (debug):
@@ -0,0 +1,135 @@
+"""
+Subida directa de comprobantes desde el navegador (imagenes sueltas o ZIP).
+
+- Los ZIP se desempaquetan miembro a miembro (copia por bloques desde
+  zipfile), sin extraer el archivo entero antes de empezar.
+- Cada imagen se escribe en la carpeta del usuario calculando en la misma
+  pasada su hash (BLAKE2b, el del cache) y se registra en el indice del
+  cache: la verificacion no vuelve a leerla para el hash.
+- Duplicados: los ZIP se aplanan (el nombre es el pedido), asi que
+  a/1.png y b/1.png caen en el mismo fichero. Un nombre repetido con el
+  mismo contenido se cuenta como repetido; con otro contenido no se
+  sobreescribe el primero y queda en resumen['omitidas'] (ruta dentro de
+  la subida) para avisar. Si en la carpeta ya hay un fichero con el mismo
+  contenido no se reescribe. Las imagenes cuyo contenido ya esta en el cache se cuentan
+  aparte: su verificacion sale del cache sin OCR ni Claude.
+- iterar_subidas es un generador: el trabajo de verificacion recibe cada
+  imagen en cuanto esta en disco, asi desempaquetar y procesar se solapan.
+
+Sin dependencia de streamlit.
+"""
+
+import hashlib
+import zipfile
+from pathlib import Path
+
+from modules.comprobantes_cache import HASH_DIGEST_SIZE
+
+EXTENSIONES_IMAGEN = ('.jpg', '.jpeg', '.png')
+BLOQUE = 1024 * 1024
+
+
+def nuevo_resumen() -> dict:
+    return {'recibidas': 0, 'guardadas': 0, 'sin_cambios': 0, 'duplicadas': 0, 'en_cache': 0, 'errores': 0,
+            'conflictos': 0, 'omitidas': []}
+
+
+def es_imagen(nombre: str) -> bool:
+    return nombre.lower().endswith(EXTENSIONES_IMAGEN)
+
+
+def _entradas(archivos):
+    """(nombre, ruta en la subida, fichero abierto) de cada imagen, suelta o dentro de un ZIP"""
+    for archivo in archivos:
+        nombre = Path(getattr(archivo, 'name', str(archivo))).name
+        if nombre.lower().endswith('.zip'):
+            try:
+                with zipfile.ZipFile(archivo) as zf:
+                    for info in zf.infolist():
+                        # Sin rutas del ZIP (ni '..'): solo el nombre del fichero
+                        nombre_imagen = Path(info.filename.replace('\\', '/')).name
+                        if (info.is_dir() or '__MACOSX' in info.filename
+                                or nombre_imagen.startswith('.') or not es_imagen(nombre_imagen)):
+                            continue
+                        with zf.open(info) as f:
+                            yield nombre_imagen, f"{nombre}/{info.filename}", f
+            except zipfile.BadZipFile as e:
+                print(f"[Subida] ZIP no valido {nombre}: {e}")
+                yield nombre, nombre, None
+        elif es_imagen(nombre):
+            archivo.seek(0)
+            yield nombre, nombre, archivo
+
+
+def hash_flujo(origen) -> str:
+    """Hash (el del cache) de un fichero abierto, leido por bloques sin escribirlo"""
+    h = hashlib.blake2b(digest_size=HASH_DIGEST_SIZE)
+    for bloque in iter(lambda: origen.read(BLOQUE), b''):
+        h.update(bloque)
+    return h.hexdigest()
+
+
+def guardar_imagen(origen, destino: Path, cache) -> tuple:
+    """
+    Copia por bloques origen -> destino calculando el hash.
+    Retorna (hash, escrita); no reescribe un destino con el mismo contenido.
+    """
+    tmp = destino.with_name(f".{destino.name}.subida")
+    h = hashlib.blake2b(digest_size=HASH_DIGEST_SIZE)
+    try:
+        with open(tmp, 'wb') as f:
+            for bloque in iter(lambda: origen.read(BLOQUE), b''):
+                h.update(bloque)
+                f.write(bloque)
+        imagen_hash = h.hexdigest()
+        if destino.exists() and cache.hash_archivo(destino)[0] == imagen_hash:
+            tmp.unlink()
+            return imagen_hash, False
+        tmp.replace(destino)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    cache.indexar_hash(destino, imagen_hash)
+    return imagen_hash, True
+
+
+def iterar_subidas(archivos, carpeta, cache, namespaces: tuple = None, resumen: dict = None):
+    """
+    Guarda las imagenes subidas en carpeta y va devolviendo la ruta de cada
+    una en cuanto esta escrita. resumen (nuevo_resumen()) se actualiza sobre la marcha.
+    """
+    carpeta = Path(carpeta)
+    carpeta.mkdir(parents=True, exist_ok=True)
+    if resumen is None:
+        resumen = nuevo_resumen()
+    # nombre en minusculas -> hash del primero guardado con ese nombre
+    vistos = {}
+
+    for nombre, ruta_subida, origen in _entradas(archivos):
+        if origen is None:
+            resumen['errores'] += 1
+            continue
+        resumen['recibidas'] += 1
+        try:
+            previo = vistos.get(nombre.lower())
+            if previo is not None:
+                if hash_flujo(origen) == previo:
+                    resumen['duplicadas'] += 1
+                else:
+                    resumen['conflictos'] += 1
+                    resumen['omitidas'].append(ruta_subida)
+                    print(f"[Subida] Omitida {ruta_subida}: ya hay otro {nombre} con distinto contenido")
+                continue
+
+            destino = carpeta / nombre
+            imagen_hash, escrita = guardar_imagen(origen, destino, cache)
+        except (OSError, zipfile.BadZipFile) as e:
+            print(f"[Subida] Error guardando {nombre}: {e}")
+            resumen['errores'] += 1
+            continue
+        vistos[nombre.lower()] = imagen_hash
+        resumen['guardadas' if escrita else 'sin_cambios'] += 1
+        if namespaces and cache.contiene(imagen_hash, namespaces):
+            resumen['en_cache'] += 1
+        print(f"[Subida] {nombre}")
+        yield destino
@@ -0,0 +1,213 @@
+"""
+Carga de la tabla de referencia (ventas) de Mundial Comprobantes.
+
+- CSV: codificacion y separador se detectan sobre una muestra del inicio
+  del fichero (una sola lectura completa en lugar de probar combinaciones).
+- Solo se leen las columnas que usa la verificacion (COLUMNAS_TABLA).
+- Copia columnar junto a la tabla (fichero oculto .<nombre>.<clave>.feather,
+  o .pkl si pyarrow no esta disponible) con clave mtime + tamano: mientras
+  la tabla no cambie se carga de ahi. Ademas se recuerda en memoria la
+  ultima version de cada tabla.
+- version_tabla: hash del contenido, identifica la tabla contra la que se
+  verifico una ejecucion (reanudacion).
+
+Sin dependencia de streamlit.
+"""
+
+import codecs
+import csv
+import hashlib
+import threading
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+
+COLUMNAS_TABLA = ('PEDIDO VENTA', 'match', 'email_envio', 'Team A', 'Team B', 'Category')
+COLUMNAS_REQUERIDAS = ('PEDIDO VENTA', 'match', 'email_envio')
+
+MUESTRA_BYTES = 64 * 1024
+CODIFICACIONES = ('utf-8-sig', 'cp1252', 'latin-1')
+SEPARADORES = ',;\t|'
+
+# Cambiar si cambia lo que se guarda en la copia (invalida las anteriores)
+VERSION_COPIA = 1
+
+try:
+    import pyarrow  # noqa: F401
+    FORMATO_COPIA = 'feather'
+except ImportError:
+    FORMATO_COPIA = 'pkl'
+
+_memoria = {}
+_versiones = {}
+_memoria_lock = threading.Lock()
+
+
+# ============== DETECCION CSV ==============
+
+def detectar_codificacion(muestra: bytes) -> str:
+    """Primera codificacion que decodifica la muestra (un caracter cortado al final no cuenta)"""
+    for codificacion in CODIFICACIONES:
+        try:
+            codecs.getincrementaldecoder(codificacion)().decode(muestra, final=False)
+            return codificacion
+        except UnicodeDecodeError:
+            continue
+    return 'latin-1'
+
+
+def detectar_separador(texto: str) -> str:
+    """Separador por csv.Sniffer; si no decide, el mas frecuente en la cabecera"""
+    lineas = texto.splitlines()
+    if len(lineas) > 1 and not texto.endswith(('\n', '\r')):
+        # Ultima linea probablemente cortada por la muestra
+        lineas = lineas[:-1]
+    try:
+        return csv.Sniffer().sniff('\n'.join(lineas[:50]), delimiters=SEPARADORES).delimiter
+    except csv.Error:
+        cabecera = lineas[0] if lineas else ''
+        return max(SEPARADORES, key=cabecera.count)
+
+
+def detectar_formato_csv(ruta: Path, muestra_bytes: int = MUESTRA_BYTES) -> tuple:
+    """(codificacion, separador) a partir de los primeros muestra_bytes del fichero"""
+    with open(ruta, 'rb') as f:
+        muestra = f.read(muestra_bytes)
+    codificacion = detectar_codificacion(muestra)
+    texto = codecs.getincrementaldecoder(codificacion)(errors='replace').decode(muestra, final=False)
+    return codificacion, detectar_separador(texto)
+
+
+# ============== LECTURA ==============
+
+def _usecols(columnas_fichero, columnas: tuple):
+    """Columnas a leer; si faltan requeridas se leen todas (el error lista las disponibles)"""
+    if all(c in columnas_fichero for c in COLUMNAS_REQUERIDAS):
+        return [c for c in columnas_fichero if c in columnas]
+    return None
+
+
+def leer_tabla(ruta, columnas: tuple = COLUMNAS_TABLA) -> pd.DataFrame:
+    """Lee la tabla del disco (sin copia columnar)"""
+    ruta = Path(ruta)
+    extension = ruta.suffix.lower()
+    if extension == '.csv':
+        codificacion, separador = detectar_formato_csv(ruta)
+        opciones = {'encoding': codificacion, 'sep': separador, 'encoding_errors': 'replace'}
+        cabecera = pd.read_csv(ruta, nrows=0, **opciones).columns
+        df = pd.read_csv(ruta, usecols=_usecols(cabecera, columnas), **opciones)
+        print(f"[CSV] Cargado con sep='{separador}', encoding={codificacion}")
+        return df
+    elif extension in ['.xlsx', '.xls']:
+        cabecera = pd.read_excel(ruta, nrows=0).columns
+        return pd.read_excel(ruta, usecols=_usecols(cabecera, columnas))
+    else:
+        raise ValueError(f"Formato no soportado: {ruta.suffix}")
+
+
+# ============== COPIA COLUMNAR ==============
+
+def _prefijo_copia(ruta: Path) -> str:
+    return f".{ruta.name}.copia"
+
+
+def ruta_copia(ruta: Path, formato: str = FORMATO_COPIA) -> Path:
+    """Fichero oculto junto a la tabla; la clave cambia si cambia la tabla"""
+    stat = ruta.stat()
+    return ruta.with_name(f"{_prefijo_copia(ruta)}.v{VERSION_COPIA}-{stat.st_mtime_ns}-{stat.st_size}.{formato}")
+
+
+def borrar_copias(ruta, excepto: Path = None):
+    """Elimina las copias columnares de una tabla (todas o las que no son `excepto`)"""
+    ruta = Path(ruta)
+    for copia in ruta.parent.glob(f"{_prefijo_copia(ruta)}.*"):
+        if copia != excepto:
+            copia.unlink(missing_ok=True)
+    with _memoria_lock:
+        if excepto is None:
+            _memoria.pop(str(ruta), None)
+
+
+def _leer_copia(copia: Path) -> pd.DataFrame:
+    if copia.suffix == '.feather':
+        return pd.read_feather(copia)
+    return pd.read_pickle(copia)
+
+
+def _escribir_copia(df: pd.DataFrame, ruta: Path) -> Optional[Path]:
+    """Escribe la copia (feather; pickle si pyarrow no admite las columnas). None si no se pudo"""
+    copia = ruta_copia(ruta)
+    tmp = copia.with_name(copia.name + '.tmp')
+    try:
+        if copia.suffix == '.feather':
+            try:
+                df.reset_index(drop=True).to_feather(tmp)
+            except Exception:
+                # Columnas con tipos mezclados (p.ej. pedidos numericos y texto)
+                copia = ruta_copia(ruta, 'pkl')
+                tmp = copia.with_name(copia.name + '.tmp')
+                df.to_pickle(tmp)
+        else:
+            df.to_pickle(tmp)
+        tmp.replace(copia)
+    except OSError as e:
+        # Carpeta de solo lectura: se sigue sin copia
+        print(f"[Tabla] No se pudo guardar la copia de {ruta.name}: {e}")
+        tmp.unlink(missing_ok=True)
+        return None
+    borrar_copias(ruta, excepto=copia)
+    return copia
+
+
+def cargar_tabla(ruta) -> pd.DataFrame:
+    """
+    Carga la tabla de referencia (columnas COLUMNAS_TABLA).
+    Orden: memoria -> copia columnar -> lectura del CSV/Excel (y se guarda la copia).
+    Cada llamada recibe su propia copia: la version en memoria la comparten
+    todas las sesiones y no se puede modificar.
+    """
+    ruta = Path(ruta)
+    stat = ruta.stat()
+    clave = (stat.st_mtime_ns, stat.st_size)
+
+    with _memoria_lock:
+        guardada = _memoria.get(str(ruta))
+    if guardada is not None and guardada[0] == clave:
+        return guardada[1].copy()
+
+    df = None
+    for formato in ('feather', 'pkl'):
+        copia = ruta_copia(ruta, formato)
+        if copia.exists():
+            try:
+                df = _leer_copia(copia)
+                break
+            except Exception as e:
+                print(f"[Tabla] Copia {copia.name} ilegible, se relee la tabla: {e}")
+                copia.unlink(missing_ok=True)
+
+    if df is None:
+        df = leer_tabla(ruta)
+        _escribir_copia(df, ruta)
+
+    with _memoria_lock:
+        _memoria[str(ruta)] = (clave, df)
+    return df.copy()
+
+
+def version_tabla(ruta) -> str:
+    """Hash (BLAKE2b, 16 hex) del contenido de la tabla; se recalcula solo si cambia mtime/tamano"""
+    ruta = Path(ruta)
+    stat = ruta.stat()
+    clave = (str(ruta), stat.st_mtime_ns, stat.st_size)
+    with _memoria_lock:
+        if clave in _versiones:
+            return _versiones[clave]
+    h = hashlib.blake2b(digest_size=8)
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(bloque)
+    with _memoria_lock:
+        _versiones[clave] = h.hexdigest()
+    return _versiones[clave]
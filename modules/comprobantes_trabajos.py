@@ -0,0 +1,240 @@
+"""
+Verificacion de comprobantes como trabajo en segundo plano.
+
+El procesamiento (pool de hilos, diario, contadores, reporte final) corre en
+un hilo propio y no espera a la interfaz. La pagina de Streamlit solo lee
+instantaneas agregadas con progreso() a ritmo fijo (INTERVALO_UI), asi que
+el rendimiento de los workers no depende de los viajes por el websocket.
+
+Hay un trabajo por usuario (registro a nivel de modulo): si el navegador se
+desconecta el trabajo sigue y al volver a la pagina se vuelve a mostrar.
+
+Las tareas pueden ser una lista o un generador (p.ej. una subida que se va
+desempaquetando): un hilo de entrada las va enviando al pool en cuanto
+llegan, y con total=None el total crece con ellas.
+
+Sin dependencia de streamlit: la logica de cada imagen y del cierre llega
+como funciones (procesar, contar, linea_log, registrar, finalizar).
+"""
+
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Segundos entre refrescos de la interfaz
+INTERVALO_UI = float(os.getenv('COMPROBANTES_UI_INTERVALO', '0.5'))
+LINEAS_LOG = 20
+
+
+class TrabajoVerificacion:
+    """
+    tareas: argumentos de procesar() (uno por imagen); lista o generador
+    total: imagenes de la ejecucion; None si las tareas llegan sin saber cuantas
+    contar(contadores, resultado): actualiza los contadores agregados
+    linea_log(resultado) -> str: linea del log
+    registrar(resultado, args): persistencia por imagen (diario)
+    finalizar(resultados, cancelado) -> salida: cierre (reporte, clasificacion)
+    resultado_error(args, error) -> dict: resultado de una imagen cuyo procesar() fallo
+    resultados / log: estado previo (reanudacion)
+    contexto: datos para la interfaz (run_id, motor...)
+    """
+
+    def __init__(self, tareas, procesar, total: int = None, max_workers: int = 1,
+                 contadores: dict = None, contar=None, linea_log=None, registrar=None,
+                 finalizar=None, resultado_error=None, resultados: list = None, log: list = None,
+                 contexto: dict = None):
+        self.tareas = tareas
+        self.procesar = procesar
+        self.max_workers = max(1, max_workers)
+        self.contadores = contadores if contadores is not None else {}
+        self.contar = contar
+        self.linea_log = linea_log
+        self.registrar = registrar
+        self.finalizar = finalizar
+        self.resultado_error = resultado_error
+        self.resultados = list(resultados or [])
+        self.contexto = contexto or {}
+
+        self.salida = None
+        self.error = None
+        self.fase = 'pendiente'
+        self._completados = len(self.resultados)
+        self._previos = self._completados
+        # Total desconocido: crece con cada tarea recibida
+        self._creciente = total is None
+        self.total = self._previos if total is None else total
+        self._recibiendo = False
+        self._log = deque(log or [], maxlen=LINEAS_LOG)
+        self._lock = threading.Lock()
+        self._cancelar = threading.Event()
+        self._hilo = None
+        self._inicio = None
+        self._fin = None
+
+    # ---- control ----
+
+    def iniciar(self):
+        self._inicio = time.monotonic()
+        self.fase = 'procesando'
+        self._hilo = threading.Thread(target=self._ejecutar, name='verificacion', daemon=True)
+        self._hilo.start()
+
+    def cancelar(self):
+        """Deja de lanzar imagenes nuevas; las que estan en curso terminan"""
+        self._cancelar.set()
+
+    @property
+    def cancelado(self) -> bool:
+        return self._cancelar.is_set()
+
+    @property
+    def terminado(self) -> bool:
+        return self._fin is not None
+
+    def esperar(self, timeout: float = None) -> bool:
+        if self._hilo is not None:
+            self._hilo.join(timeout)
+        return self.terminado
+
+    # ---- estado para la interfaz ----
+
+    def progreso(self) -> dict:
+        """Instantanea agregada (copia): la interfaz nunca toca el estado vivo"""
+        with self._lock:
+            transcurrido = ((self._fin or time.monotonic()) - self._inicio) if self._inicio else 0.0
+            procesadas = self._completados - self._previos
+            return {
+                'fase': self.fase,
+                'completados': self._completados,
+                'total': self.total,
+                'recibiendo': self._recibiendo,
+                'contadores': dict(self.contadores),
+                'log': list(self._log),
+                'terminado': self.terminado,
+                'cancelado': self.cancelado,
+                'error': self.error,
+                'segundos': transcurrido,
+                'por_segundo': procesadas / transcurrido if transcurrido > 0 else 0.0,
+            }
+
+    # ---- hilo del trabajo ----
+
+    def _anotar(self, resultado: dict, args):
+        if self.registrar is not None:
+            self.registrar(resultado, args)
+        linea = self.linea_log(resultado) if self.linea_log is not None else None
+        with self._lock:
+            self.resultados.append(resultado)
+            self._completados += 1
+            if self.contar is not None:
+                self.contar(self.contadores, resultado)
+            if linea:
+                self._log.append(linea)
+
+    def _recibir(self, executor, entrada: queue.Queue):
+        """Hilo de entrada: envia cada tarea al pool en cuanto la fuente la entrega"""
+        try:
+            for args in self.tareas:
+                if self.cancelado:
+                    break
+                if self._creciente:
+                    with self._lock:
+                        self.total += 1
+                entrada.put((executor.submit(self.procesar, args), args))
+        except Exception as e:
+            entrada.put(e)
+        finally:
+            self._recibiendo = False
+            entrada.put(None)
+
+    def _ejecutar(self):
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                entrada = queue.Queue()
+                self._recibiendo = True
+                threading.Thread(
+                    target=self._recibir, args=(executor, entrada), name='verificacion-entrada', daemon=True
+                ).start()
+
+                pendientes = {}
+                abierta = True
+                while abierta or pendientes:
+                    # Tareas enviadas por el hilo de entrada (sin bloquear si hay trabajo en curso)
+                    while abierta:
+                        try:
+                            recibido = entrada.get(block=not pendientes)
+                        except queue.Empty:
+                            break
+                        if recibido is None:
+                            abierta = False
+                        elif isinstance(recibido, Exception):
+                            for pendiente in pendientes:
+                                pendiente.cancel()
+                            raise recibido
+                        else:
+                            pendientes[recibido[0]] = recibido[1]
+
+                    if self.cancelado:
+                        for pendiente in pendientes:
+                            pendiente.cancel()
+                    if not pendientes:
+                        continue
+
+                    hechos, _ = wait(pendientes, timeout=0.1 if abierta else None, return_when=FIRST_COMPLETED)
+                    for futuro in hechos:
+                        args = pendientes.pop(futuro)
+                        if futuro.cancelled():
+                            continue
+                        try:
+                            resultado = futuro.result()
+                        except Exception as e:
+                            # Una imagen que falla no para el trabajo: queda como resultado con error
+                            print(f"[Trabajo] Error procesando {args[0] if isinstance(args, tuple) else args}: {e}")
+                            resultado = (self.resultado_error(args, e) if self.resultado_error is not None
+                                         else {'error': str(e)})
+                        self._anotar(resultado, args)
+
+            self.fase = 'finalizando'
+            if self.finalizar is not None:
+                self.salida = self.finalizar(self.resultados, self.cancelado)
+            self.fase = 'cancelado' if self.cancelado else 'completado'
+        except Exception as e:
+            print(f"[Trabajo] Error en la verificacion: {e}")
+            self.error = str(e)
+            self.fase = 'error'
+        finally:
+            with self._lock:
+                self._fin = time.monotonic()
+
+
+# ============== REGISTRO POR USUARIO ==============
+
+_trabajos = {}
+_trabajos_lock = threading.Lock()
+
+
+def iniciar_trabajo(clave: str, trabajo: TrabajoVerificacion) -> bool:
+    """Arranca el trabajo si el usuario no tiene otro en curso"""
+    with _trabajos_lock:
+        actual = _trabajos.get(clave)
+        if actual is not None and not actual.terminado:
+            return False
+        _trabajos[clave] = trabajo
+    trabajo.iniciar()
+    return True
+
+
+def obtener_trabajo(clave: str):
+    with _trabajos_lock:
+        return _trabajos.get(clave)
+
+
+def quitar_trabajo(clave: str):
+    """Olvida un trabajo terminado (oculta sus resultados)"""
+    with _trabajos_lock:
+        trabajo = _trabajos.get(clave)
+        if trabajo is not None and trabajo.terminado:
+            _trabajos.pop(clave, None)
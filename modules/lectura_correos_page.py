@@ -21,6 +21,8 @@ import csv
 import time
 import io
 import os
+import json
+import threading
 import zipfile
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, date, timedelta
@@ -94,6 +96,8 @@ TRANSLATIONS = {
         "btn_export_all_csv": "Exportar Todos a CSV",
         "btn_download_attachments": "Descargar Adjuntos",
         "btn_clear_results": "Limpiar Resultados",
+        "btn_refresh_flags": "Actualizar Leidos",
+        "refresh_flags_done": "estados de lectura actualizados",
         "marking": "Marcando como leido...",
         "marked_success": "correos marcados como leidos",
         "view_details": "Ver detalles",
@@ -129,6 +133,11 @@ TRANSLATIONS = {
         "logs_title": "Log de Actividad",
         "btn_clear_logs": "Limpiar Logs",
         "btn_download_logs": "Descargar Logs",
+        "metrics_title": "Metricas IMAP",
+        "metrics_help": "Tiempos por fase (connect, select, search, fetch, parse, filter), bytes recibidos y mensajes por cuenta",
+        "btn_download_metrics": "Descargar Metricas JSON",
+        "btn_clear_metrics": "Limpiar Metricas",
+        "no_metrics": "No hay metricas todavia. Conecta y busca primero.",
         # Errores
         "error_connect": "Error al conectar",
         "error_search": "Error al buscar",
@@ -202,6 +211,8 @@ TRANSLATIONS = {
         "btn_export_all_csv": "Export All to CSV",
         "btn_download_attachments": "Download Attachments",
         "btn_clear_results": "Clear Results",
+        "btn_refresh_flags": "Refresh Read Status",
+        "refresh_flags_done": "read states updated",
         "marking": "Marking as read...",
         "marked_success": "emails marked as read",
         "view_details": "View details",
@@ -237,6 +248,11 @@ TRANSLATIONS = {
         "logs_title": "Activity Log",
         "btn_clear_logs": "Clear Logs",
         "btn_download_logs": "Download Logs",
+        "metrics_title": "IMAP Metrics",
+        "metrics_help": "Per-phase timings (connect, select, search, fetch, parse, filter), bytes received and messages per account",
+        "btn_download_metrics": "Download Metrics JSON",
+        "btn_clear_metrics": "Clear Metrics",
+        "no_metrics": "No metrics yet. Connect and search first.",
         # Errors
         "error_connect": "Connection error",
         "error_search": "Search error",
@@ -307,6 +323,8 @@ TRANSLATIONS = {
         "btn_export_all_csv": "सभी CSV निर्यात करें",
         "btn_download_attachments": "अटैचमेंट डाउनलोड",
         "btn_clear_results": "परिणाम साफ करें",
+        "btn_refresh_flags": "पठन स्थिति ताज़ा करें",
+        "refresh_flags_done": "पठन स्थितियाँ अपडेट हुईं",
         "marking": "पठित चिह्नित कर रहे हैं...",
         "marked_success": "ईमेल पठित चिह्नित",
         "view_details": "विवरण देखें",
@@ -340,6 +358,11 @@ TRANSLATIONS = {
         "logs_title": "गतिविधि लॉग",
         "btn_clear_logs": "लॉग साफ करें",
         "btn_download_logs": "लॉग डाउनलोड करें",
+        "metrics_title": "IMAP मेट्रिक्स",
+        "metrics_help": "प्रति खाता चरण समय (connect, select, search, fetch, parse, filter), प्राप्त बाइट्स और संदेश",
+        "btn_download_metrics": "मेट्रिक्स JSON डाउनलोड करें",
+        "btn_clear_metrics": "मेट्रिक्स साफ करें",
+        "no_metrics": "अभी कोई मेट्रिक्स नहीं। पहले कनेक्ट करें और खोजें।",
         "error_connect": "कनेक्शन त्रुटि",
         "error_search": "खोज त्रुटि",
         "error_generic": "त्रुटि",
@@ -523,12 +546,71 @@ def extract_email_only(header_value: str) -> str:
     return header_value.strip()
 
 
+# ==================== CAPACIDADES DEL SERVIDOR ====================
+
+class ServerCapabilities:
+    """
+    Capacidades IMAP de una conexion, consultadas una vez al conectar.
+
+    Ademas de CAPABILITY guarda lo aprendido en uso (p.ej. si el servidor
+    acepta SEARCH CHARSET UTF-8) para que cada busqueda use la forma
+    correcta al primer intento.
+    """
+
+    def __init__(self, caps=()):
+        self.caps = frozenset(str(c).upper() for c in caps)
+        self.charset_utf8: Optional[bool] = None  # None = aun no probado
+        self.utf8_enabled = False
+        self.condstore_enabled = False
+
+    @classmethod
+    def from_connection(cls, conn) -> "ServerCapabilities":
+        """Lee CAPABILITY tras el login (puede anunciar mas que el saludo)"""
+        caps = list(getattr(conn, "capabilities", ()) or ())
+        try:
+            typ, dat = conn.capability()
+            if typ == "OK" and dat and dat[-1]:
+                line = dat[-1].decode("ascii", errors="replace") if isinstance(dat[-1], bytes) else str(dat[-1])
+                caps = line.split()
+        except Exception:
+            pass
+        return cls(caps)
+
+    def has(self, cap: str) -> bool:
+        return cap.upper() in self.caps
+
+    @property
+    def esearch(self) -> bool:
+        return self.has("ESEARCH")
+
+    @property
+    def condstore(self) -> bool:
+        return self.has("CONDSTORE") or self.has("QRESYNC")
+
+    @property
+    def utf8_accept(self) -> bool:
+        return self.has("UTF8=ACCEPT")
+
+    def to_dict(self) -> dict:
+        return {
+            "caps": sorted(self.caps),
+            "charset_utf8": self.charset_utf8,
+            "utf8_enabled": self.utf8_enabled,
+            "condstore_enabled": self.condstore_enabled,
+        }
+
+
 # ==================== IMAP SEARCH SEGURO (v4) ====================
 
-def imap_search_safe(conn, parts, log_fn=None):
+def imap_search_safe(conn, parts, log_fn=None, caps: Optional[ServerCapabilities] = None):
     """
-    Ejecuta SEARCH de forma segura. Intenta con CHARSET UTF-8 primero,
-    si falla reintenta sin charset.
+    Ejecuta SEARCH de forma segura.
+
+    Criterios solo ASCII (o UTF8=ACCEPT activo) van sin CHARSET. El resto
+    se envia en bytes UTF-8 con CHARSET UTF-8 y, si el servidor lo rechaza
+    (NO [BADCHARSET] o BAD), se reintenta sin charset; con `caps` el
+    rechazo se recuerda para la conexion y las siguientes busquedas van
+    directas a la forma que funciona.
     """
     _log = log_fn or (lambda s: None)
     try:
@@ -553,10 +635,30 @@ def imap_search_safe(conn, parts, log_fn=None):
         search_string = ' '.join(search_parts)
 
         typ, data = None, None
-        try:
-            typ, data = conn.search('UTF-8', search_string)
-        except Exception:
+        if search_string.isascii() or (caps is not None and caps.utf8_enabled):
             typ, data = conn.search(None, search_string)
+        else:
+            # Sin UTF8=ACCEPT imaplib codifica en ASCII: los criterios van ya en bytes UTF-8
+            criteria = search_string.encode("utf-8")
+            if caps is not None and caps.charset_utf8 is False:
+                typ, data = conn.search(None, criteria)
+            else:
+                try:
+                    typ, data = conn.search('UTF-8', criteria)
+                    rejected = typ == "NO" and b"BADCHARSET" in b" ".join(
+                        d if isinstance(d, bytes) else str(d).encode() for d in (data or []) if d).upper()
+                except imaplib.IMAP4.abort:
+                    raise
+                except imaplib.IMAP4.error:
+                    # BAD: el servidor no entiende CHARSET en SEARCH
+                    rejected = True
+                if rejected:
+                    if caps is not None:
+                        caps.charset_utf8 = False
+                        _log("Servidor rechaza CHARSET UTF-8, se recuerda para esta conexion")
+                    typ, data = conn.search(None, criteria)
+                elif caps is not None and typ == "OK":
+                    caps.charset_utf8 = True
 
     except Exception as e:
         _log(f"Error en busqueda IMAP: {e}")
@@ -573,6 +675,70 @@ def imap_search_safe(conn, parts, log_fn=None):
         return []
 
 
+# ==================== FILTRO LOCAL COMPILADO ====================
+
+# Maximo de caracteres del contenido en los que se busca el filtro de contenido
+CONTENT_FILTER_MAX_CHARS = 200_000
+
+
+class SearchFilter:
+    """
+    Filtros locales post-fetch compilados una vez por busqueda.
+
+    - remitente / destinatario: subcadena en minusculas (precalculada)
+    - asunto: todas las palabras (>2 chars) deben aparecer; una alternancia
+      regex las localiza en una sola pasada con salida temprana
+    - contenido: regex case-insensitive limitada a CONTENT_FILTER_MAX_CHARS,
+      se detiene en la primera coincidencia sin copiar el contenido a minusculas
+    """
+
+    __slots__ = ("sender", "recipient", "subject_words", "_subject_re",
+                 "_content_re", "content_max_chars")
+
+    def __init__(self, criteria: dict, content_max_chars: int = CONTENT_FILTER_MAX_CHARS):
+        self.sender = (criteria.get("sender") or "").strip().lower()
+        self.recipient = (criteria.get("recipient") or "").strip().lower()
+
+        subject = (criteria.get("subject") or "").strip()
+        words = {w.lower() for w in subject.replace('-', ' ').split() if len(w) > 2}
+        # Una palabra contenida en otra queda implicada por ella
+        words = {w for w in words if not any(w != o and w in o for o in words)}
+        self.subject_words = tuple(sorted(words, key=len, reverse=True))
+        self._subject_re = (re.compile("|".join(re.escape(w) for w in self.subject_words))
+                            if len(self.subject_words) > 1 else None)
+
+        content = (criteria.get("content") or "").strip()
+        self._content_re = re.compile(re.escape(content), re.IGNORECASE) if content else None
+        self.content_max_chars = content_max_chars
+
+    def match_subject(self, subject_text: str) -> bool:
+        words = self.subject_words
+        if not words:
+            return True
+        subj_lower = subject_text.lower()
+        if self._subject_re is None:
+            return words[0] in subj_lower
+        found = set()
+        for m in self._subject_re.finditer(subj_lower):
+            found.add(m.group())
+            if len(found) == len(words):
+                return True
+        # Coincidencias solapadas que la alternancia no reporta
+        return all(w in subj_lower for w in words if w not in found)
+
+    def match_headers(self, from_addr: str, to_addr: str, subject_text: str) -> bool:
+        if self.recipient and self.recipient not in to_addr.lower():
+            return False
+        if self.sender and self.sender not in from_addr.lower():
+            return False
+        return self.match_subject(subject_text)
+
+    def match_content(self, content: str) -> bool:
+        if self._content_re is None:
+            return True
+        return self._content_re.search(content, 0, self.content_max_chars) is not None
+
+
 # ==================== FIFA EXTRACTION (v4 avanzado) ====================
 
 def _html_to_text(html: str) -> str:
@@ -739,27 +905,187 @@ def extract_attachments_info(msg) -> List[dict]:
     return attachments
 
 
+# ==================== METRICAS IMAP ====================
+
+class ImapMetrics:
+    """
+    Metricas estructuradas por cuenta (thread-safe, las busquedas corren en hilos).
+
+    Fases: connect, select, search, fetch, parse, filter, sync. Cada fase acumula
+    count/total_s/max_s; ademas se guardan bytes recibidos, contadores de
+    mensajes y las ultimas FETCH_SAMPLES muestras individuales de fetch.
+    """
+
+    PHASES = ("connect", "select", "search", "fetch", "parse", "filter", "sync")
+    FETCH_SAMPLES = 200
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.accounts: Dict[str, dict] = {}
+        self.started = datetime.now().isoformat(timespec="seconds")
+
+    def _account(self, email_addr: str) -> dict:
+        acc = self.accounts.get(email_addr)
+        if acc is None:
+            acc = {
+                "phases": {p: {"count": 0, "total_s": 0.0, "max_s": 0.0} for p in self.PHASES},
+                "bytes_received": 0,
+                "searches": 0,
+                "messages_server": 0,
+                "messages_fetched": 0,
+                "messages_matched": 0,
+                "messages_filtered": 0,
+                "fetch_samples": [],
+            }
+            self.accounts[email_addr] = acc
+        return acc
+
+    def record(self, email_addr: str, phase: str, seconds: float, nbytes: int = 0):
+        """Registra una ejecucion de `phase` que tardo `seconds` y recibio `nbytes`"""
+        with self._lock:
+            acc = self._account(email_addr)
+            ph = acc["phases"][phase]
+            ph["count"] += 1
+            ph["total_s"] += seconds
+            if seconds > ph["max_s"]:
+                ph["max_s"] = seconds
+            acc["bytes_received"] += nbytes
+
+    def record_fetch(self, email_addr: str, msg_id, seconds: float, nbytes: int):
+        """Registra un FETCH individual (fase fetch + muestra)"""
+        self.record(email_addr, "fetch", seconds, nbytes)
+        with self._lock:
+            samples = self.accounts[email_addr]["fetch_samples"]
+            mid = msg_id.decode() if isinstance(msg_id, bytes) else str(msg_id)
+            samples.append({"msg_id": mid, "s": round(seconds, 5), "bytes": nbytes})
+            if len(samples) > self.FETCH_SAMPLES:
+                del samples[:len(samples) - self.FETCH_SAMPLES]
+
+    def add(self, email_addr: str, **counters):
+        """Suma contadores de mensajes (messages_server=..., messages_matched=...)"""
+        with self._lock:
+            acc = self._account(email_addr)
+            for key, n in counters.items():
+                acc[key] += n
+
+    def reset(self):
+        with self._lock:
+            self.accounts.clear()
+            self.started = datetime.now().isoformat(timespec="seconds")
+
+    def summary_rows(self) -> List[dict]:
+        """Una fila por cuenta con totales por fase (para st.dataframe)"""
+        rows = []
+        with self._lock:
+            for addr, acc in self.accounts.items():
+                row = {"account": addr}
+                for p in self.PHASES:
+                    row[f"{p}_s"] = round(acc["phases"][p]["total_s"], 3)
+                fetches = acc["phases"]["fetch"]["count"]
+                row["fetch_avg_ms"] = round(acc["phases"]["fetch"]["total_s"] / fetches * 1000, 1) if fetches else 0.0
+                row["KB"] = round(acc["bytes_received"] / 1024, 1)
+                for key in ("searches", "messages_server", "messages_fetched",
+                            "messages_matched", "messages_filtered"):
+                    row[key] = acc[key]
+                rows.append(row)
+        return rows
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "started": self.started,
+                "exported": datetime.now().isoformat(timespec="seconds"),
+                "accounts": json.loads(json.dumps(self.accounts)),
+            }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False, indent=2)
+
+
+def _response_size(data) -> int:
+    """Bytes de una respuesta imaplib (lista de bytes y tuplas)"""
+    total = 0
+    for elt in data or ():
+        if isinstance(elt, tuple):
+            total += sum(len(x) for x in elt if isinstance(x, bytes))
+        elif isinstance(elt, bytes):
+            total += len(elt)
+    return total
+
+
+# "* 12 FETCH (FLAGS (\Seen) MODSEQ (345))": los items pueden venir en cualquier orden
+_FETCH_SEQ_RE = re.compile(rb'^(\d+) \(')
+_FETCH_FLAGS_RE = re.compile(rb'\bFLAGS \(([^)]*)\)')
+_FETCH_MODSEQ_RE = re.compile(rb'\bMODSEQ \((\d+)\)')
+
+
+def _parse_fetch_flags(line: bytes) -> Optional[Tuple[bytes, bytes, Optional[int]]]:
+    """(seq, flags, modseq) de una respuesta FETCH; None si no trae FLAGS"""
+    seq = _FETCH_SEQ_RE.match(line)
+    flags = _FETCH_FLAGS_RE.search(line)
+    if not seq or not flags:
+        return None
+    modseq = _FETCH_MODSEQ_RE.search(line)
+    return seq.group(1), flags.group(1), int(modseq.group(1)) if modseq else None
+
+
 # ==================== IMAP MANAGER (v4) ====================
 
 class ImapManager:
     """Gestor de conexiones IMAP con reconexion y busqueda robusta"""
 
-    def __init__(self):
+    def __init__(self, conn_factory=None):
         self.connections: Dict[str, imaplib.IMAP4_SSL] = {}
         self.credentials: Dict[str, Tuple[str, str]] = {}  # email -> (password, type)
         self.status: Dict[str, bool] = {}
         self.errors: Dict[str, str] = {}
+        # conn_factory(host) -> conexion IMAP; permite usar un servidor local (benchmarks)
+        self.conn_factory = conn_factory
+        self.metrics = ImapMetrics()
+        self.capabilities: Dict[str, ServerCapabilities] = {}
+        # email -> {"folder", "modseq"} de la ultima busqueda (para refresh_flags)
+        self.sync_state: Dict[str, dict] = {}
+        self.selected_folder: Dict[str, str] = {}
+
+    def _open_connection(self, email_addr: str):
+        """Abre la conexion IMAP (SSL al servidor inferido o via conn_factory)"""
+        host = infer_imap_server(email_addr)
+        if self.conn_factory:
+            return self.conn_factory(host)
+        return imaplib.IMAP4_SSL(host, 993, ssl_context=get_ssl_context())
+
+    def _post_login(self, email_addr: str, conn):
+        """
+        Cachea las capacidades de la conexion y activa en un solo ENABLE
+        UTF8=ACCEPT y CONDSTORE si el servidor los anuncia.
+        """
+        caps = ServerCapabilities.from_connection(conn)
+        to_enable = [c for c, ok in (("UTF8=ACCEPT", caps.utf8_accept),
+                                     ("CONDSTORE", caps.condstore)) if ok]
+        if to_enable:
+            try:
+                # imaplib.enable() mira las capacidades del saludo; ENABLE puede
+                # anunciarse solo tras el login
+                if caps.caps:
+                    conn.capabilities = tuple(caps.caps)
+                typ, _ = conn.enable(" ".join(to_enable))
+                enabled = b" ".join(x for x in conn.untagged_responses.pop("ENABLED", []) if x).upper()
+                # Solo lo que el servidor confirma en la respuesta ENABLED
+                caps.utf8_enabled = typ == "OK" and b"UTF8=ACCEPT" in enabled
+                caps.condstore_enabled = typ == "OK" and b"CONDSTORE" in enabled
+            except Exception:
+                pass
+        self.capabilities[email_addr] = caps
+        self.selected_folder.pop(email_addr, None)
 
     def connect(self, email_addr: str, password: str) -> Tuple[bool, str]:
         """Conecta a una cuenta IMAP"""
         try:
-            host = infer_imap_server(email_addr)
-            conn = imaplib.IMAP4_SSL(host, 993, ssl_context=get_ssl_context())
+            t0 = time.perf_counter()
+            conn = self._open_connection(email_addr)
             conn.login(email_addr, password)
-            try:
-                conn._simple_command("ENABLE", "UTF8=ACCEPT")
-            except Exception:
-                pass
+            self._post_login(email_addr, conn)
+            self.metrics.record(email_addr, "connect", time.perf_counter() - t0)
             self.connections[email_addr] = conn
             self.credentials[email_addr] = (password, 'normal')
             self.status[email_addr] = True
@@ -777,14 +1103,12 @@ class ImapManager:
     def connect_oauth2(self, email_addr: str, access_token: str) -> Tuple[bool, str]:
         """Conecta usando XOAUTH2 (Gmail/Outlook)"""
         try:
-            host = infer_imap_server(email_addr)
-            conn = imaplib.IMAP4_SSL(host, 993, ssl_context=get_ssl_context())
+            t0 = time.perf_counter()
+            conn = self._open_connection(email_addr)
             auth_string = f"user={email_addr}\1auth=Bearer {access_token}\1\1"
             conn.authenticate("XOAUTH2", lambda _: auth_string.encode())
-            try:
-                conn._simple_command("ENABLE", "UTF8=ACCEPT")
-            except Exception:
-                pass
+            self._post_login(email_addr, conn)
+            self.metrics.record(email_addr, "connect", time.perf_counter() - t0)
             self.connections[email_addr] = conn
             self.credentials[email_addr] = (access_token, 'oauth2')
             self.status[email_addr] = True
@@ -825,6 +1149,9 @@ class ImapManager:
         self.connections.clear()
         self.status.clear()
         self.errors.clear()
+        self.capabilities.clear()
+        self.sync_state.clear()
+        self.selected_folder.clear()
 
     def _select_folder_safe(self, conn, folder: str) -> bool:
         """Selecciona carpeta con fallback a INBOX"""
@@ -839,6 +1166,68 @@ class ImapManager:
         except Exception:
             return False
 
+    @staticmethod
+    def _highest_modseq(conn) -> Optional[int]:
+        """HIGHESTMODSEQ anunciado en el ultimo SELECT (solo con CONDSTORE)"""
+        try:
+            data = conn.untagged_responses.get("HIGHESTMODSEQ")
+            return int(data[-1]) if data else None
+        except Exception:
+            return None
+
+    def refresh_flags(self, email_addr: str, msg_ids: List, log_fn=None) -> Dict[bytes, bool]:
+        """
+        Refresca el estado leido/no leido de mensajes ya buscados con un solo
+        comando por cuenta, sin volver a descargarlos.
+
+        Con CONDSTORE usa FETCH (FLAGS) (CHANGEDSINCE modseq): el servidor solo
+        devuelve los mensajes que cambiaron desde la busqueda. Sin CONDSTORE
+        hace un FETCH (FLAGS) de los mismos ids.
+        Retorna {msg_id: is_read} de los mensajes reportados.
+        """
+        _log = log_fn or (lambda s: None)
+        conn = self.connections.get(email_addr)
+        state = self.sync_state.get(email_addr)
+        if not conn or not state or not msg_ids:
+            return {}
+
+        caps = self.capabilities.get(email_addr)
+        t0 = time.perf_counter()
+        try:
+            if self.selected_folder.get(email_addr) != state["folder"]:
+                if not self._select_folder_safe(conn, state["folder"]):
+                    return {}
+                self.selected_folder[email_addr] = state["folder"]
+
+            id_set = ",".join(m.decode() if isinstance(m, bytes) else str(m) for m in msg_ids)
+            modseq = state.get("modseq")
+            if caps and caps.condstore_enabled and modseq:
+                typ, data = conn.fetch(id_set, f"(FLAGS) (CHANGEDSINCE {modseq})")
+            else:
+                typ, data = conn.fetch(id_set, "(FLAGS)")
+        except Exception as e:
+            _log(f"Error refrescando flags en {email_addr}: {e}")
+            return {}
+
+        updates: Dict[bytes, bool] = {}
+        if typ == "OK":
+            for elt in data or ():
+                line = elt[0] if isinstance(elt, tuple) else elt
+                if not isinstance(line, bytes):
+                    continue
+                parsed = _parse_fetch_flags(line)
+                if parsed is None:
+                    continue
+                seq, flags, line_modseq = parsed
+                updates[seq] = b"\\Seen" in flags
+                if line_modseq is not None and modseq is not None:
+                    modseq = max(modseq, line_modseq)
+            if modseq is not None:
+                state["modseq"] = modseq
+
+        self.metrics.record(email_addr, "sync", time.perf_counter() - t0, _response_size(data))
+        return updates
+
     def search(self, email_addr: str, criteria: dict, folder: str = "INBOX",
                retry_on_error: bool = True, log_fn=None) -> List[dict]:
         """
@@ -847,6 +1236,7 @@ class ImapManager:
         """
         results: List[dict] = []
         _log = log_fn or (lambda s: None)
+        metrics = self.metrics
 
         try:
             connection = self.connections.get(email_addr)
@@ -854,7 +1244,18 @@ class ImapManager:
                 _log(f"No hay conexion para {email_addr}")
                 return results
 
-            if not self._select_folder_safe(connection, folder):
+            metrics.add(email_addr, searches=1)
+            t0 = time.perf_counter()
+            selected = self._select_folder_safe(connection, folder)
+            metrics.record(email_addr, "select", time.perf_counter() - t0)
+            if selected:
+                self.selected_folder[email_addr] = folder
+                self.sync_state[email_addr] = {
+                    "folder": folder,
+                    "modseq": self._highest_modseq(connection),
+                }
+            else:
+                self.selected_folder.pop(email_addr, None)
                 _log(f"No se pudo seleccionar carpeta '{folder}' en {email_addr}")
                 return results
 
@@ -891,7 +1292,12 @@ class ImapManager:
 
             _log(f"Buscando en {email_addr} — IMAP: {parts}")
 
-            message_ids = imap_search_safe(connection, parts, log_fn=_log)
+            t0 = time.perf_counter()
+            message_ids = imap_search_safe(connection, parts, log_fn=_log,
+                                           caps=self.capabilities.get(email_addr))
+            metrics.record(email_addr, "search", time.perf_counter() - t0,
+                           sum(len(x) + 1 for x in message_ids))
+            metrics.add(email_addr, messages_server=len(message_ids))
 
             if not message_ids:
                 _log(f"{email_addr}: 0 mensajes")
@@ -901,13 +1307,18 @@ class ImapManager:
 
             limit = int(criteria.get("limit") or 25)
             message_ids = message_ids[-limit:][::-1]
+            local_filter = SearchFilter(criteria)
 
             filtered_out = 0
             for msg_id in message_ids:
                 try:
+                    t0 = time.perf_counter()
                     typ, msg_data = connection.fetch(msg_id, "(BODY.PEEK[] FLAGS)")
+                    metrics.record_fetch(email_addr, msg_id, time.perf_counter() - t0,
+                                         _response_size(msg_data))
                     if typ != "OK" or not msg_data:
                         continue
+                    metrics.add(email_addr, messages_fetched=1)
 
                     raw = None
                     flags_line = None
@@ -922,36 +1333,34 @@ class ImapManager:
                     if not raw:
                         continue
 
+                    # Headers primero: si no pasan los filtros no se extrae el contenido
+                    t0 = time.perf_counter()
                     parsed = email.message_from_bytes(raw)
                     is_read = bool(flags_line and b"\\Seen" in flags_line)
                     from_addr = decode_header_text(parsed.get("From", ""))
                     to_addr = decode_header_text(parsed.get("To", ""))
                     subject_text = decode_header_text(parsed.get("Subject", ""))
                     date_text = parsed.get("Date", "")
-                    content = extract_text_content(parsed)
-                    html_content = extract_html_content(parsed)
-
-                    # Filtros locales post-fetch
-                    content_crit = criteria.get("content", "").strip()
-                    recipient_crit = criteria.get("recipient", "").strip()
-
-                    if content_crit and content_crit.lower() not in content.lower():
-                        filtered_out += 1
-                        continue
-
-                    if recipient_crit and recipient_crit.lower() not in to_addr.lower():
-                        filtered_out += 1
-                        continue
-
-                    if subject_crit:
-                        crit_words = [w.lower() for w in subject_crit.replace('-', ' ').split() if len(w) > 2]
-                        subj_lower = subject_text.lower()
-                        if crit_words and not all(w in subj_lower for w in crit_words):
-                            filtered_out += 1
-                            continue
-
-                    if sender_crit and sender_crit.lower() not in from_addr.lower():
+                    t1 = time.perf_counter()
+                    matched = local_filter.match_headers(from_addr, to_addr, subject_text)
+                    t2 = time.perf_counter()
+
+                    content = html_content = ""
+                    if matched:
+                        content = extract_text_content(parsed)
+                        html_content = extract_html_content(parsed)
+                        t3 = time.perf_counter()
+                        matched = local_filter.match_content(content)
+                        t4 = time.perf_counter()
+                        metrics.record(email_addr, "parse", (t1 - t0) + (t3 - t2))
+                        metrics.record(email_addr, "filter", (t2 - t1) + (t4 - t3))
+                    else:
+                        metrics.record(email_addr, "parse", t1 - t0)
+                        metrics.record(email_addr, "filter", t2 - t1)
+
+                    if not matched:
                         filtered_out += 1
+                        metrics.add(email_addr, messages_filtered=1)
                         continue
 
                     # Parsear fecha
@@ -974,6 +1383,7 @@ class ImapManager:
                         "is_read": is_read,
                         "conn": connection,
                     })
+                    metrics.add(email_addr, messages_matched=1)
                 except Exception:
                     continue
 
@@ -1422,7 +1832,7 @@ def render_results_tab():
     st.success(f"📧 {len(results)} {t('results_count')}")
 
     # --- Acciones superiores ---
-    col1, col2, col3 = st.columns(3)
+    col1, col2, col3, col4 = st.columns(4)
 
     with col1:
         # Exportar CSV
@@ -1462,6 +1872,14 @@ def render_results_tab():
             _log("Resultados limpiados")
             st.rerun()
 
+    with col4:
+        if st.button(f"🔄 {t('btn_refresh_flags')}", use_container_width=True,
+                      key="refresh_flags_btn"):
+            changed = _refresh_read_status(imap_manager, results)
+            st.success(f"✅ {changed} {t('refresh_flags_done')}")
+            if changed:
+                st.rerun()
+
     st.markdown("---")
 
     # --- Tabla resumen ---
@@ -1545,6 +1963,40 @@ def render_results_tab():
                             st.rerun()
 
 
+def _refresh_read_status(imap_manager, results: list) -> int:
+    """
+    Refresca is_read de los resultados en cache con un comando por cuenta
+    (CONDSTORE CHANGEDSINCE cuando el servidor lo soporta). Retorna cuantos cambiaron.
+    """
+    by_account: Dict[str, list] = {}
+    for r in results:
+        if r.get("msg_id") is not None:
+            by_account.setdefault(r.get("account"), []).append(r)
+    if not by_account:
+        return 0
+
+    def refresh_single(addr):
+        # Los hilos no tienen contexto de Streamlit: el log se vuelca despues
+        lines = []
+        updates = imap_manager.refresh_flags(
+            addr, [r["msg_id"] for r in by_account[addr]], log_fn=lines.append
+        )
+        return addr, updates, lines
+
+    changed = 0
+    with ThreadPoolExecutor(max_workers=min(10, len(by_account))) as executor:
+        for addr, updates, lines in executor.map(refresh_single, list(by_account)):
+            for line in lines:
+                _log(line)
+            for r in by_account[addr]:
+                mid = r["msg_id"] if isinstance(r["msg_id"], bytes) else str(r["msg_id"]).encode()
+                if mid in updates and updates[mid] != r.get("is_read"):
+                    r["is_read"] = updates[mid]
+                    changed += 1
+    _log(f"Estado de lectura refrescado en {len(by_account)} cuentas: {changed} cambios")
+    return changed
+
+
 def _generate_csv(results: list) -> str:
     """Genera CSV de resultados"""
     output = io.StringIO()
@@ -1752,3 +2204,35 @@ def render_logs_tab():
         st.text_area("", value=log_text, height=400, disabled=True, key="logs_display")
     else:
         st.info("No hay logs todavia")
+
+    render_metrics_section()
+
+
+def render_metrics_section():
+    """Metricas IMAP estructuradas por cuenta (tabla + exportar JSON)"""
+    metrics = st.session_state.lectura_imap.metrics
+
+    st.markdown("---")
+    st.subheader(f"⏱️ {t('metrics_title')}")
+    st.caption(t("metrics_help"))
+
+    rows = metrics.summary_rows()
+    if not rows:
+        st.info(f"ℹ️ {t('no_metrics')}")
+        return
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button(
+            label=f"💾 {t('btn_download_metrics')}",
+            data=metrics.to_json(),
+            file_name=f"metricas_imap_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+            mime="application/json",
+        )
+    with col2:
+        if st.button(f"🧹 {t('btn_clear_metrics')}", key="clear_metrics_btn"):
+            metrics.reset()
+            st.rerun()
+
+    import pandas as pd
+    st.dataframe(pd.DataFrame(rows), use_container_width=True)
@@ -0,0 +1,49 @@
+"""
+MotorVision._llamar contra una respuesta cruda asincrona falsa (sin red).
+
+Ejecutar desde la raiz del repo:
+    python -m pytest -q tests
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+from modules.claude_vision import MotorVision, parsear_respuesta
+
+
+class _RespuestaCruda:
+    """Como AsyncAPIResponse: parse() es una corrutina"""
+
+    def __init__(self, texto: str):
+        self.headers = {}
+        self._texto = texto
+
+    async def parse(self):
+        return SimpleNamespace(content=[SimpleNamespace(text=self._texto)])
+
+
+class _Mensajes:
+    def __init__(self, texto: str):
+        self.with_raw_response = self
+        self._texto = texto
+
+    async def create(self, **kwargs):
+        return _RespuestaCruda(self._texto)
+
+
+def test_llamar_espera_parse_de_la_respuesta_asincrona():
+    motor = MotorVision(api_key="test", concurrencia=1)
+    try:
+        texto = '{"email": "cliente@gmail.com", "match": 25, "cantidad": 2, "categoria": "Category 1"}'
+        motor._cliente = SimpleNamespace(messages=_Mensajes(texto))
+
+        resultado, intento, error = asyncio.run_coroutine_threadsafe(
+            motor._llamar([], 100, parsear_respuesta, max_reintentos=1, backoff_base=0.01), motor._loop
+        ).result(timeout=10)
+
+        assert error is None
+        assert intento == 0
+        assert resultado['email'] == "cliente@gmail.com"
+        assert resultado['match'] == 25
+    finally:
+        motor._loop.call_soon_threadsafe(motor._loop.stop)
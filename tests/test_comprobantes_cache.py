@@ -0,0 +1,151 @@
+"""
+CacheResultados: persistencia, namespaces por metodo, expulsion LRU / TTL
+e indice de hashes (sin streamlit ni red).
+
+Ejecutar desde la raiz del repo:
+    python -m pytest -q tests
+"""
+
+import json
+import time
+from datetime import datetime, timedelta
+
+from modules.comprobantes_cache import CacheResultados, namespace_de_metodo, namespaces_para
+
+
+def _datos(metodo: str) -> dict:
+    return {'email': 'cliente@gmail.com', 'match': 25, 'cantidad': 2,
+            'categoria': 'Category 1', 'metodo': metodo}
+
+
+def test_parcial_no_sirve_para_solo_claude(tmp_path):
+    cache = CacheResultados(tmp_path / 'cache.db')
+    cache['h1'] = _datos('OCR + Claude (parcial)')
+
+    assert namespace_de_metodo('OCR + Claude (parcial)') == 'mixto'
+    assert cache.get('h1', namespaces=namespaces_para('solo_claude')) is None
+    assert cache.get('h1', namespaces=namespaces_para('solo_ocr')) is None
+    assert cache.get('h1', namespaces=namespaces_para('ocr_fallback'))['metodo'] == 'OCR + Claude (parcial)'
+    cache.cerrar()
+
+
+def test_parciales_antiguos_pasan_a_mixto(tmp_path):
+    ruta = tmp_path / 'cache.db'
+    cache = CacheResultados(ruta)
+    cache.guardar('h1', _datos('OCR + Claude (parcial)'), namespace='claude')
+    cache.guardar('h2', _datos('Claude Vision (fallback)'))
+    cache._conn.execute("PRAGMA user_version = 0")
+    cache.cerrar()
+
+    cache = CacheResultados(ruta)
+    assert cache.get('h1', namespaces=('claude',)) is None
+    assert cache.get('h1', namespaces=('mixto',)) is not None
+    assert cache.get('h2', namespaces=namespaces_para('solo_claude')) is not None
+    cache.cerrar()
+
+
+def test_persiste_entre_aperturas(tmp_path):
+    ruta = tmp_path / 'cache.db'
+    cache = CacheResultados(ruta)
+    cache['h1'] = _datos('OCR')
+    cache.cerrar()
+
+    cache = CacheResultados(ruta)
+    assert 'h1' in cache
+    assert cache['h1']['email'] == 'cliente@gmail.com'
+    assert len(cache) == 1
+    cache.cerrar()
+
+
+def test_ocr_no_sirve_para_solo_claude(tmp_path):
+    cache = CacheResultados(tmp_path / 'cache.db')
+    cache['h1'] = _datos('OCR')
+    cache['h2'] = _datos('Claude Vision (fallback)')
+
+    assert cache.get('h1', namespaces=namespaces_para('solo_claude')) is None
+    assert cache.get('h1', namespaces=namespaces_para('ocr_fallback')) is not None
+    assert cache.get('h2', namespaces=namespaces_para('solo_ocr')) is None
+    assert cache.contiene('h2', ('claude',)) and not cache.contiene('h2', ('ocr',))
+
+    stats = cache.estadisticas()
+    assert stats['ocr']['entradas'] == 1 and stats['claude']['entradas'] == 1
+    assert stats['claude']['misses'] >= 1
+    cache.cerrar()
+
+
+def test_expulsa_las_usadas_hace_mas_tiempo(tmp_path):
+    cache = CacheResultados(tmp_path / 'cache.db', max_entradas=3)
+    for h in ('h1', 'h2', 'h3'):
+        cache[h] = _datos('OCR')
+        time.sleep(0.002)
+    cache.get('h1')  # h1 pasa a ser la mas reciente
+    time.sleep(0.002)
+    cache['h4'] = _datos('OCR')
+
+    assert cache.expulsar() == 1
+    assert 'h2' not in cache
+    assert all(h in cache for h in ('h1', 'h3', 'h4'))
+    assert cache.estadisticas()['ocr']['expulsiones'] == 1
+    cache.cerrar()
+
+
+def test_limite_de_bytes(tmp_path):
+    tamano = len(json.dumps(_datos('OCR'), ensure_ascii=False))
+    # Caben dos entradas y media: sobra la primera
+    cache = CacheResultados(tmp_path / 'cache.db', max_bytes=tamano * 5 // 2)
+    for h in ('h1', 'h2', 'h3'):
+        cache[h] = _datos('OCR')
+        time.sleep(0.002)
+
+    assert cache.expulsar() == 1
+    assert 'h1' not in cache
+    assert 'h2' in cache and 'h3' in cache
+    cache.cerrar()
+
+
+def test_caducidad_por_ttl(tmp_path):
+    cache = CacheResultados(tmp_path / 'cache.db', ttl_dias=30)
+    viejo = dict(_datos('OCR'), fecha_cache=(datetime.now() - timedelta(days=31)).isoformat())
+    cache['viejo'] = viejo
+    cache['nuevo'] = _datos('OCR')
+
+    # Caducada ya no sirve aunque aun no se haya expulsado
+    assert cache.get('viejo') is None
+    assert 'viejo' not in cache
+    assert cache.expulsar() == 1
+    assert len(cache) == 1
+    cache.cerrar()
+
+
+def test_expulsion_poda_el_indice_de_hashes(tmp_path):
+    cache = CacheResultados(tmp_path / 'cache.db', max_entradas=1)
+    rutas = []
+    for i in range(2):
+        ruta = tmp_path / f'{i}.png'
+        ruta.write_bytes(f'imagen-{i}'.encode())
+        imagen_hash, _ = cache.hash_archivo(ruta)
+        cache[imagen_hash] = _datos('OCR')
+        rutas.append((ruta, imagen_hash))
+        time.sleep(0.002)
+
+    assert cache.hash_indexado(rutas[0][0]) == rutas[0][1]
+    cache.expulsar()
+    # La entrada expulsada se lleva su fila del indice; la que queda la conserva
+    assert cache.hash_indexado(rutas[0][0]) is None
+    assert cache.hash_indexado(rutas[1][0]) == rutas[1][1]
+    cache.cerrar()
+
+
+def test_hash_archivo_usa_el_indice(tmp_path):
+    cache = CacheResultados(tmp_path / 'cache.db')
+    ruta = tmp_path / '1.png'
+    ruta.write_bytes(b'imagen')
+
+    imagen_hash, contenido = cache.hash_archivo(ruta, devolver_bytes=True)
+    assert contenido == b'imagen'
+    # Sin cambios en el fichero no se vuelve a leer
+    assert cache.hash_archivo(ruta, devolver_bytes=True) == (imagen_hash, None)
+
+    ruta.write_bytes(b'imagen cambiada')
+    assert cache.hash_archivo(ruta)[0] != imagen_hash
+    cache.cerrar()
@@ -0,0 +1,98 @@
+"""
+DiarioEjecucion: escritura, resumen, reanudacion y seleccion por parametros.
+
+Ejecutar desde la raiz del repo:
+    python -m pytest -q tests
+"""
+
+import json
+import os
+
+from modules.comprobantes_ejecuciones import (
+    DiarioEjecucion, firma_imagen, limpiar_ejecuciones, listar_ejecuciones, separar_por_parametros
+)
+
+PARAMETROS = {'metodo': 'ocr_fallback', 'motor_ocr': 'easyocr', 'tolerancia_email': 0.9}
+
+
+def _imagenes(carpeta, n: int) -> list:
+    carpeta.mkdir(exist_ok=True)
+    rutas = []
+    for i in range(n):
+        ruta = carpeta / f'{1000 + i}.png'
+        ruta.write_bytes(f'imagen-{i}'.encode())
+        rutas.append(ruta)
+    return rutas
+
+
+def _diario(carpeta, imagenes, parametros=PARAMETROS, version='v1') -> DiarioEjecucion:
+    diario = DiarioEjecucion.crear(carpeta / 'ejecuciones', version, dict(parametros))
+    for imagen in imagenes:
+        diario.registrar({'archivo': imagen.name, 'estado': 'OK'}, firma_imagen(imagen))
+    return diario
+
+
+def test_reanudar_salta_solo_las_imagenes_sin_cambios(tmp_path):
+    imagenes = _imagenes(tmp_path / 'imagenes', 4)
+    diario = _diario(tmp_path, imagenes[:3])
+    diario.cerrar(completada=False)
+
+    # Una imagen ya verificada cambia despues
+    imagenes[1].write_bytes(b'otra captura')
+    stat = imagenes[1].stat()
+    os.utime(imagenes[1], ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    previas = DiarioEjecucion(diario.ruta).verificadas(tmp_path / 'imagenes', imagenes)
+    assert sorted(previas) == ['1000.png', '1002.png']
+
+
+def test_resumen_sin_parsear_y_linea_cortada(tmp_path):
+    imagenes = _imagenes(tmp_path / 'imagenes', 3)
+    diario = _diario(tmp_path, imagenes)
+    diario.cerrar(completada=False)
+    with open(diario.ruta, 'a', encoding='utf-8') as f:
+        f.write('{"tipo": "resultado", "resul')  # caida a mitad de linea
+
+    cabecera, verificadas, completada = DiarioEjecucion(diario.ruta).resumen()
+    assert cabecera['parametros'] == PARAMETROS
+    assert verificadas == 3
+    assert not completada
+
+    # Al seguir escribiendo, la linea cortada no se pega al siguiente registro
+    diario.cerrar(completada=True, contadores={'ok': 3, 'errores': 0})
+    _, resultados, completada = diario.leer()
+    assert completada and len(resultados) == 3
+    fin = json.loads(diario.ruta.read_text(encoding='utf-8').splitlines()[-1])
+    assert fin['contadores'] == {'ok': 3, 'errores': 0}
+
+
+def test_listar_solo_interrumpidas_de_la_misma_tabla(tmp_path):
+    imagenes = _imagenes(tmp_path / 'imagenes', 2)
+    _diario(tmp_path, imagenes).cerrar(completada=True)
+    interrumpida = _diario(tmp_path, imagenes[:1])
+    interrumpida.cerrar(completada=False)
+    _diario(tmp_path, imagenes, version='v2').cerrar(completada=False)
+
+    ejecuciones = listar_ejecuciones(tmp_path / 'ejecuciones', 'v1')
+    assert [e['run_id'] for e in ejecuciones] == [interrumpida.run_id]
+    assert ejecuciones[0]['verificadas'] == 1
+
+    todas = listar_ejecuciones(tmp_path / 'ejecuciones', solo_incompletas=False)
+    assert len(todas) == 3
+    assert limpiar_ejecuciones(tmp_path / 'ejecuciones', conservar=0) == 1
+
+
+def test_solo_se_reanudan_las_de_los_mismos_parametros(tmp_path):
+    imagenes = _imagenes(tmp_path / 'imagenes', 1)
+    misma = _diario(tmp_path, imagenes)
+    misma.cerrar(completada=False)
+    otro_metodo = _diario(tmp_path, imagenes, dict(PARAMETROS, metodo='solo_claude'))
+    otro_metodo.cerrar(completada=False)
+    otra_tolerancia = _diario(tmp_path, imagenes, dict(PARAMETROS, tolerancia_email=0.95))
+    otra_tolerancia.cerrar(completada=False)
+
+    reanudables, otras = separar_por_parametros(
+        listar_ejecuciones(tmp_path / 'ejecuciones', 'v1'), PARAMETROS
+    )
+    assert [e['run_id'] for e in reanudables] == [misma.run_id]
+    assert sorted(e['run_id'] for e in otras) == sorted([otro_metodo.run_id, otra_tolerancia.run_id])
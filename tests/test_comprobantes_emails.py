@@ -0,0 +1,89 @@
+"""
+IndiceEmails y distancia_acotada, comparados con una busqueda exhaustiva.
+
+Ejecutar desde la raiz del repo:
+    python -m pytest -q tests
+"""
+
+import random
+import string
+
+from modules.comprobantes_emails import IndiceEmails, distancia_acotada
+
+
+def _levenshtein(a: str, b: str) -> int:
+    anterior = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        actual = [i]
+        for j, cb in enumerate(b, 1):
+            actual.append(min(anterior[j] + 1, actual[j - 1] + 1, anterior[j - 1] + (ca != cb)))
+        anterior = actual
+    return anterior[-1]
+
+
+def _tabla(emails: list) -> dict:
+    return {str(1000 + i): {'email': email} for i, email in enumerate(emails)}
+
+
+def test_distancia_acotada_coincide_con_levenshtein():
+    rng = random.Random(7)
+    for _ in range(500):
+        a = ''.join(rng.choice('abc') for _ in range(rng.randint(0, 8)))
+        b = ''.join(rng.choice('abc') for _ in range(rng.randint(0, 8)))
+        maximo = rng.randint(0, 4)
+        real = _levenshtein(a, b)
+        assert distancia_acotada(a, b, maximo) == (real if real <= maximo else maximo + 1), (a, b, maximo)
+
+
+def test_exacto_devuelve_todos_sus_pedidos():
+    indice = IndiceEmails({'1': {'email': 'Ana@Gmail.com '}, '2': {'email': 'ana@gmail.com'},
+                           '3': {'email': ''}, '4': {'email': None}})
+
+    assert len(indice) == 1
+    assert indice.buscar('ANA@gmail.com') == [('ana@gmail.com', ['1', '2'], 1.0)]
+    assert indice.buscar('') == []
+
+
+def test_aproximado_encuentra_el_email_con_erratas_de_ocr():
+    indice = IndiceEmails(_tabla(['juan.perez@gmail.com', 'maria.lopez@hotmail.com', 'pedro@yahoo.es']))
+
+    email, pedidos, similitud = indice.buscar('juan.perez@gmai1.com')[0]
+    assert email == 'juan.perez@gmail.com'
+    assert pedidos == ['1000']
+    assert similitud == 1 - 1 / len('juan.perez@gmail.com')
+    assert indice.buscar('otro.cliente@gmail.com') == []
+
+
+def test_buscar_coincide_con_busqueda_exhaustiva():
+    rng = random.Random(3)
+    letras = string.ascii_lowercase
+    emails = sorted({
+        ''.join(rng.choice(letras) for _ in range(rng.randint(6, 14))) + rng.choice(['@gmail.com', '@icloud.com'])
+        for _ in range(120)
+    })
+    indice = IndiceEmails(_tabla(emails))
+
+    for _ in range(80):
+        original = rng.choice(emails)
+        local, dominio = original.split('@')
+        errata = list(local)
+        for _ in range(rng.randint(0, 2)):
+            errata[rng.randrange(len(errata))] = rng.choice(letras)
+        consulta = ''.join(errata) + '@' + dominio
+
+        esperado = max(
+            (1 - _levenshtein(consulta, e) / max(len(consulta), len(e)) for e in emails), default=0.0
+        )
+        resultados = indice.buscar(consulta, similitud_min=0.8, max_resultados=1)
+        if esperado >= 0.8:
+            assert resultados and abs(resultados[0][2] - esperado) < 1e-9, consulta
+        else:
+            assert resultados == []
+
+
+def test_sugerir_pedido_solo_si_es_otro_pedido():
+    indice = IndiceEmails(_tabla(['juan.perez@gmail.com', 'maria.lopez@hotmail.com']))
+
+    assert indice.sugerir_pedido('maria.lopez@hotmail.com', '1000') == (['1001'], 1.0)
+    assert indice.sugerir_pedido('maria.lopez@hotmail.com', '1001') == (None, 0.0)
+    assert indice.sugerir_pedido('nadie@nada.org', '1000') == (None, 0.0)
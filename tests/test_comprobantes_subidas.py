@@ -0,0 +1,80 @@
+"""
+iterar_subidas: imagenes sueltas y ZIP, duplicados y conflictos de nombre.
+
+Ejecutar desde la raiz del repo:
+    python -m pytest -q tests
+"""
+
+import io
+import zipfile
+
+from modules.comprobantes_cache import CacheResultados
+from modules.comprobantes_subidas import hash_flujo, iterar_subidas, nuevo_resumen
+
+
+class _Subida(io.BytesIO):
+    """Como el UploadedFile de Streamlit: fichero en memoria con nombre"""
+
+    def __init__(self, name: str, datos: bytes):
+        super().__init__(datos)
+        self.name = name
+
+
+def _zip(name: str, miembros: dict) -> _Subida:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zf:
+        for ruta, datos in miembros.items():
+            zf.writestr(ruta, datos)
+    return _Subida(name, buffer.getvalue())
+
+
+def _subir(tmp_path, archivos):
+    cache = CacheResultados(tmp_path / 'cache.db')
+    resumen = nuevo_resumen()
+    rutas = list(iterar_subidas(archivos, tmp_path / 'imagenes', cache, resumen=resumen))
+    return cache, resumen, rutas
+
+
+def test_sueltas_y_zip_se_guardan_e_indexan(tmp_path):
+    cache, resumen, rutas = _subir(tmp_path, [
+        _Subida('100.PNG', b'imagen-100'),
+        _zip('lote.zip', {'a/200.jpg': b'imagen-200', 'notas.txt': b'x', '__MACOSX/a/._200.jpg': b'x'}),
+    ])
+
+    assert sorted(r.name for r in rutas) == ['100.PNG', '200.jpg']
+    assert (tmp_path / 'imagenes' / '200.jpg').read_bytes() == b'imagen-200'
+    assert resumen['guardadas'] == 2 and resumen['recibidas'] == 2
+    # El hash calculado al escribir queda en el indice: la verificacion no relee el fichero
+    assert cache.hash_indexado(tmp_path / 'imagenes' / '200.jpg') == hash_flujo(io.BytesIO(b'imagen-200'))
+    cache.cerrar()
+
+
+def test_mismo_nombre_en_carpetas_del_zip(tmp_path):
+    cache, resumen, rutas = _subir(tmp_path, [
+        _zip('lote.zip', {'a/1.png': b'primero', 'b/1.png': b'otro contenido', 'c/1.png': b'primero'}),
+    ])
+
+    assert [r.name for r in rutas] == ['1.png']
+    assert (tmp_path / 'imagenes' / '1.png').read_bytes() == b'primero'
+    assert resumen['duplicadas'] == 1
+    assert resumen['conflictos'] == 1
+    assert resumen['omitidas'] == ['lote.zip/b/1.png']
+    cache.cerrar()
+
+
+def test_fichero_identico_no_se_reescribe(tmp_path):
+    cache, _, _ = _subir(tmp_path, [_Subida('300.png', b'imagen-300')])
+    resumen = nuevo_resumen()
+    rutas = list(iterar_subidas([_Subida('300.png', b'imagen-300')], tmp_path / 'imagenes', cache, resumen=resumen))
+
+    assert [r.name for r in rutas] == ['300.png']
+    assert resumen['sin_cambios'] == 1 and resumen['guardadas'] == 0
+    cache.cerrar()
+
+
+def test_zip_no_valido_cuenta_como_error(tmp_path):
+    cache, resumen, rutas = _subir(tmp_path, [_Subida('roto.zip', b'no es un zip')])
+
+    assert rutas == []
+    assert resumen['errores'] == 1
+    cache.cerrar()
@@ -0,0 +1,75 @@
+"""
+cargar_tabla: deteccion del formato CSV, copia columnar e invalidacion.
+
+Ejecutar desde la raiz del repo:
+    python -m pytest -q tests
+"""
+
+import os
+
+from modules import comprobantes_tabla
+from modules.comprobantes_tabla import cargar_tabla, detectar_formato_csv, ruta_copia, version_tabla
+
+
+def _escribir_csv(ruta, filas, sep=';', encoding='cp1252'):
+    cabecera = sep.join(['PEDIDO VENTA', 'match', 'email_envio', 'Category', 'Notas'])
+    lineas = [cabecera] + [sep.join(fila) for fila in filas]
+    ruta.write_bytes(('\n'.join(lineas) + '\n').encode(encoding))
+
+
+def _tocar(ruta, segundos: int):
+    """Cambia el mtime (el contenido nuevo puede caer en el mismo tick del reloj)"""
+    stat = ruta.stat()
+    os.utime(ruta, ns=(stat.st_atime_ns, stat.st_mtime_ns + segundos * 1_000_000_000))
+
+
+def test_detecta_codificacion_y_separador(tmp_path):
+    ruta = tmp_path / 'ventas.csv'
+    _escribir_csv(ruta, [['1001', '25', 'josé@gmail.com', 'Category 1', 'x']])
+
+    assert detectar_formato_csv(ruta) == ('cp1252', ';')
+    df = cargar_tabla(ruta)
+    assert list(df.columns) == ['PEDIDO VENTA', 'match', 'email_envio', 'Category']
+    assert df.loc[0, 'email_envio'] == 'josé@gmail.com'
+
+
+def test_reutiliza_la_copia_columnar(tmp_path, monkeypatch):
+    ruta = tmp_path / 'ventas.csv'
+    _escribir_csv(ruta, [['1001', '25', 'a@gmail.com', 'Category 1', 'x']])
+    cargar_tabla(ruta)
+    copias = list(tmp_path.glob('.ventas.csv.copia.*'))
+    assert len(copias) == 1
+
+    # Sin memoria del proceso: la segunda carga sale de la copia, sin leer el CSV
+    monkeypatch.setattr(comprobantes_tabla, '_memoria', {})
+    monkeypatch.setattr(comprobantes_tabla, 'leer_tabla', None)
+    df = cargar_tabla(ruta)
+    assert df.loc[0, 'email_envio'] == 'a@gmail.com'
+
+
+def test_tabla_modificada_invalida_memoria_y_copia(tmp_path):
+    ruta = tmp_path / 'ventas.csv'
+    _escribir_csv(ruta, [['1001', '25', 'a@gmail.com', 'Category 1', 'x']])
+    version = version_tabla(ruta)
+    copia_anterior = ruta_copia(ruta)
+    cargar_tabla(ruta)
+
+    _escribir_csv(ruta, [['1001', '25', 'b@gmail.com', 'Category 1', 'x'],
+                         ['1002', '30', 'c@gmail.com', 'Category 2', 'y']])
+    _tocar(ruta, 1)
+
+    df = cargar_tabla(ruta)
+    assert list(df['email_envio']) == ['b@gmail.com', 'c@gmail.com']
+    assert version_tabla(ruta) != version
+    # La copia de la version anterior se borra al escribir la nueva
+    assert not copia_anterior.exists()
+    assert len(list(tmp_path.glob('.ventas.csv.copia.*'))) == 1
+
+
+def test_cada_llamada_recibe_su_copia(tmp_path):
+    ruta = tmp_path / 'ventas.csv'
+    _escribir_csv(ruta, [['1001', '25', 'a@gmail.com', 'Category 1', 'x']])
+
+    df = cargar_tabla(ruta)
+    df.loc[0, 'email_envio'] = 'modificado@gmail.com'
+    assert cargar_tabla(ruta).loc[0, 'email_envio'] == 'a@gmail.com'